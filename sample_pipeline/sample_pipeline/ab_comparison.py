@@ -0,0 +1,85 @@
+"""Compare two implementations of a pipeline node on identical inputs,
+computing the upstream part of the pipeline only once"""
+
+import logging
+from collections import namedtuple
+
+import dask
+from dask.delayed import delayed
+
+from .intercept_function_arguments import (
+    intercept_function_arguments,
+    resolve_function_path,
+)
+from .testing import assert_pipeline_equal
+
+LOGGER = logging.getLogger(__name__)
+
+ABComparison = namedtuple("ABComparison", ["old", "new", "diff"])
+
+
+def _diff(old, new):
+    """The message of the assertion error raised by assert_pipeline_equal
+    on the two results, or None when they are equal"""
+    try:
+        assert_pipeline_equal(new, old)
+    except AssertionError as error:
+        return str(error)
+    return None
+
+
+def _intercepted_arguments(fun, fun_kwargs, intercept_path):
+    """Call 'fun' and return the arguments that it passes to 'intercept_path'"""
+    ret_kwargs = {}
+    with intercept_function_arguments(intercept_path, ret_kwargs):
+        fun(**fun_kwargs)
+    return ret_kwargs
+
+
+def compare_implementations(
+    compute, fun_path, old_fun, new_fun, intercept_path=None, scheduler="threads"
+):
+    """
+    Run 'compute' until it calls the function at 'fun_path', then evaluate both
+    'old_fun' and 'new_fun' on the arguments of that call, and compare the results.
+
+    compute: a function that runs the pipeline, e.g.
+        lambda: get_full_pipeline(tickers, start_date, end_date)["signals"].compute()
+    fun_path: the node function, at the location where the pipeline uses it,
+        e.g. "sample_pipeline.pipeline.get_signals"
+    old_fun, new_fun: the two implementations (functions or dotted paths)
+    intercept_path: when given, we compare the arguments passed by the two
+        implementations to that function rather than their outputs.
+        As 'mock.patch' is global to the process, the two implementations
+        are then evaluated one after the other.
+    scheduler: the Dask scheduler used to evaluate the two implementations
+        in parallel
+
+    Return a named tuple (old, new, diff) where diff describes the first
+    difference that assert_pipeline_equal finds between the old and new
+    results, and is None when the results are identical.
+    """
+    if isinstance(old_fun, str):
+        old_fun = resolve_function_path(old_fun)
+    if isinstance(new_fun, str):
+        new_fun = resolve_function_path(new_fun)
+
+    # The upstream of the node is computed only once
+    LOGGER.info(f"Computing the inputs of {fun_path}")
+    fun_kwargs = {}
+    with intercept_function_arguments(fun_path, fun_kwargs):
+        compute()
+
+    if intercept_path is None:
+        LOGGER.info(f"Evaluating the two implementations of {fun_path}")
+        old, new = dask.compute(
+            delayed(old_fun, pure=False)(**fun_kwargs),
+            delayed(new_fun, pure=False)(**fun_kwargs),
+            scheduler=scheduler,
+        )
+    else:
+        LOGGER.info(f"Intercepting the arguments of {intercept_path}")
+        old = _intercepted_arguments(old_fun, fun_kwargs, intercept_path)
+        new = _intercepted_arguments(new_fun, fun_kwargs, intercept_path)
+
+    return ABComparison(old, new, _diff(old, new))
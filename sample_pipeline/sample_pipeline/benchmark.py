@@ -0,0 +1,313 @@
+"""Benchmarks for the pipeline nodes, on synthetic market data of growing size.
+
+Usage:
+    python -m sample_pipeline.benchmark run [--tickers 4 400] [--periods 1M 1Y]
+    python -m sample_pipeline.benchmark report
+
+The results are appended to a JSON lines file together with the current
+git commit, so that the performance of successive commits can be compared.
+The file is 'benchmark_results.jsonl' next to this module (not tracked by git),
+whatever the current directory, unless another file is given with --output.
+"""
+
+import argparse
+import json
+import logging
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import dask
+import numpy as np
+import pandas as pd
+
+from .data import get_calendar, get_closes, get_volumes, get_yahoo_data
+from .evaluation import TRADING_DAYS_PER_YEAR, get_signal_stats
+from .pipeline import get_full_pipeline
+from .portfolio import get_portfolio
+from .replay import measure
+from .rolling import get_availability, get_rolling_signals
+from .signals import get_signals
+
+LOGGER = logging.getLogger(__name__)
+
+BENCHMARK_RESULTS_FILE = Path(__file__).parent / "benchmark_results.jsonl"
+BENCHMARK_END_DATE = "2021-12-31"
+PERIODS = ("1M", "1Y", "5Y", "20Y")
+
+# The scaling curves: number of tickers for one year of data,
+# and length of the history for 100 tickers
+TICKERS_SCALING = [(n_tickers, "1Y") for n_tickers in (4, 40, 400, 4000, 10000)]
+HISTORY_SCALING = [(100, period) for period in PERIODS]
+
+
+def get_start_date(period, end_date=BENCHMARK_END_DATE):
+    """The start date for a history of length 'period', e.g. '1M' or '20Y'"""
+    length, unit = int(period[:-1]), period[-1]
+    assert unit in "MY", "period must be a number of months (M) or years (Y)"
+    offset = (
+        pd.DateOffset(months=length) if unit == "M" else pd.DateOffset(years=length)
+    )
+    return (pd.Timestamp(end_date) - offset + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def get_synthetic_tickers(n_tickers):
+    """A list of n_tickers synthetic ticker names"""
+    return [f"T{i:05d}" for i in range(n_tickers)]
+
+
+def compute_full_pipeline(tickers, start_date, end_date):
+    """Compute all the nodes of the full pipeline, on synthetic data"""
+    full_pipeline = get_full_pipeline(
+        tickers, start_date, end_date, data_source="synthetic"
+    )
+    (_evaluated_pipeline,) = dask.compute(full_pipeline)
+    return _evaluated_pipeline
+
+
+def get_rolling_signals_naive(closes, volumes, window=20, halflife=10):
+    """A reference implementation of 'get_rolling_signals' with one loop
+    per ticker, used to benchmark the vectorized kernels"""
+    availability = get_availability(closes, volumes)
+    alpha = 1.0 - np.exp(-np.log(2.0) / halflife)
+    signals = {"CLOSE_ZSCORE": {}, "CLOSE_EWMA_TREND": {}, "VOLUME_RATIO": {}}
+    for ticker in closes.columns:
+        close = closes[ticker]
+        volume = volumes[ticker]
+        std = close.rolling(window).std()
+        zscore = (close - close.rolling(window).mean()) / std.where(std > 0)
+        signals["CLOSE_ZSCORE"][ticker] = zscore.mask((std == 0) & close.notnull(), 0)
+        signals["CLOSE_EWMA_TREND"][ticker] = (
+            close / close.ewm(alpha=alpha, adjust=False, ignore_na=True).mean() - 1.0
+        )
+        mean_volume = volume.rolling(window).mean()
+        signals["VOLUME_RATIO"][ticker] = volume / mean_volume.where(mean_volume > 0)
+
+    return {
+        name: pd.DataFrame(signal, index=closes.index, columns=closes.columns).where(
+            availability
+        )
+        for name, signal in signals.items()
+    }
+
+
+def get_portfolio_naive(signals, max_weight=0.5):
+    """A reference implementation of 'get_portfolio' (with equal weights) with
+    loops over the dates and the signals, used to benchmark the batched version"""
+    first = next(iter(signals.values()))
+    portfolio = pd.DataFrame(np.nan, index=first.index, columns=first.columns)
+    for date in first.index:
+        combined = pd.Series(0.0, index=first.columns)
+        available = pd.Series(False, index=first.columns)
+        for signal in signals.values():
+            row = signal.loc[date]
+            available |= row.notnull()
+            gross = row.abs().sum()
+            if gross > 0:
+                combined += row.fillna(0.0) / gross / len(signals)
+        gross = combined.abs().sum()
+        if gross > 0:
+            combined = (combined / gross).clip(-max_weight, max_weight)
+        portfolio.loc[date] = combined.where(available)
+    return portfolio
+
+
+def get_signal_stats_naive(signals, closes):
+    """A reference implementation of 'get_signal_stats' that evaluates
+    one signal at a time with pandas, used to benchmark the batched version"""
+    returns = closes.pct_change(fill_method=None).iloc[1:].fillna(0.0)
+    stats = {}
+    for name, signal in signals.items():
+        positions = signal.reindex_like(closes).fillna(0.0)
+        pnl = (positions.shift(1).iloc[1:] * returns).sum(axis=1)
+        turnover = positions.diff().iloc[1:].abs().sum(axis=1)
+        volatility = pnl.std() * np.sqrt(TRADING_DAYS_PER_YEAR)
+        stats[name] = {
+            "pnl": pnl.sum(),
+            "volatility": volatility,
+            "sharpe": (
+                pnl.mean() * TRADING_DAYS_PER_YEAR / volatility
+                if volatility > 0
+                else np.nan
+            ),
+            "turnover": turnover.mean(),
+        }
+    return pd.DataFrame.from_dict(stats, orient="index")
+
+
+def benchmark_nodes(n_tickers, period, number=3):
+    """Benchmark the pipeline nodes on synthetic data with n_tickers over the
+    given period, and return a list of results (one per benchmark)"""
+    tickers = get_synthetic_tickers(n_tickers)
+    start_date = get_start_date(period)
+    end_date = BENCHMARK_END_DATE
+
+    LOGGER.info(f"Benchmarking the pipeline for {n_tickers} tickers over {period}")
+    yahoo_data = get_yahoo_data(tickers, start_date, end_date, "synthetic")
+    calendar = get_calendar(yahoo_data)
+    closes = get_closes(yahoo_data, calendar)
+    volumes = get_volumes(yahoo_data, calendar)
+    signals = dict(
+        get_signals(closes, volumes, calendar),
+        **get_rolling_signals(closes, volumes, calendar=calendar),
+    )
+    n_dates = len(closes.index)
+
+    benchmarks = {
+        "get_calendar": (get_calendar, {"yahoo_data": yahoo_data}),
+        "get_closes": (get_closes, {"yahoo_data": yahoo_data, "calendar": calendar}),
+        "get_volumes": (get_volumes, {"yahoo_data": yahoo_data, "calendar": calendar}),
+        "get_signals": (
+            get_signals,
+            {"closes": closes, "volumes": volumes, "calendar": calendar},
+        ),
+        "get_rolling_signals": (
+            get_rolling_signals,
+            {"closes": closes, "volumes": volumes},
+        ),
+        "get_rolling_signals_naive": (
+            get_rolling_signals_naive,
+            {"closes": closes, "volumes": volumes},
+        ),
+        "get_portfolio": (get_portfolio, {"signals": signals, "calendar": calendar}),
+        "get_portfolio_naive": (get_portfolio_naive, {"signals": signals}),
+        "get_signal_stats": (get_signal_stats, {"signals": signals, "closes": closes}),
+        "get_signal_stats_naive": (
+            get_signal_stats_naive,
+            {"signals": signals, "closes": closes},
+        ),
+        "full_pipeline": (
+            compute_full_pipeline,
+            dict(tickers=tickers, start_date=start_date, end_date=end_date),
+        ),
+    }
+
+    results = []
+    for name, (fun, fun_kwargs) in benchmarks.items():
+        stats = measure(fun, fun_kwargs, number=number)
+        results.append(
+            dict(
+                stats,
+                benchmark=name,
+                n_tickers=n_tickers,
+                period=period,
+                n_dates=n_dates,
+                # ticker-dates processed per second
+                throughput=n_tickers * n_dates / stats["median"],
+            )
+        )
+    return results
+
+
+def get_git_commit():
+    """The current git commit, or None if not in a git repository"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes, number=3, results_file=BENCHMARK_RESULTS_FILE):
+    """Run the benchmarks for each (n_tickers, period) in 'sizes' and
+    append the results to 'results_file'"""
+    context = {
+        "commit": get_git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "dask": dask.__version__,
+        "machine": platform.node(),
+    }
+
+    results = []
+    for n_tickers, period in sizes:
+        for result in benchmark_nodes(n_tickers, period, number=number):
+            result = dict(result, **context)
+            results.append(result)
+            if results_file is not None:
+                with open(results_file, "a") as fp:
+                    fp.write(json.dumps(result) + "\n")
+    return results
+
+
+def load_results(results_file=BENCHMARK_RESULTS_FILE):
+    """Load the benchmark results as a data frame"""
+    with open(results_file) as fp:
+        return pd.DataFrame([json.loads(line) for line in fp if line.strip()])
+
+
+def format_report(results):
+    """A table with the median time (in seconds) and the peak memory (in MB)
+    of each benchmark, with one column per commit (in the order of the runs)"""
+    results = results.assign(
+        commit=results["commit"].fillna("unknown"),
+        peak_memory=results["peak_memory"] / 2 ** 20,
+    )
+    commits = list(dict.fromkeys(results["commit"]))
+    report = results.pivot_table(
+        index=["benchmark", "n_tickers", "n_dates"],
+        columns="commit",
+        values=["median", "peak_memory"],
+        aggfunc="last",
+    )
+    report = report.reindex(columns=commits, level="commit")
+    report.columns = [
+        f"{'time (s)' if value == 'median' else 'memory (MB)'} @ {commit}"
+        for value, commit in report.columns
+    ]
+    return report.to_string(float_format="{:.4f}".format)
+
+
+def _parse_sizes(tickers, periods):
+    if tickers is None and periods is None:
+        return TICKERS_SCALING + HISTORY_SCALING
+    return [
+        (n_tickers, period)
+        for n_tickers in tickers or [100]
+        for period in periods or ["1Y"]
+    ]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m sample_pipeline.benchmark",
+        description="Benchmark the pipeline nodes on synthetic market data",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument(
+        "--tickers", type=int, nargs="+", help="Numbers of tickers (default: 100)"
+    )
+    run_parser.add_argument(
+        "--periods", nargs="+", choices=PERIODS, help="History lengths (default: 1Y)"
+    )
+    run_parser.add_argument("--number", type=int, default=3)
+    run_parser.add_argument("--output", type=Path, default=BENCHMARK_RESULTS_FILE)
+
+    report_parser = subparsers.add_parser(
+        "report", help="Compare the results by commit"
+    )
+    report_parser.add_argument("--output", type=Path, default=BENCHMARK_RESULTS_FILE)
+
+    args = parser.parse_args(args)
+    if args.command == "run":
+        sizes = _parse_sizes(args.tickers, args.periods)
+        run_benchmarks(sizes, number=args.number, results_file=args.output)
+
+    print(format_report(load_results(args.output)))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    main()
@@ -1,24 +1,511 @@
+import abc
+import functools
 import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 
+import numpy as np
 import pandas as pd
 import pandas_datareader as wb
+from dask.sizeof import sizeof
 
 LOGGER = logging.getLogger(__name__)
 
 
-def get_yahoo_data(tickers, start_date, end_date):
+class DataSource(abc.ABC):
+    """A provider of market data. Sub-classes implement 'get_ticker_data',
+    and may override 'get_data' when they can load many tickers at once"""
+
+    @abc.abstractmethod
+    def get_ticker_data(self, ticker, start_date, end_date):
+        """Return a data frame with the data for one ticker
+        (index = dates, columns = Close prices, Volumes, etc)"""
+
+    def get_data(self, tickers, start_date, end_date):
+        """Return a dict ticker => ticker data"""
+        return {
+            ticker: self.get_ticker_data(ticker, start_date, end_date)
+            for ticker in tickers
+        }
+
+
+def get_batches(tickers, max_batch_size):
+    """Split the tickers into the smallest number of batches of at most
+    max_batch_size tickers, with sizes that differ by at most one"""
+    assert max_batch_size > 0, max_batch_size
+    tickers = sorted(tickers)
+    n_batches = -(-len(tickers) // max_batch_size)
+    if not n_batches:
+        return []
+    bounds = [len(tickers) * i // n_batches for i in range(n_batches + 1)]
+    return [tickers[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def split_batch_data(data, tickers):
+    """Split the data of a batch request (a data frame with (field, ticker)
+    columns) into a dict ticker => ticker data. The dates where a ticker
+    has no data are dropped, and the tickers with no data are omitted"""
+    columns = {}
+    for i, ticker in enumerate(data.columns.get_level_values(1)):
+        columns.setdefault(ticker, []).append(i)
+
+    ticker_data = {}
+    for ticker in tickers:
+        if ticker not in columns:
+            continue
+        values = data.iloc[:, columns[ticker]]
+        values.columns = values.columns.get_level_values(0)
+        values = values.dropna(how="all")
+        if len(values):
+            ticker_data[ticker] = values
+    return ticker_data
+
+
+class BatchedDataSource(DataSource):
+    """A provider that returns the data for many tickers in one request.
+    Sub-classes implement 'get_batch_data'.
+
+    The tickers are requested in batches of at most 'max_batch_size' tickers,
+    with at most 'max_workers' concurrent requests. The batches that fail, and
+    the tickers missing from the responses, are requested again up to
+    'max_retries' times, after 'retry_delay' seconds (doubled at each retry)"""
+
+    def __init__(
+        self, max_batch_size=100, max_workers=1, max_retries=3, retry_delay=1.0
+    ):
+        assert max_workers > 0, max_workers
+        assert max_retries >= 0, max_retries
+        self.max_batch_size = max_batch_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+    @abc.abstractmethod
+    def get_batch_data(self, tickers, start_date, end_date):
+        """Return a data frame with the data for the tickers (index = dates,
+        columns = a MultiIndex (field, ticker), like pandas-datareader)"""
+
+    def _get_batch(self, tickers, start_date, end_date):
+        """Return the dict ticker => data for one batch, or the exception"""
+        try:
+            data = self.get_batch_data(tickers, start_date, end_date)
+        except Exception as err:
+            return err
+        return split_batch_data(data, tickers)
+
+    def get_ticker_data(self, ticker, start_date, end_date):
+        return self.get_data([ticker], start_date, end_date)[ticker]
+
+    def get_data(self, tickers, start_date, end_date):
+        ticker_data = {}
+        missing = sorted(set(tickers))
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    delay = self.retry_delay * 2 ** (attempt - 1)
+                    LOGGER.warning(
+                        f"Retrying {len(missing)} tickers in {delay}s "
+                        f"(attempt {attempt} of {self.max_retries})"
+                    )
+                    time.sleep(delay)
+
+                batches = get_batches(missing, self.max_batch_size)
+                LOGGER.info(
+                    f"Requesting {len(missing)} tickers in {len(batches)} batches"
+                )
+                results = executor.map(
+                    lambda batch: self._get_batch(batch, start_date, end_date), batches
+                )
+                error = None
+                for batch, result in zip(batches, results):
+                    if isinstance(result, Exception):
+                        LOGGER.warning(
+                            f"The request for {len(batch)} tickers failed: {result!r}"
+                        )
+                        error = result
+                    else:
+                        ticker_data.update(result)
+
+                missing = [ticker for ticker in missing if ticker not in ticker_data]
+                if not missing:
+                    break
+            else:
+                if error is not None:
+                    raise error
+                raise KeyError(f"No data for {missing}")
+
+        return {ticker: ticker_data[ticker] for ticker in tickers}
+
+
+class YahooDataSource(BatchedDataSource):
+    """Price data from Yahoo finance. pandas-datareader loads a list of
+    tickers in one call, and returns (field, ticker) columns"""
+
+    def get_batch_data(self, tickers, start_date, end_date):
+        return wb.DataReader(list(tickers), "yahoo", start_date, end_date)
+
+
+class SyntheticDataSource(DataSource):
+    """Deterministic synthetic price data on business days, with the same
+    columns as the Yahoo data. The random numbers are seeded by the ticker
+    and the date range, so the data does not depend on the other tickers"""
+
+    def __init__(self, seed=0):
+        self.seed = seed
+
+    @staticmethod
+    def _business_days(start_date, end_date):
+        # Faster than pd.bdate_range, which generates the dates one by one
+        dates = pd.date_range(start_date, end_date, freq="D", name="Date")
+        return dates[dates.dayofweek < 5]
+
+    def get_ticker_data(self, ticker, start_date, end_date, dates=None):
+        start_date = pd.Timestamp(start_date).strftime("%Y-%m-%d")
+        end_date = pd.Timestamp(end_date).strftime("%Y-%m-%d")
+        if dates is None:
+            dates = self._business_days(start_date, end_date)
+        rng = np.random.default_rng(
+            [self.seed, zlib.crc32(f"{ticker}|{start_date}|{end_date}".encode())]
+        )
+
+        # A geometric random walk, with a ticker-specific level and volatility
+        level, volatility = 10.0 + 490.0 * rng.random(), 0.005 + 0.025 * rng.random()
+        noise = rng.standard_normal((3, len(dates)))
+        closes = level * np.exp(np.cumsum(volatility * noise[0]))
+        opens = np.concatenate([[level], closes[:-1]])
+        spread = 1.0 + 0.5 * volatility * np.abs(noise[1:])
+        volumes = np.round(rng.lognormal(15.0, 0.5, len(dates)))
+
+        return pd.DataFrame(
+            {
+                "High": np.maximum(opens, closes) * spread[0],
+                "Low": np.minimum(opens, closes) / spread[1],
+                "Open": opens,
+                "Close": closes,
+                "Volume": volumes,
+                "Adj Close": closes,
+            },
+            index=dates,
+        )
+
+    def get_data(self, tickers, start_date, end_date):
+        # The calendar is shared by all the tickers
+        dates = self._business_days(start_date, end_date)
+        return {
+            ticker: self.get_ticker_data(ticker, start_date, end_date, dates)
+            for ticker in tickers
+        }
+
+
+class BatchedSyntheticDataSource(BatchedDataSource):
+    """The synthetic data, returned in batches of tickers"""
+
+    def __init__(self, seed=0, **kwargs):
+        super().__init__(**kwargs)
+        self.synthetic = SyntheticDataSource(seed)
+
+    def get_batch_data(self, tickers, start_date, end_date):
+        data = self.synthetic.get_data(tickers, start_date, end_date)
+        return pd.concat(data, axis=1).swaplevel(axis=1)
+
+
+class CachedDataSource(DataSource):
+    """Keep the ticker data returned by another data source in memory, for at
+    most 'ttl' seconds, and for at most 'max_entries' (ticker, dates) requests
+    (the least recently used are evicted first).
+
+    The tickers that are not cached are requested from the underlying data
+    source in a single call to its 'get_data' method, so that a batched data
+    source keeps its batches. Concurrent requests for the same ticker and dates
+    share a single call to the underlying data source. The cached data frames
+    are shared between the callers, and should not be modified.
+
+    The cache is not pickled: a copy sent to another process starts empty.
+    Use the "yahoo_cached" data source for a cache shared by all the callers
+    of a process."""
+
+    def __init__(self, data_source, ttl=300.0, max_entries=1000, clock=time.monotonic):
+        assert ttl > 0, ttl
+        assert max_entries > 0, max_entries
+        self.data_source = get_data_source(data_source)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        # (ticker, start_date, end_date) => (expiry time, data), in the order
+        # of last access
+        self._cache = OrderedDict()
+        # (ticker, start_date, end_date) => Future for the requests in progress
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def clear(self):
+        """Remove all the cached data"""
+        with self._lock:
+            self._cache.clear()
+
+    def _get_cached(self, key):
+        """Return the cached data, or None. Must be called with the lock held"""
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expiry, data = entry
+        if expiry <= self.clock():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return data
+
+    def __getstate__(self):
+        # The cached data, the lock and the requests in progress are not
+        # pickled: the copies in other processes would not share them
+        state = self.__dict__.copy()
+        del state["_cache"], state["_lock"], state["_in_flight"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cache = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def get_ticker_data(self, ticker, start_date, end_date):
+        return self.get_data([ticker], start_date, end_date)[ticker]
+
+    def get_data(self, tickers, start_date, end_date):
+        """Return the cached data, and request the other tickers from the
+        underlying data source in a single call to its 'get_data' method"""
+        # The dates are normalized, so that "2021-01-04" and
+        # pd.Timestamp("2021-01-04") share the same entry
+        start_date, end_date = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        keys = {ticker: (ticker, start_date, end_date) for ticker in tickers}
+        ticker_data, fetched, waiting = {}, {}, {}
+        with self._lock:
+            for ticker, key in keys.items():
+                data = self._get_cached(key)
+                if data is not None:
+                    self.hits += 1
+                    ticker_data[ticker] = data
+                elif key in self._in_flight:
+                    self.coalesced += 1
+                    waiting[ticker] = self._in_flight[key]
+                else:
+                    self.misses += 1
+                    fetched[ticker] = self._in_flight[key] = Future()
+
+        if fetched:
+            try:
+                data = self.data_source.get_data(list(fetched), start_date, end_date)
+                missing = set(fetched).difference(data)
+                if missing:
+                    raise KeyError(f"No data for {sorted(missing)}")
+            except BaseException as err:
+                with self._lock:
+                    for ticker in fetched:
+                        del self._in_flight[keys[ticker]]
+                for future in fetched.values():
+                    future.set_exception(err)
+                raise
+
+            with self._lock:
+                for ticker in fetched:
+                    key = keys[ticker]
+                    del self._in_flight[key]
+                    self._cache[key] = (self.clock() + self.ttl, data[ticker])
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+            for ticker, future in fetched.items():
+                future.set_result(data[ticker])
+                ticker_data[ticker] = data[ticker]
+
+        if waiting:
+            LOGGER.info(f"Waiting for the requests in progress for {sorted(waiting)}")
+            for ticker, future in waiting.items():
+                ticker_data[ticker] = future.result()
+
+        return {ticker: ticker_data[ticker] for ticker in tickers}
+
+
+_SHARED_CACHES = {}
+_SHARED_CACHES_LOCK = threading.Lock()
+
+
+def get_shared_cache(data_source):
+    """Return the CachedDataSource of a data source (a name in DATA_SOURCES)
+    that is shared by all the callers in this process"""
+    with _SHARED_CACHES_LOCK:
+        if data_source not in _SHARED_CACHES:
+            _SHARED_CACHES[data_source] = CachedDataSource(data_source)
+        return _SHARED_CACHES[data_source]
+
+
+DATA_SOURCES = {
+    "yahoo": YahooDataSource,
+    "synthetic": SyntheticDataSource,
+    "synthetic_batched": BatchedSyntheticDataSource,
+    "yahoo_cached": functools.partial(get_shared_cache, "yahoo"),
+    "synthetic_cached": functools.partial(get_shared_cache, "synthetic"),
+}
+
+
+def get_data_source(data_source):
+    """Return a DataSource object given its name in DATA_SOURCES"""
+    if isinstance(data_source, DataSource):
+        return data_source
+    if data_source not in DATA_SOURCES:
+        raise ValueError(
+            f"Unknown data source {data_source}, expected one of {list(DATA_SOURCES)}"
+        )
+    return DATA_SOURCES[data_source]()
+
+
+def get_yahoo_data(tickers, start_date, end_date, data_source="yahoo"):
     """Return a dict ticker => yahoo data
-    (data frame: index = dates, columns = Close prices, Volumes, etc)"""
-    LOGGER.info("Loading price data from Yahoo finance")
-    return {
-        ticker: wb.DataReader(ticker, "yahoo", start_date, end_date)
-        for ticker in tickers
-    }
+    (data frame: index = dates, columns = Close prices, Volumes, etc)
+
+    data_source: the name of a data source in DATA_SOURCES, or a DataSource object"""
+    LOGGER.info(f"Loading price data from {data_source}")
+    return get_data_source(data_source).get_data(tickers, start_date, end_date)
 
 
-def _extract_field(yahoo_data, field):
+class Calendar:
+    """The dates of all the tickers (the union of their dates), and for each
+    ticker, the positions of its dates in that index (a slice when the dates
+    are consecutive, e.g. for the tickers that have all the dates), and whether
+    it has a price or a volume at each date (the availability bitmap)"""
+
+    def __init__(self, dates, tickers, positions, availability):
+        self.dates = dates
+        self.tickers = tickers
+        self.positions = positions
+        self.availability = availability
+
+    def availability_frame(self):
+        """The availability as a boolean data frame
+        (columns = tickers, index = dates). The frame has its own copy of the
+        availability, so that changing it does not change the calendar"""
+        return pd.DataFrame(
+            self.availability.copy(), index=self.dates, columns=self.tickers
+        )
+
+    def ticker_positions(self, ticker):
+        """The positions of the dates of a ticker, as an array"""
+        return np.arange(len(self.dates))[self.positions[ticker]]
+
+    def has_all_dates(self, ticker):
+        """Whether the ticker has a value at every date of the calendar"""
+        positions = self.positions[ticker]
+        if isinstance(positions, slice):
+            return len(range(*positions.indices(len(self.dates)))) == len(self.dates)
+        return len(positions) == len(self.dates)
+
+    def dtype(self, ticker, dtype):
+        """The dtype of a ticker series once aligned on the calendar dates"""
+        if self.has_all_dates(ticker):
+            return dtype
+        return np.result_type(dtype, np.float64)
+
+    def align(self, ticker, values, out=None):
+        """Return the values (a 1D array) of a ticker on the calendar dates.
+        The values are written to 'out' (a 1D array of the size of the
+        calendar) when it is given"""
+        has_all_dates = self.has_all_dates(ticker)
+        if out is None:
+            if has_all_dates:
+                return values
+            out = np.empty(len(self.dates), dtype=self.dtype(ticker, values.dtype))
+        if not has_all_dates:
+            out[:] = np.nan
+        out[self.positions[ticker]] = values
+        return out
+
+
+@sizeof.register(Calendar)
+def _sizeof_calendar(calendar):
+    return int(
+        sizeof(calendar.dates)
+        + sizeof(calendar.tickers)
+        + sizeof(calendar.positions)
+        + sizeof(calendar.availability)
+    )
+
+
+def _field_values(ticker_data, field):
+    """The values of a column of the ticker data, as a numpy array. This is
+    faster than ticker_data[field] when the columns have the same dtype"""
+    if len(set(ticker_data.dtypes.tolist())) == 1:
+        return ticker_data.to_numpy()[:, ticker_data.columns.get_loc(field)]
+    return ticker_data[field].to_numpy()
+
+
+def _as_slice(positions):
+    """The positions as a slice when they are consecutive"""
+    if len(positions) and positions[-1] - positions[0] == len(positions) - 1:
+        if (np.diff(positions) == 1).all():
+            return slice(int(positions[0]), int(positions[-1]) + 1)
+    return positions
+
+
+def get_calendar(yahoo_data):
+    """Return the Calendar of the yahoo data"""
+    LOGGER.info("Computing the calendar")
+    tickers = pd.Index(sorted(yahoo_data))
+    indices = [yahoo_data[ticker].index for ticker in tickers]
+    dates = indices[0] if indices else pd.DatetimeIndex([], name="Date")
+    for index in indices[1:]:
+        if not index.equals(dates):
+            dates = dates.union(index)
+
+    positions = {}
+    availability = np.zeros((len(dates), len(tickers)), dtype=bool)
+    for i, (ticker, index) in enumerate(zip(tickers, indices)):
+        if index is dates or index.equals(dates):
+            positions[ticker] = slice(0, len(dates))
+        else:
+            positions[ticker] = _as_slice(dates.get_indexer(index))
+        closes = _field_values(yahoo_data[ticker], "Close").astype(float)
+        volumes = _field_values(yahoo_data[ticker], "Volume").astype(float)
+        availability[positions[ticker], i] = ~(np.isnan(closes) & np.isnan(volumes))
+
+    return Calendar(dates, tickers, positions, availability)
+
+
+def _extract_field(yahoo_data, field, calendar=None):
     """Return a data frame with a single metric
     (columns = tickers, index = dates)"""
+    if calendar is not None:
+        # Place the values at their precomputed positions, rather than joining the dates
+        columns = {
+            ticker: _field_values(yahoo_data[ticker], field)
+            for ticker in calendar.tickers
+        }
+        dtypes = {calendar.dtype(ticker, columns[ticker].dtype) for ticker in columns}
+        if len(dtypes) == 1:
+            # A single block for all the tickers
+            values = np.empty((len(calendar.tickers), len(calendar.dates)), *dtypes)
+            for ticker, out in zip(calendar.tickers, values):
+                calendar.align(ticker, columns[ticker], out)
+            return pd.DataFrame(
+                values.T, index=calendar.dates, columns=calendar.tickers, copy=False
+            )
+
+        return pd.DataFrame(
+            {ticker: calendar.align(ticker, columns[ticker]) for ticker in columns},
+            index=calendar.dates,
+            columns=calendar.tickers,
+            copy=False,
+        )
+
     return pd.concat(
         {ticker: ticker_data[field] for ticker, ticker_data in yahoo_data.items()},
         axis=1,
@@ -27,15 +514,15 @@ def _extract_field(yahoo_data, field):
     ).sort_index(axis=1)
 
 
-def get_closes(yahoo_data):
+def get_closes(yahoo_data, calendar=None):
     """Return a data frame with close prices
     (columns = tickers, index = dates)"""
     LOGGER.info("Loading close prices")
-    return _extract_field(yahoo_data, "Close")
+    return _extract_field(yahoo_data, "Close", calendar)
 
 
-def get_volumes(yahoo_data):
+def get_volumes(yahoo_data, calendar=None):
     """Return a data frame with volumes
     (columns = tickers, index = dates)"""
     LOGGER.info("Loading volumes")
-    return _extract_field(yahoo_data, "Volume")
+    return _extract_field(yahoo_data, "Volume", calendar)
@@ -0,0 +1,236 @@
+"""Shrink the evaluated nodes of a pipeline to a small, representative subset
+of tickers and dates, to use them as test fixtures.
+
+    python -m sample_pipeline.downsample /tmp/cached_pipeline/synthetic/master \\
+        sample_fixtures --tickers 4 --dates 20 --required-tickers AAPL AMZN
+
+The input is either a directory with one '<node>.pickle' file per node (like the
+cached pipeline of tests_3) or a pickle file with a dict node => value (like the
+non-regression data). The output is a directory with one pickle file per node,
+that can be loaded with sample_pipeline.fixtures.cached_fixtures.
+
+The same tickers and dates are selected in all the source nodes (the price
+data, the calendar, the closes and the volumes). The selection is deterministic,
+and favors the tickers and the dates with missing values. The other nodes
+(e.g. the signals, the portfolio and the signal statistics) are recomputed
+with the pipeline on the downsampled source nodes, so that each node is
+consistent with its inputs."""
+
+import argparse
+import logging
+import pickle
+import sys
+import zlib
+from collections import namedtuple
+from pathlib import Path
+
+import dask
+import numpy as np
+import pandas as pd
+from dask.delayed import Delayed
+
+from .data import Calendar, _as_slice
+from .pipeline import get_full_pipeline
+
+LOGGER = logging.getLogger(__name__)
+
+# The nodes that are restricted to the sample. The other nodes are recomputed
+SOURCE_NODES = ("yahoo_data", "calendar", "closes", "volumes")
+
+Sample = namedtuple("Sample", ["all_tickers", "tickers", "start_date", "end_date"])
+
+
+def load_pipeline_outputs(path):
+    """Load the evaluated nodes from a directory of pickle files,
+    or from a pickle file with a dict"""
+    path = Path(path)
+    if path.is_dir():
+        outputs = {}
+        for file in sorted(path.glob("*.pickle")):
+            with open(file, "rb") as fp:
+                outputs[file.stem] = pickle.load(fp)
+        return outputs
+    with open(path, "rb") as fp:
+        return pickle.load(fp)
+
+
+def write_pipeline_outputs(outputs, path):
+    """Write the nodes to a directory, with one pickle file per node"""
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    for name, value in outputs.items():
+        with open(path / f"{name}.pickle", "wb") as fp:
+            pickle.dump(value, fp, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _missing_values(closes, volumes):
+    """The number of missing values per date and ticker (a data frame)"""
+    missing = closes.isnull().astype(int)
+    if volumes is not None:
+        missing = missing + volumes.isnull().astype(int)
+    return missing
+
+
+def select_tickers(missing, n_tickers, required_tickers=()):
+    """Select the required tickers, then (at most) half of the remaining slots for the
+    tickers with the most missing values, and fill the rest with a deterministic
+    pseudo-random choice"""
+    tickers = [ticker for ticker in required_tickers if ticker in missing.columns]
+    remaining = [ticker for ticker in missing.columns if ticker not in tickers]
+
+    n_missing = missing[remaining].sum()
+    with_missing = sorted(
+        n_missing[n_missing > 0].index, key=lambda ticker: (-n_missing[ticker], ticker)
+    )
+    slots = max(n_tickers - len(tickers), 0)
+    tickers.extend(with_missing[: (slots + 1) // 2])
+
+    others = sorted(
+        (ticker for ticker in remaining if ticker not in tickers),
+        key=lambda ticker: zlib.crc32(str(ticker).encode()),
+    )
+    tickers.extend(others[: max(n_tickers - len(tickers), 0)])
+    return sorted(tickers)
+
+
+def select_dates(missing, n_dates):
+    """Return the first and last dates of the window of n_dates consecutive dates
+    with the most missing values (the most recent window in case of a tie)"""
+    n_dates = min(n_dates, len(missing.index))
+    per_date = np.concatenate([[0], np.cumsum(missing.sum(axis=1).to_numpy())])
+    per_window = per_date[n_dates:] - per_date[:-n_dates]
+    start = len(per_window) - 1 - int(np.argmax(per_window[::-1]))
+    return missing.index[start], missing.index[start + n_dates - 1]
+
+
+def _downsample_calendar(calendar, sample):
+    rows = (calendar.dates >= sample.start_date) & (calendar.dates <= sample.end_date)
+    first, last = map(int, np.flatnonzero(rows)[[0, -1]])
+    tickers = pd.Index(
+        [ticker for ticker in calendar.tickers if ticker in sample.tickers]
+    )
+    positions = {}
+    for ticker in tickers:
+        ticker_positions = calendar.positions[ticker]
+        if isinstance(ticker_positions, slice):
+            start, stop, _ = ticker_positions.indices(len(calendar.dates))
+            start, stop = max(start, first), max(min(stop, last + 1), first)
+            positions[ticker] = slice(start - first, stop - first)
+        else:
+            # The positions in the sample can be consecutive, like in get_calendar
+            positions[ticker] = _as_slice(
+                ticker_positions[
+                    (ticker_positions >= first) & (ticker_positions <= last)
+                ]
+                - first
+            )
+    availability = calendar.availability[rows][:, calendar.tickers.get_indexer(tickers)]
+    return Calendar(calendar.dates[rows], tickers, positions, availability)
+
+
+def downsample_value(value, sample):
+    """Restrict a node output to the tickers and dates of the sample"""
+    if isinstance(value, pd.DataFrame):
+        if isinstance(value.index, pd.DatetimeIndex):
+            start_date, end_date = sample.start_date, sample.end_date
+            value = value.loc[start_date:end_date]
+        if value.columns.isin(sample.all_tickers).any():
+            value = value[
+                [ticker for ticker in value.columns if ticker in sample.tickers]
+            ]
+        return value.copy()
+    if isinstance(value, Calendar):
+        return _downsample_calendar(value, sample)
+    if isinstance(value, dict):
+        if value and all(key in sample.all_tickers for key in value):
+            value = {key: item for key, item in value.items() if key in sample.tickers}
+        return {key: downsample_value(item, sample) for key, item in value.items()}
+    return value
+
+
+def recompute_nodes(sources, names, get_pipeline, pipeline_kwargs):
+    """Compute the nodes 'names' of the pipeline get_pipeline(**pipeline_kwargs)
+    from the values of the source nodes (a dict name => value), and return a
+    dict name => value for the nodes that only depend on the source nodes"""
+    full_pipeline = get_pipeline(**pipeline_kwargs)
+    dependencies = {
+        name: set(node.dask.dependencies[name]) for name, node in full_pipeline.items()
+    }
+
+    def _from_sources(name):
+        if name in sources:
+            return True
+        return bool(dependencies.get(name)) and all(
+            map(_from_sources, dependencies[name])
+        )
+
+    names = [name for name in names if name in full_pipeline and _from_sources(name)]
+    graph = {}
+    for node in full_pipeline.values():
+        graph.update(node.dask)
+    graph.update(sources)
+    values = dask.compute(*[Delayed(name, graph) for name in names], scheduler="sync")
+    return dict(zip(names, values))
+
+
+def downsample_pipeline(
+    outputs,
+    n_tickers=4,
+    n_dates=20,
+    required_tickers=(),
+    get_pipeline=get_full_pipeline,
+):
+    """Return the node outputs restricted to n_tickers and n_dates. The tickers
+    and the dates are selected on the 'closes' and 'volumes' nodes. The source
+    nodes are restricted to the sample, and the other nodes are recomputed with
+    get_pipeline(tickers, start_date, end_date) when they only depend on the
+    source nodes (otherwise they are restricted to the sample, too)"""
+    missing = _missing_values(outputs["closes"], outputs.get("volumes"))
+    tickers = select_tickers(missing, n_tickers, required_tickers)
+    start_date, end_date = select_dates(missing[tickers], n_dates)
+    LOGGER.info(f"Downsampling to {tickers} from {start_date} to {end_date}")
+
+    sample = Sample(set(missing.columns), set(tickers), start_date, end_date)
+    sources = {
+        name: downsample_value(value, sample)
+        for name, value in outputs.items()
+        if name in SOURCE_NODES
+    }
+    recomputed = recompute_nodes(
+        sources,
+        [name for name in outputs if name not in sources],
+        get_pipeline,
+        dict(tickers=set(tickers), start_date=start_date, end_date=end_date),
+    )
+    LOGGER.info(f"Recomputed {list(recomputed)}")
+    downsampled = dict(sources, **recomputed)
+    for name, value in outputs.items():
+        if name not in downsampled:
+            downsampled[name] = downsample_value(value, sample)
+    return {name: downsampled[name] for name in outputs}
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m sample_pipeline.downsample",
+        description="Shrink the evaluated pipeline nodes to small test fixtures",
+    )
+    parser.add_argument("input", type=Path, help="A directory or a pickle file")
+    parser.add_argument("output", type=Path, help="The output directory")
+    parser.add_argument("--tickers", type=int, default=4)
+    parser.add_argument("--dates", type=int, default=20)
+    parser.add_argument("--required-tickers", nargs="*", default=[])
+    args = parser.parse_args(args)
+
+    outputs = downsample_pipeline(
+        load_pipeline_outputs(args.input),
+        n_tickers=args.tickers,
+        n_dates=args.dates,
+        required_tickers=args.required_tickers,
+    )
+    write_pipeline_outputs(outputs, args.output)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    main()
@@ -0,0 +1,96 @@
+"""Evaluation of the signals against the close prices: the daily PnL of each
+signal (the signal values are the positions, held from one close to the next),
+its Sharpe ratio and its turnover.
+
+The signals are stacked by chunks into 3D arrays (signals × dates × tickers),
+and the statistics are computed for all the signals of a chunk at once. The
+chunk size bounds the memory used by the stacked signals."""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+from .portfolio import stack_signals
+
+LOGGER = logging.getLogger(__name__)
+
+TRADING_DAYS_PER_YEAR = 252
+SIGNAL_STATS = ["pnl", "volatility", "sharpe", "turnover"]
+
+# The maximum size of the stacked signals for one chunk. Chunks of a few MB
+# keep the intermediate arrays in the CPU caches, which is faster than
+# larger chunks
+EVALUATION_MAX_BYTES = 2 ** 24
+
+
+def get_returns(closes):
+    """The daily returns from one close to the next, as a 2D array
+    with one less row than closes, and zero when a price is missing"""
+    values = closes.to_numpy(dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns = values[1:] / values[:-1] - 1.0
+    return np.where(np.isfinite(returns), returns, 0.0)
+
+
+def _chunk_size(n_signals, n_dates, n_tickers, max_bytes):
+    """The number of signals per chunk for the stacked signals to fit in max_bytes"""
+    signal_bytes = max(n_dates * n_tickers * 8, 1)
+    return int(min(max(max_bytes // signal_bytes, 1), max(n_signals, 1)))
+
+
+def evaluate_signals(stacked, returns):
+    """The daily PnL (signals × dates-1) and the daily turnover
+    (signals × dates-1) of the stacked signals (signals × dates × tickers)"""
+    positions = np.where(np.isnan(stacked), 0.0, stacked)
+    pnl = np.einsum("sdt,dt->sd", positions[:, :-1], returns)
+
+    # The differences are computed in place to limit the memory traffic
+    changes = np.subtract(positions[:, 1:], positions[:, :-1])
+    turnover = np.abs(changes, out=changes).sum(axis=2)
+    return pnl, turnover
+
+
+def get_signal_pnl(signals, closes, chunk_size=None, max_bytes=EVALUATION_MAX_BYTES):
+    """Return the daily PnL (dates × signals) and the daily turnover
+    (dates × signals) of the signals, computed by chunks of 'chunk_size' signals
+    (default: as many signals as fit in max_bytes)"""
+    index, columns = closes.index, closes.columns
+    names = list(signals)
+    if chunk_size is None:
+        chunk_size = _chunk_size(len(names), len(index), len(columns), max_bytes)
+    assert chunk_size > 0, chunk_size
+
+    returns = get_returns(closes)
+    pnl = np.empty((len(names), max(len(index) - 1, 0)))
+    turnover = np.empty_like(pnl)
+    for start in range(0, len(names), chunk_size):
+        rows = slice(start, start + chunk_size)
+        chunk = {name: signals[name] for name in names[rows]}
+        stacked = stack_signals(chunk, index, columns)
+        pnl[rows], turnover[rows] = evaluate_signals(stacked, returns)
+
+    return (
+        pd.DataFrame(pnl.T, index=index[1:], columns=names),
+        pd.DataFrame(turnover.T, index=index[1:], columns=names),
+    )
+
+
+def get_signal_stats(signals, closes, chunk_size=None, max_bytes=EVALUATION_MAX_BYTES):
+    """Return a data frame with one row per signal, and the total PnL,
+    the annualized volatility and Sharpe ratio, and the mean daily turnover"""
+    LOGGER.info("Evaluating the signals")
+    pnl, turnover = get_signal_pnl(signals, closes, chunk_size, max_bytes)
+    volatility = pnl.std() * np.sqrt(TRADING_DAYS_PER_YEAR)
+    sharpe = pnl.mean() * TRADING_DAYS_PER_YEAR / volatility.where(volatility > 0)
+    stats = pd.DataFrame(
+        {
+            "pnl": pnl.sum(),
+            "volatility": volatility,
+            "sharpe": sharpe,
+            "turnover": turnover.mean(),
+        },
+        columns=SIGNAL_STATS,
+    )
+    stats.index.name = "signal"
+    return stats
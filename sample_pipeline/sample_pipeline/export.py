@@ -0,0 +1,159 @@
+"""Export the pipeline outputs to a partitioned Parquet dataset, and read
+them back. The dataset has one directory per node, e.g.
+
+    closes/year=2021/part-0.parquet
+    signals/signal=BUY_AAPL/year=2021/part-0.parquet
+
+(index = dates, columns = tickers). This requires pyarrow.
+
+The export is streamed by year: the pipeline is computed on the data of one
+year, the partitions of that year are written, and they are released before
+the next year is computed. The peak memory is that of one year of data,
+whatever the length of the history. This requires the exported nodes to
+depend only on the data at their own dates, which is the case for the closes,
+the volumes and the BUY_* signals."""
+
+import logging
+import shutil
+from pathlib import Path
+
+import dask
+import pandas as pd
+
+from .pipeline import get_full_pipeline
+
+LOGGER = logging.getLogger(__name__)
+
+EXPORTED_NODES = ("closes", "volumes", "signals")
+PARTITION_FILE = "part-0.parquet"
+
+
+def get_years(start_date, end_date):
+    """Return the list of the (first date, last date) of each year between
+    start_date and end_date"""
+    start_date, end_date = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    return [
+        (
+            max(start_date, pd.Timestamp(year, 1, 1)),
+            min(end_date, pd.Timestamp(year, 12, 31)),
+        )
+        for year in range(start_date.year, end_date.year + 1)
+    ]
+
+
+def write_partition(df, path, year):
+    """Write the data frame of one year (index = dates) to its partition
+    under 'path'. Return the list of the files written"""
+    if not len(df):
+        return []
+    partition_path = Path(path) / f"year={year}"
+    partition_path.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(partition_path / PARTITION_FILE)
+    return [partition_path / PARTITION_FILE]
+
+
+def export_partition(value, path, year):
+    """Write one year of the output of a node - a data frame, or a dict of
+    data frames like the signals - to 'path'. Return the list of the files
+    written"""
+    if isinstance(value, dict):
+        files = []
+        for name, df in value.items():
+            files.extend(write_partition(df, Path(path) / f"signal={name}", year))
+        return files
+    return write_partition(value, path, year)
+
+
+def export_pipeline_outputs(
+    path,
+    tickers,
+    start_date,
+    end_date,
+    data_source="yahoo",
+    nodes=EXPORTED_NODES,
+    get_pipeline=get_full_pipeline,
+    **kwargs,
+):
+    """Export the given nodes of the pipeline to 'path', one year at a time.
+
+    For each year, the nodes of get_pipeline(tickers, first date, last date,
+    data_source) are computed, written to the partitions of the year, and
+    released before the next year is computed. The previous content of the
+    node directories is removed, so that no stale partition is read back.
+    The keyword arguments are passed to dask.compute. Return the list of the
+    files written"""
+    path = Path(path)
+    for name in nodes:
+        if (path / name).exists():
+            shutil.rmtree(path / name)
+
+    files = []
+    for first_date, last_date in get_years(start_date, end_date):
+        LOGGER.info(f"Exporting {list(nodes)} from {first_date} to {last_date}")
+        full_pipeline = get_pipeline(tickers, first_date, last_date, data_source)
+        files.extend(
+            _export_year(full_pipeline, nodes, path, first_date.year, **kwargs)
+        )
+    return files
+
+
+def _export_year(full_pipeline, nodes, path, year, **kwargs):
+    """Compute and export the nodes for one year. Their outputs are released
+    when this function returns"""
+    values = dask.compute(*[full_pipeline[name] for name in nodes], **kwargs)
+    files = []
+    for name, value in zip(nodes, values):
+        files.extend(export_partition(value, path / name, year))
+    return files
+
+
+def _partition_values(path, key):
+    """The values of the 'key=value' sub-directories of 'path'"""
+    return sorted(
+        child.name.split("=", 1)[1]
+        for child in Path(path).iterdir()
+        if child.is_dir() and child.name.startswith(f"{key}=")
+    )
+
+
+def _read_years(path, start_date, end_date, tickers):
+    start_date = None if start_date is None else pd.Timestamp(start_date)
+    end_date = None if end_date is None else pd.Timestamp(end_date)
+    partitions = []
+    for year in _partition_values(path, "year"):
+        if start_date is not None and int(year) < start_date.year:
+            continue
+        if end_date is not None and int(year) > end_date.year:
+            continue
+        partitions.append(
+            pd.read_parquet(
+                Path(path) / f"year={year}" / PARTITION_FILE,
+                columns=None if tickers is None else sorted(tickers),
+            )
+        )
+    if not partitions:
+        raise ValueError(f"No data in {path} between {start_date} and {end_date}")
+    df = pd.concat(partitions)
+    return df.loc[start_date:end_date]
+
+
+def read_partitioned(
+    path, node, start_date=None, end_date=None, tickers=None, signals=None
+):
+    """Read a node exported with export_pipeline_outputs. Only the partitions
+    for the requested dates and signals, and the requested tickers, are loaded.
+    Return a data frame, or a dict signal name => data frame for the signals"""
+    path = Path(path) / node
+    if node != "signals":
+        return _read_years(path, start_date, end_date, tickers)
+
+    names = _partition_values(path, "signal")
+    if signals is not None:
+        missing = set(signals).difference(names)
+        if missing:
+            raise KeyError(f"Signals {sorted(missing)} were not exported to {path}")
+        names = [name for name in names if name in signals]
+    return {
+        name: _read_years(path / f"signal={name}", start_date, end_date, tickers)
+        for name in names
+    }
@@ -0,0 +1,102 @@
+"""Generate one pytest fixture per node of a Dask pipeline"""
+
+import pickle
+from inspect import Parameter, signature
+from pathlib import Path
+
+import pytest
+from dask.delayed import Delayed
+
+
+def _pipeline_fixture(get_pipeline, scope):
+    parameters = signature(get_pipeline).parameters
+
+    @pytest.fixture(scope=scope, name="full_pipeline")
+    def full_pipeline(request):
+        """The pipeline, built with the fixtures named after the arguments
+        of the pipeline function (optional arguments keep their default
+        value when there is no such fixture)"""
+        kwargs = {}
+        for name, parameter in parameters.items():
+            try:
+                kwargs[name] = request.getfixturevalue(name)
+            except pytest.FixtureLookupError:
+                if parameter.default is Parameter.empty:
+                    raise
+        return get_pipeline(**kwargs)
+
+    return full_pipeline
+
+
+def _node_fixture(name, scope, ancestors):
+    def node_fixture(request, full_pipeline):
+        """The value of the node, computed given the values of its inputs
+        (which are themselves fixtures)"""
+        node = full_pipeline[name]
+        inputs = {
+            input_name: request.getfixturevalue(input_name)
+            for input_name in node.dask.dependencies[name]
+        }
+        return Delayed(name, dict(node.dask, **inputs)).compute()
+
+    # The inputs are requested dynamically, so we record the ancestor nodes
+    # for sample_pipeline.xdist_groups
+    node_fixture.pipeline_ancestors = tuple(ancestors)
+    return pytest.fixture(scope=scope, name=name)(node_fixture)
+
+
+def pipeline_fixtures(get_pipeline, scope="session"):
+    """
+    Return a dict fixture name => fixture, with one fixture per node of the
+    pipeline returned by 'get_pipeline', and a 'full_pipeline' fixture.
+    Use it in a conftest.py with
+
+        globals().update(pipeline_fixtures(get_full_pipeline))
+
+    The required arguments of 'get_pipeline' (e.g. tickers, start_date,
+    end_date) must be available as fixtures, and the nodes must have the same name
+    as their Dask key.
+
+    Each node fixture computes only its own node, and gets its inputs from
+    the fixtures of the parent nodes. So a test pays only for the nodes that
+    it uses, and the node values are shared between the fixtures
+    (for the duration of the 'scope').
+    """
+    # We build the pipeline with placeholder arguments to find the node names
+    # (this is cheap since the pipeline is lazy)
+    placeholders = {
+        name: None
+        for name, parameter in signature(get_pipeline).parameters.items()
+        if parameter.default is Parameter.empty
+    }
+    pipeline = get_pipeline(**placeholders)
+
+    fixtures = {"full_pipeline": _pipeline_fixture(get_pipeline, scope)}
+    for name, node in pipeline.items():
+        ancestors = [key for key in node.dask if key in pipeline and key != name]
+        fixtures[name] = _node_fixture(name, scope, ancestors)
+    return fixtures
+
+
+def _cached_fixture(name, path, scope):
+    @pytest.fixture(scope=scope, name=name)
+    def cached_fixture():
+        """The value of the node, loaded from a pickle file"""
+        with open(path, "rb") as fp:
+            return pickle.load(fp)
+
+    return cached_fixture
+
+
+def cached_fixtures(path, scope="session"):
+    """
+    Return a dict fixture name => fixture, with one fixture per '<node>.pickle'
+    file in the directory 'path' (e.g. the fixtures written by
+    sample_pipeline.downsample). Use it in a conftest.py with
+
+        globals().update(cached_fixtures(path))
+    """
+    return {
+        file.stem: _cached_fixture(file.stem, file, scope)
+        for file in sorted(Path(path).glob("*.pickle"))
+    }
@@ -1,13 +1,43 @@
+import os
+import pickle
 from contextlib import contextmanager
 from importlib import import_module
 from inspect import signature
 from unittest import mock
 
+from dask.base import tokenize
+
 
 class StopComputation(Exception):
     """An exception that stops the current computation"""
 
 
+def resolve_function_path(fun_path):
+    """Return the function with reference 'fun_path', e.g.
+    'sample_pipeline.data._extract_field'"""
+    assert isinstance(fun_path, str)
+    assert "." in fun_path
+    module, fun_name = fun_path.rsplit(".", maxsplit=1)
+    fun = getattr(import_module(module), fun_name)
+    assert callable(fun), "'fun_path' must be a reference to a callable"
+    return fun
+
+
+def _bind_arguments(fun_signature, args, kwargs):
+    """Return a dict argument name => value for a call to a function
+    with the given signature"""
+    # We bind the function arguments with the function signature
+    # (and raise TypeErrors when arguments don't match)
+    bound_args = fun_signature.bind(*args, **kwargs)
+
+    # Positional arguments
+    fun_kwargs = dict(zip(fun_signature.parameters, bound_args.args))
+
+    # Named arguments
+    fun_kwargs.update(bound_args.kwargs)
+    return fun_kwargs
+
+
 @contextmanager
 def intercept_function_arguments(fun_path, ret_kwargs):
     """
@@ -18,37 +48,146 @@ def intercept_function_arguments(fun_path, ret_kwargs):
 
     fun_path: a reference to a Python function (to be mocked using mock.patch)
     ret_kwargs: a (reference) to an empty dictionary
+
+    The arguments are shipped back with the StopComputation exception, so
+    the interception also works when the function is called in another process,
+    e.g. with the "processes" or the distributed scheduler of Dask (the Dask
+    graph must be built within the context manager)
+
+    With these schedulers, only the functions that are nodes of the Dask graph
+    are intercepted: the patched function is shipped to the workers with the
+    graph, but the workers import the original modules, so a call made inside
+    a node (e.g. to 'sample_pipeline.data._extract_field' in 'get_closes')
+    runs the original function. Use the "sync" or the "threads" scheduler
+    to intercept these calls.
     """
     assert (
         isinstance(ret_kwargs, dict) and not ret_kwargs
     ), "ret_kwargs must be an empty dictionary"
 
-    assert isinstance(fun_path, str)
-    assert "." in fun_path
-    module, fun_name = fun_path.rsplit(".", maxsplit=1)
-    fun = getattr(import_module(module), fun_name)
-    assert callable(fun), "'fun_path' must be a reference to a callable"
-
+    fun = resolve_function_path(fun_path)
     fun_signature = signature(fun)
 
     def get_args_and_stop(*args, **kwargs):
-        # We bind the function arguments with the function signature
-        # (and raise TypeErrors when arguments don't match)
-        bound_args = fun_signature.bind(*args, **kwargs)
-
-        # Positional arguments
-        for key, value in zip(fun_signature.parameters, bound_args.args):
-            ret_kwargs[key] = value
-
-        # Named arguments
-        ret_kwargs.update(bound_args.kwargs)
-
-        raise StopComputation()
+        raise StopComputation(_bind_arguments(fun_signature, args, kwargs))
 
     with mock.patch(fun_path, get_args_and_stop):
         try:
             yield
-        except StopComputation:
-            pass
+        except StopComputation as err:
+            (fun_kwargs,) = err.args
+            ret_kwargs.update(fun_kwargs)
         else:
-            raise RuntimeError(f"{fun_path} was not called")
+            raise RuntimeError(
+                f"{fun_path} was not called. If it is called inside a node, "
+                f"use the 'sync' or 'threads' scheduler to intercept it."
+            )
+
+
+class PickledCalls:
+    """A file to which the intercepted calls are appended, one pickle per call.
+    Use it as the 'calls' argument of 'intercept_function_calls' when the
+    calls should be streamed to disk rather than kept in memory, or when
+    the function is called in other processes (each call is written with a
+    single write to a file opened in append mode, so that the calls of
+    concurrent processes are not interleaved)"""
+
+    def __init__(self, path):
+        self.path = path
+        # Create the file, so that it can be read even if there is no call
+        open(path, "ab").close()
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.path = state["path"]
+
+    def append(self, call):
+        # The file is opened for each call, so that no file handle is left
+        # open in the processes that unpickle this object
+        data = pickle.dumps(call, protocol=pickle.HIGHEST_PROTOCOL)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        try:
+            # The pickle is written at once, at the end of the file. A second
+            # write for the rest of the data could follow the writes of other
+            # processes, so a partial write is an error
+            written = os.write(fd, data)
+        finally:
+            os.close(fd)
+        if written < len(data):
+            raise OSError(
+                f"Could only write {written} of {len(data)} bytes to {self.path}"
+            )
+
+    def close(self):
+        """Nothing to close, since the file is opened for each call"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __iter__(self):
+        return read_pickled_calls(self.path)
+
+
+def read_pickled_calls(path):
+    """Iterate over the calls recorded in the file at 'path'"""
+    with open(path, "rb") as fp:
+        while True:
+            try:
+                yield pickle.load(fp)
+            except EOFError:
+                return
+
+
+@contextmanager
+def intercept_function_calls(fun_path, calls, call_through=True, hash_arguments=False):
+    """
+    Intercept every call to the function with reference 'fun_path' and append
+    the arguments of each call (a dict argument name => value) to 'calls'
+
+    Unlike 'intercept_function_arguments', the computation is not stopped.
+
+    fun_path: a reference to a Python function (to be mocked using mock.patch)
+    calls: any object with an 'append' method, e.g. a list, a
+        'collections.deque(maxlen=n)' to keep only the last n calls,
+        or a 'PickledCalls' file to stream the calls to disk. Only
+        'PickledCalls' can collect the calls made in other processes.
+    call_through: when True the actual function is called, otherwise
+        the intercepted calls return None
+    hash_arguments: when True, the arguments are recorded with their Dask token
+        (a hash) rather than by reference, so that they can be freed
+        during the computation
+
+    NB: the arguments are never copied, so a function that modifies its
+    arguments in place will also modify the recorded values. As for
+    'intercept_function_arguments', the calls made in other processes are
+    recorded only when the function is a node of the Dask graph: the calls
+    made inside a node in another process are not recorded.
+    """
+    assert hasattr(calls, "append"), "'calls' must have an 'append' method"
+
+    fun = resolve_function_path(fun_path)
+    fun_signature = signature(fun)
+    pid = os.getpid()
+
+    def record_call(*args, **kwargs):
+        if os.getpid() != pid and not isinstance(calls, PickledCalls):
+            raise RuntimeError(
+                f"{fun_path} was called in another process. "
+                f"Use 'PickledCalls' to collect the calls from other processes."
+            )
+
+        fun_kwargs = _bind_arguments(fun_signature, args, kwargs)
+        if hash_arguments:
+            fun_kwargs = {key: tokenize(value) for key, value in fun_kwargs.items()}
+        calls.append(fun_kwargs)
+
+        if call_through:
+            return fun(*args, **kwargs)
+
+    with mock.patch(fun_path, record_call):
+        yield
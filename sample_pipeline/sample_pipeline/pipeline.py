@@ -1,17 +1,44 @@
-from dask.delayed import Delayed, delayed
-
-from .data import get_closes, get_volumes, get_yahoo_data
+from .data import get_calendar, get_closes, get_volumes, get_yahoo_data
+from .evaluation import get_signal_stats
+from .portfolio import get_portfolio
 from .signals import get_signals
+from .spec import PipelineSpec
 
 
-def get_full_pipeline(tickers, start_date, end_date):
-    """Return the full simulation pipeline"""
-    yahoo_data = delayed(get_yahoo_data)(
-        tickers, start_date, end_date, dask_key_name="yahoo_data"
+def get_full_pipeline_spec():
+    """Return the full simulation pipeline as a PipelineSpec, with parameters
+    tickers, start_date, end_date and data_source"""
+    return PipelineSpec(
+        [
+            (
+                "yahoo_data",
+                get_yahoo_data,
+                ("tickers", "start_date", "end_date", "data_source"),
+            ),
+            ("calendar", get_calendar, ("yahoo_data",)),
+            ("volumes", get_volumes, ("yahoo_data", "calendar")),
+            ("closes", get_closes, ("yahoo_data", "calendar")),
+            ("signals", get_signals, ("closes", "volumes", "calendar")),
+            ("portfolio", get_portfolio, ("signals", "calendar")),
+            ("signal_stats", get_signal_stats, ("signals", "closes")),
+        ]
     )
-    volumes = delayed(get_volumes)(yahoo_data, dask_key_name="volumes")
-    closes = delayed(get_closes)(yahoo_data, dask_key_name="closes")
-    signals = delayed(get_signals)(closes, volumes, dask_key_name="signals")  # noqa
 
-    # Return a dict with all the nodes
-    return {name: task for name, task in locals().items() if isinstance(task, Delayed)}
+
+def get_full_pipeline(
+    tickers, start_date, end_date, data_source="yahoo", node_wrapper=None
+):
+    """Return the full simulation pipeline, a dict node name => Delayed object
+
+    data_source: the name of a data source in sample_pipeline.data.DATA_SOURCES
+    node_wrapper: an optional function applied to the node functions, e.g.
+    sample_pipeline.shared_memory.SharedMemoryNode"""
+    return get_full_pipeline_spec().to_delayed(
+        dict(
+            tickers=tickers,
+            start_date=start_date,
+            end_date=end_date,
+            data_source=data_source,
+        ),
+        node_wrapper=node_wrapper,
+    )
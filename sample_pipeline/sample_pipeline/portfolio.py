@@ -0,0 +1,135 @@
+"""Portfolio construction: the signals (a dict of dates × tickers frames) are
+stacked into one 3D array (signals × dates × tickers), normalized, combined
+with weights and capped with array operations over all the signals, dates
+and tickers at once.
+
+The dates are processed by chunks, so that the stacked signals fit in
+'max_bytes' of memory even for hundreds of signals."""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+LOGGER = logging.getLogger(__name__)
+
+# The maximum size of the stacked signals for one chunk of dates
+STACKED_SIGNALS_MAX_BYTES = 2 ** 28
+
+
+def _signal_values(signals, index, columns):
+    """The values of the signals (2D arrays of floats) on the given dates
+    and tickers. These are views on the signals when they are aligned"""
+    values = []
+    for signal in signals.values():
+        if not (signal.index.equals(index) and signal.columns.equals(columns)):
+            signal = signal.reindex(index=index, columns=columns)
+        values.append(signal.to_numpy(dtype=float))
+    return values
+
+
+def stack_signals(signals, index=None, columns=None):
+    """Stack the signals into a 3D array (signals × dates × tickers)
+    on the given dates and tickers (default: those of the first signal)"""
+    first = next(iter(signals.values()))
+    index = first.index if index is None else index
+    columns = first.columns if columns is None else columns
+    return np.stack(_signal_values(signals, index, columns))
+
+
+def normalize_signals(stacked, demean=False):
+    """Normalize each signal at each date to a unit gross exposure (the sum of
+    the absolute values over the tickers), optionally after removing the
+    cross-sectional mean. NaNs are ignored, and the signals with no exposure
+    at a date are zero"""
+    valid = ~np.isnan(stacked)
+    stacked = np.where(valid, stacked, 0.0)
+    if demean:
+        mean = stacked.sum(axis=2, keepdims=True) / np.maximum(
+            valid.sum(axis=2, keepdims=True), 1
+        )
+        stacked = np.where(valid, stacked - mean, 0.0)
+    gross = np.abs(stacked).sum(axis=2, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(gross > 0, stacked / gross, 0.0)
+
+
+def combine_signals(normalized, weights):
+    """Combine the normalized signals (signals × dates × tickers) with the
+    weights, a 1D array (one weight per signal) or a 2D array (one row per
+    portfolio). Returns the positions (dates × tickers, or
+    portfolios × dates × tickers)"""
+    weights = np.asarray(weights, dtype=float)
+    assert weights.shape[-1] == normalized.shape[0], (weights.shape, normalized.shape)
+    return np.tensordot(weights, normalized, axes=([-1], [0]))
+
+
+def cap_positions(positions, max_weight=None, gross_exposure=1.0):
+    """Scale the positions to the gross exposure at each date, and then cap
+    the absolute value of each position at max_weight (the capped exposure
+    is not redistributed to the other tickers)"""
+    gross = np.abs(positions).sum(axis=-1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        positions = np.where(gross > 0, positions * (gross_exposure / gross), 0.0)
+    if max_weight is not None:
+        np.clip(positions, -max_weight, max_weight, out=positions)
+    return positions
+
+
+def _weights_array(signals, weights):
+    """The weights as an array aligned with the signals
+    (equal weights by default, and zero for the signals not in 'weights')"""
+    if weights is None:
+        return np.full(len(signals), 1.0 / len(signals))
+    unknown = set(weights).difference(signals)
+    if unknown:
+        raise KeyError(f"No signal named {sorted(unknown)}")
+    return np.array([weights.get(name, 0.0) for name in signals], dtype=float)
+
+
+def _chunk_size(n_signals, n_dates, n_tickers, max_bytes):
+    """The number of dates per chunk for the stacked signals to fit in max_bytes"""
+    row_bytes = max(n_signals * n_tickers * 8, 1)
+    return int(min(max(max_bytes // row_bytes, 1), max(n_dates, 1)))
+
+
+def get_portfolio(
+    signals,
+    calendar=None,
+    weights=None,
+    max_weight=0.5,
+    gross_exposure=1.0,
+    demean=False,
+    max_bytes=STACKED_SIGNALS_MAX_BYTES,
+):
+    """Return the portfolio (the positions, with the same dates and tickers as
+    the signals) that combines the normalized signals with the weights (a dict
+    signal name => weight, default: equal weights), with at most max_weight
+    per position. The positions are NaN when the ticker is not available"""
+    LOGGER.info("Computing the portfolio")
+    assert signals, "The portfolio requires at least one signal"
+    first = next(iter(signals.values()))
+    index, columns = first.index, first.columns
+    weights = _weights_array(signals, weights)
+
+    values = _signal_values(signals, index, columns)
+    if calendar is not None:
+        availability = calendar.availability_frame().reindex(
+            index=index, columns=columns, fill_value=False
+        )
+        availability = availability.to_numpy(dtype=bool)
+
+    positions = np.empty((len(index), len(columns)))
+    chunk_size = _chunk_size(len(signals), len(index), len(columns), max_bytes)
+    for start in range(0, len(index), chunk_size):
+        rows = slice(start, start + chunk_size)
+        stacked = np.stack([signal_values[rows] for signal_values in values])
+        if calendar is None:
+            available = ~np.isnan(stacked).all(axis=0)
+        else:
+            available = availability[rows]
+        combined = combine_signals(normalize_signals(stacked, demean), weights)
+        capped = cap_positions(combined, max_weight, gross_exposure)
+        positions[rows] = np.where(available, capped, np.nan)
+
+    return pd.DataFrame(positions, index=index, columns=columns)
@@ -0,0 +1,238 @@
+"""Capture the arguments of a pipeline function in a snapshot on disk,
+and replay the function on the snapshot to measure its performance.
+
+Usage:
+    python -m sample_pipeline.replay run SNAPSHOT [--number N] [--json]
+    python -m sample_pipeline.replay compare SNAPSHOT REVISION [REVISION ...]
+"""
+
+import argparse
+import json
+import logging
+import os
+import pickle
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from .intercept_function_arguments import (
+    intercept_function_arguments,
+    resolve_function_path,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+# The revision name for the current working tree in 'compare_revisions'
+WORKING_TREE = "."
+
+
+def save_snapshot(fun_path, fun_kwargs, snapshot_path):
+    """Save the arguments of a call to the function 'fun_path' on disk"""
+    with open(snapshot_path, "wb") as fp:
+        pickle.dump(
+            {"fun_path": fun_path, "kwargs": fun_kwargs},
+            fp,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+
+
+def load_snapshot(snapshot_path):
+    """Return the function path and the arguments saved in a snapshot"""
+    with open(snapshot_path, "rb") as fp:
+        snapshot = pickle.load(fp)
+    return snapshot["fun_path"], snapshot["kwargs"]
+
+
+def capture_snapshot(fun_path, compute, snapshot_path):
+    """Run 'compute', intercept the first call to 'fun_path', and save the
+    arguments of that call in a snapshot on disk"""
+    fun_kwargs = {}
+    with intercept_function_arguments(fun_path, fun_kwargs):
+        compute()
+
+    LOGGER.info(f"Saving the arguments of {fun_path} to {snapshot_path}")
+    save_snapshot(fun_path, fun_kwargs, snapshot_path)
+    return fun_kwargs
+
+
+def measure(fun, fun_kwargs, number=10):
+    """Call 'fun' with the given arguments 'number' times and return
+    timing statistics (in seconds) and the peak memory allocated by one call
+    (in bytes, measured in an additional call as tracemalloc slows down
+    the execution)"""
+    assert number >= 1, "'number' must be at least 1"
+
+    timings = []
+    for _ in range(number):
+        start = time.perf_counter()
+        fun(**fun_kwargs)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fun(**fun_kwargs)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "number": number,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.mean(timings),
+        "max": max(timings),
+        "peak_memory": peak_memory,
+    }
+
+
+def replay_snapshot(snapshot_path, number=10):
+    """Replay the function saved in the snapshot on its arguments and
+    return the timing and memory statistics"""
+    fun_path, fun_kwargs = load_snapshot(snapshot_path)
+    stats = measure(resolve_function_path(fun_path), fun_kwargs, number=number)
+    return dict(stats, fun_path=fun_path)
+
+
+def _git(*args, cwd):
+    return subprocess.run(
+        ["git", *args],
+        cwd=cwd,
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout.strip()
+
+
+def _replay_in_source_tree(snapshot_path, number, source_path):
+    """Replay the snapshot in a subprocess that imports sample_pipeline
+    from 'source_path'. The subprocess runs in 'source_path', since
+    'python -m' puts the current directory before PYTHONPATH in sys.path"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [str(source_path)] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else [])
+    )
+
+    def _run(*args):
+        return subprocess.run(
+            [sys.executable, *args],
+            cwd=source_path,
+            env=env,
+            check=True,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+        ).stdout
+
+    # Make sure that the timings are those of the code in 'source_path'
+    source = Path(
+        _run("-c", "import sample_pipeline; print(sample_pipeline.__file__)").strip()
+    ).resolve()
+    if Path(source_path).resolve() not in source.parents:
+        raise RuntimeError(f"sample_pipeline was imported from {source}")
+
+    output = _run(
+        "-m",
+        "sample_pipeline.replay",
+        "run",
+        str(snapshot_path),
+        "--number",
+        str(number),
+        "--json",
+    )
+    return dict(json.loads(output), source=str(source.parent))
+
+
+def compare_revisions(snapshot_path, revisions, number=10):
+    """Replay the snapshot with the code of each git revision, and return
+    a dict revision => statistics. Use '.' for the current working tree.
+
+    Each revision is checked out in a temporary git worktree, and must
+    include this module. The statistics include the 'source' directory of
+    the sample_pipeline package that was replayed."""
+    snapshot_path = Path(snapshot_path).resolve()
+    source_path = Path(__file__).resolve().parents[1]
+    repo_root = Path(_git("rev-parse", "--show-toplevel", cwd=source_path))
+    package_root = source_path.relative_to(repo_root)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for revision in revisions:
+            if revision == WORKING_TREE:
+                results[revision] = _replay_in_source_tree(
+                    snapshot_path, number, source_path
+                )
+                continue
+
+            worktree = Path(tmpdir) / f"worktree_{len(results)}"
+            _git("worktree", "add", "--detach", str(worktree), revision, cwd=repo_root)
+            try:
+                results[revision] = _replay_in_source_tree(
+                    snapshot_path, number, worktree / package_root
+                )
+            finally:
+                _git("worktree", "remove", "--force", str(worktree), cwd=repo_root)
+
+    return results
+
+
+def format_comparison(results):
+    """Format the output of 'compare_revisions' as a table"""
+    lines = [
+        f"{'revision':<20} {'median (s)':>12} {'min (s)':>12} "
+        f"{'peak memory (MB)':>18} {'ratio':>8}"
+    ]
+    reference = None
+    for revision, stats in results.items():
+        if reference is None:
+            reference = stats["median"]
+        lines.append(
+            f"{revision:<20} {stats['median']:>12.6f} {stats['min']:>12.6f} "
+            f"{stats['peak_memory'] / 2**20:>18.3f} "
+            f"{stats['median'] / reference:>8.3f}"
+        )
+    return "\n".join(lines)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m sample_pipeline.replay",
+        description="Replay a pipeline function on a snapshot of its arguments",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser("run", help="Replay the snapshot")
+    run_parser.add_argument("snapshot")
+    run_parser.add_argument("--number", type=int, default=10)
+    run_parser.add_argument("--json", action="store_true", help="JSON output")
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Replay the snapshot with the code of each git revision"
+    )
+    compare_parser.add_argument("snapshot")
+    compare_parser.add_argument(
+        "revisions", nargs="+", help=f"git revisions, or '{WORKING_TREE}'"
+    )
+    compare_parser.add_argument("--number", type=int, default=10)
+    compare_parser.add_argument("--json", action="store_true", help="JSON output")
+
+    args = parser.parse_args(args)
+    if args.command == "run":
+        results = replay_snapshot(args.snapshot, number=args.number)
+    else:
+        results = compare_revisions(args.snapshot, args.revisions, number=args.number)
+
+    if args.json:
+        print(json.dumps(results))
+    elif args.command == "run":
+        print(format_comparison({WORKING_TREE: results}))
+    else:
+        print(format_comparison(results))
+
+
+if __name__ == "__main__":
+    main()
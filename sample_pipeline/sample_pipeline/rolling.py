@@ -0,0 +1,185 @@
+"""Rolling-window kernels for the wide closes/volumes data frames
+(columns = tickers, index = dates). The kernels operate on all the tickers
+at once, with numpy operations on the underlying 2D arrays"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+LOGGER = logging.getLogger(__name__)
+
+# The rolling sums are computed by blocks of ROLLING_SUM_BLOCK rows (at least),
+# with cumulative sums that restart at each block, and values centered on their
+# mean over the block. This bounds the rounding errors on long histories
+ROLLING_SUM_BLOCK = 256
+
+# The variances below this fraction of the mean square of the (centered)
+# values are rounding errors, and are taken as zero
+VARIANCE_TOLERANCE = 1e-12
+
+# The EWMA is computed by blocks of rows over which the weights of the
+# observations grow by at most 2**EWMA_MAX_EXPONENT
+EWMA_MAX_EXPONENT = 64
+
+
+def _windowed_sums(cumsum, window, offset):
+    """The sums over the windows that end at the rows 'offset', 'offset' + 1, ...
+    of an array, given its cumulative sum (the array starts at most 'window'
+    rows before 'offset')"""
+    sums = cumsum[offset:].copy()
+    shifted = max(window, offset)
+    if shifted < len(cumsum):
+        rows = slice(shifted - offset, None)
+        earlier = slice(shifted - window, len(cumsum) - window)
+        sums[rows] -= cumsum[earlier]
+    return sums
+
+
+def _rolling_moments(df, window, min_periods, block_size=ROLLING_SUM_BLOCK):
+    """Return the number of valid observations, the sums and the sums of squares
+    over the rolling windows, of the values minus the offsets (also returned)
+    used to center them"""
+    values = df.to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+    counts, sums, squares, offsets = (np.empty_like(values) for _ in range(4))
+
+    block_size = max(block_size, window)
+    for start in range(0, len(values), block_size):
+        # The block starts 'window' rows earlier, for the first windows
+        first, stop = max(start - window, 0), min(start + block_size, len(values))
+        block, rows = slice(first, stop), slice(start, stop)
+
+        # We center the values to limit the cancellation errors in the variance
+        block_valid = valid[block]
+        offset = np.where(block_valid, values[block], 0.0).sum(axis=0) / np.maximum(
+            block_valid.sum(axis=0), 1
+        )
+        centered = np.where(block_valid, values[block] - offset, 0.0)
+
+        offsets[rows] = offset
+        for out, block_values in [
+            (counts, block_valid.astype(float)),
+            (sums, centered),
+            (squares, centered * centered),
+        ]:
+            cumsum = np.cumsum(block_values, axis=0)
+            out[rows] = _windowed_sums(cumsum, window, start - first)
+
+    enough = counts >= (window if min_periods is None else min_periods)
+    return counts, sums, squares, offsets, enough
+
+
+def _mean(moments):
+    counts, sums, _, offsets, enough = moments
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(enough, sums / counts + offsets, np.nan)
+
+
+def _std(moments, ddof=1):
+    counts, sums, squares, _, enough = moments
+    with np.errstate(invalid="ignore", divide="ignore"):
+        deviations = np.maximum(squares - sums * sums / counts, 0.0)
+        # The windows with a constant value have a zero variance
+        deviations[deviations <= VARIANCE_TOLERANCE * squares] = 0.0
+        variance = deviations / (counts - ddof)
+    return np.sqrt(np.where(enough & (counts > ddof), variance, np.nan))
+
+
+def rolling_mean(df, window, min_periods=None):
+    """The rolling mean over 'window' rows, ignoring NaNs, and NaN when there
+    are fewer than 'min_periods' observations (default: window)"""
+    mean = _mean(_rolling_moments(df, window, min_periods))
+    return pd.DataFrame(mean, index=df.index, columns=df.columns)
+
+
+def rolling_std(df, window, min_periods=None, ddof=1):
+    """The rolling standard deviation over 'window' rows, ignoring NaNs"""
+    std = _std(_rolling_moments(df, window, min_periods), ddof)
+    return pd.DataFrame(std, index=df.index, columns=df.columns)
+
+
+def ewma(df, halflife):
+    """The exponentially weighted moving average with the given half-life
+    (in rows). NaNs are skipped, like pandas' ewm(adjust=False, ignore_na=True)"""
+    alpha = 1.0 - np.exp(-np.log(2.0) / halflife)
+    values = df.to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+    result = np.empty_like(values)
+
+    # Within a block, the average after n observations is
+    #   2**(-n / halflife) * (initial value + sum of alpha * x_j * 2**(n_j / halflife))
+    # where n_j counts the observations up to x_j. The weights grow by at most
+    # 2**EWMA_MAX_EXPONENT over a block, and the last average of the block is
+    # the initial value of the next one
+    block_size = max(min(int(EWMA_MAX_EXPONENT * halflife), len(values)), 1)
+    # The growth of the weights after 0, 1, 2... observations
+    growth_table = np.exp2(np.arange(block_size + 1) / halflife)
+    state = np.full(values.shape[1:], np.nan)
+    for start in range(0, len(values), block_size):
+        block = slice(start, start + block_size)
+        block_values, block_valid = values[block], valid[block]
+        if block_valid.all():
+            counts = np.arange(1, len(block_values) + 1)[:, None]
+        else:
+            counts = np.cumsum(block_valid, axis=0)
+        growth = growth_table[counts]
+
+        # The tickers with no average yet start at their first value
+        first = block_values[block_valid.argmax(axis=0), np.arange(len(state))]
+        initial = np.where(np.isnan(state), first, state)
+
+        # The operations are done in place, on arrays of the size of the block
+        averages = np.multiply(block_values, growth)
+        averages[~block_valid] = 0.0
+        averages *= alpha
+        np.cumsum(averages, axis=0, out=averages)
+        averages += initial
+        averages /= growth
+        averages[np.isnan(state) & (counts == 0)] = np.nan
+
+        result[block] = averages
+        state = averages[-1]
+
+    return pd.DataFrame(result, index=df.index, columns=df.columns)
+
+
+def rolling_zscore(df, window, min_periods=None):
+    """The distance to the rolling mean, in rolling standard deviations
+    (zero when the values are constant over the window)"""
+    # The mean and the standard deviation share the same rolling sums
+    moments = _rolling_moments(df, window, min_periods)
+    mean, std = _mean(moments), _std(moments)
+    values = df.to_numpy(dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        zscore = np.where(std > 0, (values - mean) / std, np.nan)
+    zscore[(std == 0) & ~np.isnan(values)] = 0.0
+    return pd.DataFrame(zscore, index=df.index, columns=df.columns)
+
+
+def rolling_volume_ratio(volumes, window, min_periods=None):
+    """The ratio of the volumes to their rolling mean"""
+    mean = rolling_mean(volumes, window, min_periods)
+    return volumes / mean.where(mean > 0)
+
+
+def get_availability(closes, volumes):
+    """True when a ticker has either a close price or a volume at that date
+    (the 'shape_df' of get_signals)"""
+    return (~closes.isnull()) | (~volumes.isnull())
+
+
+def get_rolling_signals(closes, volumes, window=20, halflife=10, calendar=None):
+    """Return a collection of rolling-window signals with the same resolution
+    as past prices, and NaN when the ticker is not available"""
+    LOGGER.info("Computing rolling signals")
+    if calendar is None:
+        availability = get_availability(closes, volumes)
+    else:
+        availability = calendar.availability_frame()
+    signals = {
+        "CLOSE_ZSCORE": rolling_zscore(closes, window),
+        "CLOSE_EWMA_TREND": closes / ewma(closes, halflife) - 1.0,
+        "VOLUME_RATIO": rolling_volume_ratio(volumes, window),
+    }
+    return {name: signal.where(availability) for name, signal in signals.items()}
@@ -0,0 +1,389 @@
+"""A local HTTP server that keeps the pipeline nodes warm in memory.
+
+    python -m sample_pipeline.server --port 8765
+
+The nodes are requested with
+
+    GET /nodes/<node>?tickers=AAPL,MSFT&start_date=2021-01-04&end_date=2021-01-29
+
+(and optionally &data_source=synthetic&format=arrow|pickle). The default
+data source is "yahoo_cached", which shares the downloads between the
+pipelines of the server. Data frames are returned as Arrow IPC streams when
+pyarrow is available, and other values are pickled. For nodes that are dicts
+(e.g. the signals), the server returns the list of the keys in JSON, and the
+items are requested with /nodes/<node>/<key>. Use PipelineClient to do this
+transparently.
+
+The server computes the nodes with their ancestors, and keeps them in memory
+for the most recent parameters. The responses are serialized once, when they
+are first requested, and kept in memory with the nodes: the next requests
+send the same buffer to the socket without copying it. It listens on localhost
+only, and should not be exposed to untrusted clients (it returns pickles)."""
+
+import argparse
+import functools
+import inspect
+import json
+import logging
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.error import HTTPError
+from urllib.parse import parse_qs, quote, unquote, urlencode, urlparse
+from urllib.request import urlopen
+
+import dask
+import pandas as pd
+from dask.delayed import Delayed
+
+from .data import DATA_SOURCES
+from .pipeline import get_full_pipeline
+
+LOGGER = logging.getLogger(__name__)
+
+ARROW_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+PICKLE_CONTENT_TYPE = "application/python-pickle"
+JSON_CONTENT_TYPE = "application/json"
+
+# The arguments of the pipeline functions that the requests can't set
+NON_REQUEST_ARGUMENTS = ("node_wrapper",)
+
+
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def to_arrow(df):
+    """Serialize a data frame to an Arrow IPC stream (a pyarrow Buffer)"""
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def from_arrow(buffer):
+    """Read a data frame from an Arrow IPC stream"""
+    import pyarrow as pa
+
+    return pa.ipc.open_stream(pa.py_buffer(buffer)).read_all().to_pandas()
+
+
+class RequestError(Exception):
+    """An invalid request, answered with the given HTTP error code"""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def serialize(value, response_format=None):
+    """Return the content type and the body (bytes, or a pyarrow Buffer) of the
+    response for a value. Dicts are represented by the list of their keys"""
+    if isinstance(value, dict):
+        return JSON_CONTENT_TYPE, json.dumps({"keys": list(value)}).encode()
+    if response_format is None:
+        is_frame = isinstance(value, pd.DataFrame)
+        response_format = "arrow" if is_frame and _has_pyarrow() else "pickle"
+    if response_format == "arrow":
+        if not isinstance(value, pd.DataFrame):
+            raise RequestError(400, "Only data frames are in Arrow")
+        return ARROW_CONTENT_TYPE, to_arrow(value)
+    if response_format == "pickle":
+        return PICKLE_CONTENT_TYPE, pickle.dumps(value)
+    raise RequestError(400, f"Unknown format {response_format}")
+
+
+@functools.lru_cache(maxsize=None)
+def request_parameters(get_pipeline):
+    """Return the names of the arguments of get_pipeline that the requests
+    can set, and the names of those that they must set"""
+    allowed, required = set(), set()
+    for name, parameter in inspect.signature(get_pipeline).parameters.items():
+        if name in NON_REQUEST_ARGUMENTS or parameter.kind not in (
+            parameter.POSITIONAL_OR_KEYWORD,
+            parameter.KEYWORD_ONLY,
+        ):
+            continue
+        allowed.add(name)
+        if parameter.default is parameter.empty:
+            required.add(name)
+    return frozenset(allowed), frozenset(required)
+
+
+def get_served_pipeline(tickers, start_date, end_date, data_source="yahoo_cached"):
+    """The full pipeline, on the Yahoo data cached in this process by default,
+    so that the pipelines of the service share their downloads"""
+    return get_full_pipeline(tickers, start_date, end_date, data_source)
+
+
+class PipelineService:
+    """Compute the pipeline nodes, and keep them in memory for the
+    'max_pipelines' most recently used sets of parameters"""
+
+    def __init__(self, get_pipeline=get_served_pipeline, max_pipelines=8):
+        assert max_pipelines > 0, max_pipelines
+        self.get_pipeline = get_pipeline
+        self.max_pipelines = max_pipelines
+        self.hits = 0
+        self.misses = 0
+
+        # parameters => (lock, dict node name => value, dict (node name, key,
+        # format) => response), in the order of last use
+        self._pipelines = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def parameters_key(parameters):
+        return tuple(
+            sorted(
+                (name, tuple(sorted(value)) if name == "tickers" else value)
+                for name, value in parameters.items()
+            )
+        )
+
+    def _get_entry(self, parameters):
+        key = self.parameters_key(parameters)
+        with self._lock:
+            if key not in self._pipelines:
+                self._pipelines[key] = (threading.Lock(), {}, {})
+            self._pipelines.move_to_end(key)
+            while len(self._pipelines) > self.max_pipelines:
+                self._pipelines.popitem(last=False)
+            return self._pipelines[key]
+
+    def check_request(self, name, parameters):
+        """Raise a RequestError if the parameters do not match the arguments
+        of get_pipeline, if the data source or the dates are invalid, or if
+        the pipeline has no node 'name'"""
+        allowed, required = request_parameters(self.get_pipeline)
+        unknown = set(parameters).difference(allowed)
+        if unknown:
+            raise RequestError(400, f"Invalid parameters: unknown {sorted(unknown)}")
+        missing = required.difference(parameters)
+        if missing:
+            raise RequestError(400, f"Invalid parameters: missing {sorted(missing)}")
+        data_source = parameters.get("data_source")
+        if data_source is not None and data_source not in DATA_SOURCES:
+            raise RequestError(
+                400,
+                f"Invalid parameters: unknown data source {data_source!r}, "
+                f"expected one of {list(DATA_SOURCES)}",
+            )
+        for date_name in ["start_date", "end_date"]:
+            if date_name in parameters:
+                try:
+                    pd.Timestamp(parameters[date_name])
+                except ValueError:
+                    raise RequestError(
+                        400, f"Invalid parameters: {date_name} is not a date"
+                    ) from None
+        if name not in self.get_pipeline(**parameters):
+            raise RequestError(404, f"Unknown node {name!r}")
+
+    def get_node(self, name, parameters):
+        """Return the value of the node for the given parameters"""
+        return self._get_node(self._get_entry(parameters), name, parameters)
+
+    def _get_node(self, entry, name, parameters):
+        lock, results, _ = entry
+        with lock:
+            if name in results:
+                self.hits += 1
+                return results[name]
+            self.misses += 1
+
+            full_pipeline = self.get_pipeline(**parameters)
+            if name not in full_pipeline:
+                raise KeyError(name)
+
+            # Compute the node and its ancestors that are not in memory yet
+            graph = {}
+            for node in full_pipeline.values():
+                graph.update(node.dask)
+            graph.update(results)
+            names = [
+                node_name
+                for node_name in full_pipeline
+                if node_name not in results
+                and (node_name == name or node_name in full_pipeline[name].dask)
+            ]
+            LOGGER.info(f"Computing {names}")
+            values = dask.compute(*[Delayed(node_name, graph) for node_name in names])
+            results.update(zip(names, values))
+            return results[name]
+
+    def get_response(self, name, parameters, key=None, response_format=None):
+        """Return the content type and the body of the response for the node
+        (or for the item 'key' of a dict node). Invalid requests raise a
+        RequestError, and the errors in the computation of the node are
+        raised as is"""
+        self.check_request(name, parameters)
+        # The same entry holds the node and its responses, even if it is
+        # evicted from the cache in the meantime
+        entry = self._get_entry(parameters)
+        value = self._get_node(entry, name, parameters)
+        if key is not None:
+            if not isinstance(value, dict) or key not in value:
+                raise RequestError(404, f"Unknown item {key!r} in {name}")
+            value = value[key]
+
+        lock, _, responses = entry
+        response_key = (name, key, response_format)
+        with lock:
+            if response_key not in responses:
+                responses[response_key] = serialize(value, response_format)
+            return responses[response_key]
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "pipelines": [
+                {"parameters": dict(key), "nodes": sorted(results)}
+                for key, (_, results, _) in self._pipelines.items()
+            ],
+        }
+
+
+class _PipelineRequestHandler(BaseHTTPRequestHandler):
+    def _send(self, code, content_type, body):
+        # The body is written to the socket without copying it
+        body = memoryview(body)
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(body.nbytes))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, code, value):
+        self._send(code, JSON_CONTENT_TYPE, json.dumps(value).encode())
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = [unquote(part) for part in url.path.split("/") if part]
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        service = self.server.service
+
+        if path == ["stats"]:
+            return self._send_json(200, service.stats())
+        if not path or path[0] != "nodes" or len(path) not in (2, 3):
+            return self._send_json(404, {"error": f"Unknown path {url.path}"})
+
+        response_format = query.pop("format", None)
+        if "tickers" in query:
+            query["tickers"] = query["tickers"].split(",")
+        key = path[2] if len(path) == 3 else None
+        try:
+            content_type, body = service.get_response(
+                path[1], query, key, response_format
+            )
+        except RequestError as err:
+            return self._send_json(err.code, {"error": str(err)})
+        except Exception as err:
+            LOGGER.exception(f"Could not compute {url.path}")
+            return self._send_json(500, {"error": repr(err)})
+        return self._send(200, content_type, body)
+
+    def log_message(self, format, *args):
+        LOGGER.info(format % args)
+
+
+class PipelineServer(ThreadingMixIn, HTTPServer):
+    """An HTTP server for a PipelineService. Use port=0 for a free port"""
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, service=None):
+        super().__init__((host, port), _PipelineRequestHandler)
+        self.service = PipelineService() if service is None else service
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_in_background(self):
+        """Serve the requests in a daemon thread, and return the thread"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class PipelineClient:
+    """A client for the PipelineServer at 'url'"""
+
+    def __init__(self, url, response_format=None):
+        self.url = url.rstrip("/")
+        self.response_format = response_format
+
+    def _get(self, path, parameters):
+        query = dict(parameters)
+        if "tickers" in query:
+            query["tickers"] = ",".join(sorted(query["tickers"]))
+        if self.response_format is not None:
+            query["format"] = self.response_format
+        try:
+            with urlopen(f"{self.url}{path}?{urlencode(query)}") as response:
+                return response.headers.get_content_type(), response.read()
+        except HTTPError as err:
+            message = json.loads(err.read().decode()).get("error")
+            raise RuntimeError(f"{err.code}: {message}") from None
+
+    def _decode(self, content_type, body):
+        if content_type == ARROW_CONTENT_TYPE:
+            return from_arrow(body)
+        if content_type == PICKLE_CONTENT_TYPE:
+            return pickle.loads(body)
+        return json.loads(body.decode())
+
+    def get_node(self, name, **parameters):
+        """Return the value of the node 'name' for the given pipeline parameters"""
+        path = f"/nodes/{quote(name, safe='')}"
+        value = self._decode(*self._get(path, parameters))
+        if isinstance(value, dict) and "keys" in value:
+            return {
+                key: self._decode(
+                    *self._get(f"{path}/{quote(key, safe='')}", parameters)
+                )
+                for key in value["keys"]
+            }
+        return value
+
+    def stats(self):
+        return self._decode(*self._get("/stats", {}))
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m sample_pipeline.server",
+        description="Serve the pipeline nodes from memory on localhost",
+    )
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-pipelines", type=int, default=8)
+    args = parser.parse_args(args)
+
+    server = PipelineServer(
+        port=args.port, service=PipelineService(max_pipelines=args.max_pipelines)
+    )
+    print(f"Serving the pipeline at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    main()
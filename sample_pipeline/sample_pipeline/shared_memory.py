@@ -0,0 +1,251 @@
+"""Pass the node outputs between process workers through shared memory.
+
+A node wrapped with SharedMemoryNode copies the numeric blocks of the data
+frames that it returns into a single shared memory segment, and returns
+lightweight SharedFrame handles instead. The handles are pickled between the
+processes, and turned back into data frames that point directly into the
+shared memory (zero-copy) by the nodes that consume them.
+
+The segments are removed by 'shared_memory_session' in the process that runs
+the scheduler, see 'compute_with_shared_memory'. The segments that the main
+process creates or receives outside of a session are removed when it exits.
+
+This module requires Python 3.8 or later."""
+
+import atexit
+import logging
+import multiprocessing
+from contextlib import contextmanager
+
+try:
+    from multiprocessing.shared_memory import SharedMemory
+except ImportError as err:  # Python < 3.8
+    raise ImportError("sample_pipeline.shared_memory requires Python 3.8+") from err
+
+import dask
+import numpy as np
+import pandas as pd
+
+LOGGER = logging.getLogger(__name__)
+
+# Node outputs with fewer bytes of numeric data are pickled as usual
+SHARED_MEMORY_MIN_BYTES = 2 ** 16
+
+# The offsets of the arrays in a segment are aligned on cache lines
+_ALIGNMENT = 64
+
+# The segments attached in this process: name => SharedMemory
+_ATTACHED = {}
+
+# The names of the segments seen in this process during a session
+_SESSION_SEGMENTS = None
+
+# The names of the segments seen in the main process outside of a session
+_EXIT_SEGMENTS = set()
+
+
+def _register(name):
+    if _SESSION_SEGMENTS is not None:
+        _SESSION_SEGMENTS.add(name)
+    elif multiprocessing.parent_process() is None:
+        # The segments created by the worker processes are registered
+        # when the main process receives them
+        _EXIT_SEGMENTS.add(name)
+
+
+def _attach(name):
+    """Return the SharedMemory object for a segment, attached once per process"""
+    if name not in _ATTACHED:
+        _ATTACHED[name] = SharedMemory(name=name)
+    return _ATTACHED[name]
+
+
+class _Segment:
+    """The name of a shared memory segment, and the offsets of its arrays"""
+
+    def __init__(self, name, offsets):
+        self.name = name
+        self.offsets = offsets
+        _register(name)
+
+    def __getstate__(self):
+        return self.name, self.offsets
+
+    def __setstate__(self, state):
+        self.name, self.offsets = state
+        _register(self.name)
+
+
+class SharedFrame:
+    """A handle on a data frame whose numeric blocks are in shared memory"""
+
+    def __init__(self, blocks, index, columns):
+        # blocks: a list of (column positions, dtype, array number, shape)
+        self.blocks = blocks
+        self.index = index
+        self.columns = columns
+        self.segment = None
+
+    def to_frame(self, copy=False):
+        """Return the data frame. Unless 'copy' is True, the columns are
+        views on the shared memory segment"""
+        buffer = _attach(self.segment.name).buf
+        columns = {}
+        for positions, dtype, number, shape in self.blocks:
+            values = np.ndarray(
+                shape, dtype=dtype, buffer=buffer, offset=self.segment.offsets[number]
+            )
+            if copy:
+                values = values.copy()
+            for row, position in enumerate(positions):
+                columns[position] = values[row]
+
+        df = pd.DataFrame(
+            {position: columns[position] for position in range(len(self.columns))},
+            index=self.index,
+            copy=False,
+        )
+        df.columns = self.columns
+        return df
+
+
+def _numeric_blocks(df):
+    """Return a dict dtype => column positions, or None when the data frame
+    has columns that are not numeric"""
+    blocks = {}
+    for position, dtype in enumerate(df.dtypes):
+        if not isinstance(dtype, np.dtype) or dtype.kind not in "biuf":
+            return None
+        blocks.setdefault(dtype.str, []).append(position)
+    return blocks
+
+
+def share(value, min_bytes=SHARED_MEMORY_MIN_BYTES):
+    """Copy the numeric data frames in 'value' (a data frame, or a dict, list
+    or tuple of data frames) to a new shared memory segment, and return the
+    same structure with SharedFrame handles instead of the data frames"""
+    arrays = []
+
+    def _share(obj):
+        if isinstance(obj, pd.DataFrame):
+            blocks = _numeric_blocks(obj)
+            if blocks is None:
+                return obj
+            handle_blocks = []
+            for dtype, positions in blocks.items():
+                shape = (len(positions), len(obj))
+                handle_blocks.append((positions, dtype, len(arrays), shape))
+                arrays.append((obj, positions, np.dtype(dtype), shape))
+            return SharedFrame(handle_blocks, obj.index, obj.columns)
+        if isinstance(obj, dict):
+            return {key: _share(item) for key, item in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return type(obj)(_share(item) for item in obj)
+        return obj
+
+    shared = _share(value)
+
+    offsets, size = [], 0
+    for _, _, dtype, shape in arrays:
+        offsets.append(size)
+        size += -(-dtype.itemsize * shape[0] * shape[1] // _ALIGNMENT) * _ALIGNMENT
+    if not arrays or size < min_bytes:
+        return value
+
+    memory = SharedMemory(create=True, size=size)
+    try:
+        for (df, positions, dtype, shape), offset in zip(arrays, offsets):
+            target = np.ndarray(shape, dtype=dtype, buffer=memory.buf, offset=offset)
+            target[:] = df.iloc[:, positions].to_numpy(dtype=dtype).T
+            del target
+    finally:
+        memory.close()
+
+    segment = _Segment(memory.name, offsets)
+    _set_segment(shared, segment)
+    return shared
+
+
+def _set_segment(value, segment):
+    if isinstance(value, SharedFrame):
+        value.segment = segment
+    elif isinstance(value, dict):
+        for item in value.values():
+            _set_segment(item, segment)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _set_segment(item, segment)
+
+
+def unshare(value, copy=False):
+    """Replace the SharedFrame handles in 'value' with data frames"""
+    if isinstance(value, SharedFrame):
+        return value.to_frame(copy=copy)
+    if isinstance(value, dict):
+        return {key: unshare(item, copy) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(unshare(item, copy) for item in value)
+    return value
+
+
+class SharedMemoryNode:
+    """Wrap a node function so that it reads its inputs from, and writes its
+    output to shared memory. Use it as the 'node_wrapper' of get_full_pipeline"""
+
+    def __init__(self, fun, min_bytes=SHARED_MEMORY_MIN_BYTES):
+        self.fun = fun
+        self.min_bytes = min_bytes
+
+    def __call__(self, *args, **kwargs):
+        return share(self.fun(*unshare(args), **unshare(kwargs)), self.min_bytes)
+
+    def __repr__(self):
+        return f"SharedMemoryNode({self.fun!r})"
+
+
+@contextmanager
+def shared_memory_session():
+    """Remove the shared memory segments created or received by this process
+    when the context exits. Yields the set of their names"""
+    global _SESSION_SEGMENTS
+    assert _SESSION_SEGMENTS is None, "Shared memory sessions can't be nested"
+    _SESSION_SEGMENTS = segments = set()
+    try:
+        yield segments
+    finally:
+        _SESSION_SEGMENTS = None
+        _remove_segments(segments)
+
+
+def _remove_segments(names):
+    """Unlink the shared memory segments"""
+    LOGGER.info(f"Removing {len(names)} shared memory segments")
+    for name in names:
+        _EXIT_SEGMENTS.discard(name)
+        memory = _ATTACHED.pop(name, None)
+        try:
+            if memory is None:
+                memory = SharedMemory(name=name)
+            memory.close()
+            memory.unlink()
+        except FileNotFoundError:
+            pass
+        except BufferError:
+            # A data frame still points to the segment. The segment
+            # is unlinked, and freed when the data frame is deleted
+            memory.unlink()
+
+
+@atexit.register
+def _remove_exit_segments():
+    if _EXIT_SEGMENTS:
+        _remove_segments(list(_EXIT_SEGMENTS))
+
+
+def compute_with_shared_memory(*args, scheduler="processes", **kwargs):
+    """Compute the Dask collections in 'args' (e.g. the nodes of a pipeline
+    created with node_wrapper=SharedMemoryNode) and return the results as
+    regular data frames, copied out of the shared memory"""
+    with shared_memory_session():
+        results = dask.compute(*args, scheduler=scheduler, **kwargs)
+        return unshare(results, copy=True)
@@ -3,12 +3,15 @@ import logging
 LOGGER = logging.getLogger(__name__)
 
 
-def get_signals(closes, volumes):
+def get_signals(closes, volumes, calendar=None):
     """Return a collection of signals with the same resolution as past prices"""
     LOGGER.info("Computing signals")
     signals = {}
 
-    shape_df = (~closes.isnull()) + (~volumes.isnull())
+    if calendar is None:
+        shape_df = (~closes.isnull()) + (~volumes.isnull())
+    else:
+        shape_df = calendar.availability_frame()
 
     # Buy AAPL
     buy_aapl = shape_df * 0.0
@@ -0,0 +1,150 @@
+"""A declarative definition of a pipeline - named nodes, with a function and
+the names of their inputs - that is compiled to a Dask graph.
+
+The compilation is linear in the number of nodes, so it scales to pipelines
+with many (e.g. per-ticker) nodes. The compiled graph is culled to the
+requested outputs, and the linear chains of nodes are fused into single tasks
+to reduce the scheduling overhead."""
+
+import logging
+from collections import deque, namedtuple
+
+from dask.base import get_scheduler
+from dask.core import quote
+from dask.delayed import Delayed, delayed
+from dask.optimization import cull, fuse
+
+LOGGER = logging.getLogger(__name__)
+
+PipelineNode = namedtuple("PipelineNode", ["name", "function", "inputs"])
+
+
+class PipelineSpec:
+    """A pipeline defined by a list of nodes (name, function, input names).
+    The inputs are either other nodes, or parameters of the pipeline."""
+
+    def __init__(self, nodes=()):
+        self.nodes = {}
+        for node in nodes:
+            self.add(*node)
+
+    def add(self, name, function, inputs=()):
+        """Add a node that computes function(*inputs)"""
+        if name in self.nodes:
+            raise ValueError(f"The pipeline has two nodes named {name}")
+        self.nodes[name] = PipelineNode(name, function, tuple(inputs))
+
+    @property
+    def parameters(self):
+        """The inputs that are not nodes"""
+        return sorted(
+            {name for node in self.nodes.values() for name in node.inputs}.difference(
+                self.nodes
+            )
+        )
+
+    def sorted_nodes(self):
+        """The nodes in a topological order (Kahn's algorithm)"""
+        dependents = {name: [] for name in self.nodes}
+        missing_inputs = {}
+        for node in self.nodes.values():
+            inputs = {name for name in node.inputs if name in self.nodes}
+            missing_inputs[node.name] = len(inputs)
+            for name in inputs:
+                dependents[name].append(node.name)
+
+        ready = deque(name for name, count in missing_inputs.items() if not count)
+        order = []
+        while ready:
+            name = ready.popleft()
+            order.append(self.nodes[name])
+            for dependent in dependents[name]:
+                missing_inputs[dependent] -= 1
+                if not missing_inputs[dependent]:
+                    ready.append(dependent)
+
+        if len(order) < len(self.nodes):
+            cycle = sorted(name for name, count in missing_inputs.items() if count)
+            raise ValueError(f"The pipeline has a cycle between {cycle}")
+        return order
+
+    def _check_parameters(self, parameters):
+        missing = set(self.parameters).difference(parameters)
+        if missing:
+            raise ValueError(f"Missing pipeline parameters {sorted(missing)}")
+        unknown = set(parameters).difference(self.parameters)
+        if unknown:
+            raise ValueError(f"Unknown pipeline parameters {sorted(unknown)}")
+
+    @staticmethod
+    def _function(node, node_wrapper):
+        if node_wrapper is None:
+            return node.function
+        return node_wrapper(node.function)
+
+    def to_graph(self, parameters, node_wrapper=None):
+        """Return the Dask graph for the given parameter values (a dict)"""
+        self._check_parameters(parameters)
+        graph = {name: quote(value) for name, value in parameters.items()}
+        for node in self.sorted_nodes():
+            graph[node.name] = (self._function(node, node_wrapper),) + node.inputs
+        return graph
+
+    def to_delayed(self, parameters, node_wrapper=None):
+        """Return a dict node name => Delayed object for the given parameter
+        values (a dict), with one Delayed object per node.
+
+        Each Delayed object carries the graph of its node merged with the
+        graphs of its inputs, so the construction is not linear in the number
+        of nodes. Use 'compile' for the pipelines with many nodes"""
+        self._check_parameters(parameters)
+        nodes = {}
+        for node in self.sorted_nodes():
+            args = [
+                nodes[name] if name in self.nodes else parameters[name]
+                for name in node.inputs
+            ]
+            nodes[node.name] = delayed(self._function(node, node_wrapper))(
+                *args, dask_key_name=node.name
+            )
+        return {name: nodes[name] for name in self.nodes}
+
+    def compile(self, parameters, outputs=None, optimize=True, node_wrapper=None):
+        """Compile the pipeline to a Dask graph that computes the 'outputs'
+        (default: all the nodes). With 'optimize', the graph is culled to the
+        outputs and the linear chains of tasks are fused"""
+        outputs = list(self.nodes if outputs is None else outputs)
+        unknown = set(outputs).difference(self.nodes)
+        if unknown:
+            raise KeyError(f"Unknown pipeline nodes {sorted(unknown)}")
+
+        graph = self.to_graph(parameters, node_wrapper)
+        if optimize:
+            graph, dependencies = cull(graph, outputs)
+            graph, _ = fuse(graph, outputs, dependencies, rename_keys=False)
+            LOGGER.info(
+                f"Compiled {len(self.nodes)} nodes to {len(graph)} tasks "
+                f"for {len(outputs)} outputs"
+            )
+        return CompiledPipeline(graph, outputs)
+
+
+class CompiledPipeline:
+    """A Dask graph and the names of its outputs"""
+
+    def __init__(self, graph, outputs):
+        self.graph = graph
+        self.outputs = outputs
+
+    def __getitem__(self, name):
+        """The output 'name' as a Delayed object"""
+        if name not in self.outputs:
+            raise KeyError(name)
+        return Delayed(name, self.graph)
+
+    def compute(self, scheduler="threads", **kwargs):
+        """Compute all the outputs at once, and return a dict name => value.
+        The keyword arguments are passed to the scheduler"""
+        get = get_scheduler(scheduler=scheduler)
+        values = get(self.graph, self.outputs, **kwargs)
+        return dict(zip(self.outputs, values))
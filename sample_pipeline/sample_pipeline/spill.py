@@ -0,0 +1,138 @@
+"""Compute a pipeline under a memory budget, spilling the node outputs
+to disk when they don't fit in memory"""
+
+import logging
+import pickle
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from pathlib import Path
+
+import dask
+from dask.sizeof import sizeof
+from dask.utils import parse_bytes
+
+LOGGER = logging.getLogger(__name__)
+
+
+class SpillBuffer(MutableMapping):
+    """A dict-like store for the node outputs that keeps at most 'memory_limit'
+    bytes in memory. The least recently used outputs are spilled to pickle
+    files in 'spill_directory', and reloaded when they are accessed again.
+
+    The sizes are estimated with dask.sizeof. A value larger than the memory
+    limit is never kept in memory by the buffer."""
+
+    def __init__(self, memory_limit, spill_directory):
+        self.memory_limit = parse_bytes(memory_limit)
+        self.spill_directory = Path(spill_directory)
+        self.spill_directory.mkdir(parents=True, exist_ok=True)
+        self.spilled_count = 0
+        self.loaded_count = 0
+
+        # In memory: key => value, in the order of last access
+        self._fast = OrderedDict()
+        self._sizes = {}
+        self._fast_size = 0
+        # On disk: key => path
+        self._slow = {}
+        self._lock = threading.RLock()
+
+    @property
+    def memory_usage(self):
+        """The estimated size of the values in memory, in bytes"""
+        return self._fast_size
+
+    def _spill(self, key, value):
+        path = self.spill_directory / f"{uuid.uuid4().hex}.pickle"
+        LOGGER.info(f"Spilling {key} to {path}")
+        with open(path, "wb") as fp:
+            pickle.dump(value, fp, protocol=pickle.HIGHEST_PROTOCOL)
+        self._slow[key] = path
+        self.spilled_count += 1
+
+    def _evict(self):
+        while self._fast_size > self.memory_limit and self._fast:
+            key, value = self._fast.popitem(last=False)
+            self._fast_size -= self._sizes.pop(key)
+            self._spill(key, value)
+
+    def __getitem__(self, key):
+        with self._lock:
+            if key in self._fast:
+                self._fast.move_to_end(key)
+                return self._fast[key]
+
+            path = self._slow[key]
+            LOGGER.info(f"Reloading {key} from {path}")
+            with open(path, "rb") as fp:
+                value = pickle.load(fp)
+            self.loaded_count += 1
+
+            size = sizeof(value)
+            if size <= self.memory_limit:
+                del self._slow[key]
+                path.unlink()
+                self._fast[key] = value
+                self._sizes[key] = size
+                self._fast_size += size
+                self._evict()
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            if key in self:
+                del self[key]
+
+            size = sizeof(value)
+            if size > self.memory_limit:
+                self._spill(key, value)
+                return
+
+            self._fast[key] = value
+            self._sizes[key] = size
+            self._fast_size += size
+            self._evict()
+
+    def __delitem__(self, key):
+        with self._lock:
+            if key in self._fast:
+                del self._fast[key]
+                self._fast_size -= self._sizes.pop(key)
+            else:
+                self._slow.pop(key).unlink()
+
+    def __contains__(self, key):
+        return key in self._fast or key in self._slow
+
+    def __iter__(self):
+        return iter(list(self._fast) + list(self._slow))
+
+    def __len__(self):
+        return len(self._fast) + len(self._slow)
+
+
+def compute_with_memory_budget(
+    *args, memory_limit, spill_directory=None, stats=None, **kwargs
+):
+    """Compute the Dask collections in 'args' (e.g. the pipeline nodes) with the
+    threaded scheduler, keeping at most 'memory_limit' (e.g. 2e9 or "2GB") of
+    node outputs in memory, and spilling the other outputs to 'spill_directory'
+    (a temporary directory by default).
+
+    stats: an optional dict, updated with the number of node outputs that
+    were spilled ('spilled_count') and reloaded ('loaded_count')"""
+    with tempfile.TemporaryDirectory(dir=spill_directory) as tmpdir:
+        cache = SpillBuffer(memory_limit, tmpdir)
+        results = dask.compute(*args, scheduler="threads", cache=cache, **kwargs)
+        if stats is not None:
+            stats.update(
+                spilled_count=cache.spilled_count, loaded_count=cache.loaded_count
+            )
+        LOGGER.info(
+            f"Spilled {cache.spilled_count} and reloaded {cache.loaded_count} "
+            f"node outputs with a memory limit of {memory_limit}"
+        )
+        return results
@@ -0,0 +1,41 @@
+"""Equality assertions for the pipeline outputs (data frames, arrays,
+calendars, and dicts or lists of them)"""
+
+import numpy as np
+import pandas as pd
+
+
+def assert_pipeline_equal(actual, expected, path="root"):
+    """Assert that two pipeline values are equal. Dicts, lists and tuples are
+    compared recursively, data frames, series and indices with pandas.testing,
+    arrays with numpy.testing and other objects with a __dict__ attribute
+    (e.g. the Calendar) attribute by attribute. 'path' locates the difference
+    in the error message"""
+    if isinstance(expected, pd.DataFrame):
+        assert isinstance(actual, pd.DataFrame), (path, type(actual))
+        pd.testing.assert_frame_equal(actual, expected, obj=path)
+    elif isinstance(expected, pd.Series):
+        assert isinstance(actual, pd.Series), (path, type(actual))
+        pd.testing.assert_series_equal(actual, expected, obj=path)
+    elif isinstance(expected, pd.Index):
+        assert isinstance(actual, pd.Index), (path, type(actual))
+        pd.testing.assert_index_equal(actual, expected, obj=path)
+    elif isinstance(expected, np.ndarray):
+        assert isinstance(actual, np.ndarray), (path, type(actual))
+        assert actual.dtype == expected.dtype, (path, actual.dtype, expected.dtype)
+        np.testing.assert_array_equal(actual, expected, err_msg=path)
+    elif isinstance(expected, dict):
+        assert isinstance(actual, dict), (path, type(actual))
+        assert set(actual) == set(expected), (path, set(actual) ^ set(expected))
+        for key in expected:
+            assert_pipeline_equal(actual[key], expected[key], f"{path}[{key!r}]")
+    elif isinstance(expected, (list, tuple)):
+        assert type(actual) is type(expected), (path, type(actual))
+        assert len(actual) == len(expected), (path, len(actual), len(expected))
+        for i, (left, right) in enumerate(zip(actual, expected)):
+            assert_pipeline_equal(left, right, f"{path}[{i}]")
+    elif hasattr(expected, "__dict__") and not callable(expected):
+        assert type(actual) is type(expected), (path, type(actual))
+        assert_pipeline_equal(vars(actual), vars(expected), path)
+    else:
+        assert actual == expected, (path, actual, expected)
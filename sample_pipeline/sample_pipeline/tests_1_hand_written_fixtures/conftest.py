@@ -2,7 +2,9 @@
 
 import pytest
 
-from sample_pipeline.data import get_closes, get_volumes, get_yahoo_data
+from sample_pipeline.data import get_calendar, get_closes, get_volumes, get_yahoo_data
+from sample_pipeline.rolling import get_rolling_signals
+from sample_pipeline.signals import get_signals
 
 
 @pytest.fixture(scope="session")
@@ -24,8 +26,14 @@ def tickers():
 
 
 @pytest.fixture(scope="session")
-def yahoo_data(tickers, start_date, end_date):
-    return get_yahoo_data(tickers, start_date, end_date)
+def data_source():
+    """The synthetic data source, which does not require network access"""
+    return "synthetic"
+
+
+@pytest.fixture(scope="session")
+def yahoo_data(tickers, start_date, end_date, data_source):
+    return get_yahoo_data(tickers, start_date, end_date, data_source)
 
 
 @pytest.fixture(scope="session")
@@ -36,3 +44,17 @@ def closes(yahoo_data):
 @pytest.fixture(scope="session")
 def volumes(yahoo_data):
     return get_volumes(yahoo_data)
+
+
+@pytest.fixture(scope="session")
+def calendar(yahoo_data):
+    return get_calendar(yahoo_data)
+
+
+@pytest.fixture(scope="session")
+def all_signals(closes, volumes, calendar):
+    """The signals and the rolling signals (these have NaNs at the start)"""
+    return dict(
+        get_signals(closes, volumes, calendar),
+        **get_rolling_signals(closes, volumes, window=5, calendar=calendar),
+    )
@@ -1,10 +1,31 @@
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
 import pandas as pd
+import pytest
+from dask.sizeof import sizeof
 
-from sample_pipeline.data import get_closes, get_volumes, get_yahoo_data
+from sample_pipeline.data import (
+    BatchedDataSource,
+    BatchedSyntheticDataSource,
+    CachedDataSource,
+    DataSource,
+    SyntheticDataSource,
+    get_batches,
+    get_calendar,
+    get_closes,
+    get_data_source,
+    get_volumes,
+    get_yahoo_data,
+)
 
 
-def test_get_yahoo_data(tickers, start_date, end_date):
-    yahoo_data = get_yahoo_data(tickers, start_date, end_date)
+def test_get_yahoo_data(tickers, start_date, end_date, data_source):
+    yahoo_data = get_yahoo_data(tickers, start_date, end_date, data_source)
 
     assert set(yahoo_data) == tickers
     for ticker, ticker_data in yahoo_data.items():
@@ -35,3 +56,360 @@ def test_get_volumes(yahoo_data, tickers, start_date, end_date):
     assert_expected_shape(volumes, tickers, start_date, end_date)
     assert not volumes.isnull().any().any()
     assert (volumes > 0).all().all()
+
+
+@pytest.fixture()
+def ragged_yahoo_data(yahoo_data):
+    """The yahoo data, with missing dates and prices"""
+    yahoo_data = {ticker: data.copy() for ticker, data in yahoo_data.items()}
+    yahoo_data["AAPL"] = yahoo_data["AAPL"].iloc[2:]
+    yahoo_data["MSFT"] = yahoo_data["MSFT"].drop(yahoo_data["MSFT"].index[[5, 6]])
+    yahoo_data["AMZN"].iloc[3:5, yahoo_data["AMZN"].columns.get_loc("Close")] = np.nan
+    yahoo_data["GOOGL"].iloc[3, :] = np.nan
+    return yahoo_data
+
+
+def test_get_calendar(ragged_yahoo_data, tickers, start_date, end_date):
+    calendar = get_calendar(ragged_yahoo_data)
+    assert list(calendar.tickers) == sorted(tickers)
+    assert calendar.dates.min() == pd.Timestamp(start_date)
+    assert calendar.dates.max() == pd.Timestamp(end_date)
+    assert calendar.availability.dtype == bool
+
+    closes = get_closes(ragged_yahoo_data)
+    volumes = get_volumes(ragged_yahoo_data)
+    pd.testing.assert_index_equal(calendar.dates, closes.index)
+    pd.testing.assert_frame_equal(
+        calendar.availability_frame(), (~closes.isnull()) | (~volumes.isnull())
+    )
+
+    # AAPL starts two days after the other tickers
+    assert calendar.positions["AAPL"] == slice(2, len(calendar.dates))
+    np.testing.assert_array_equal(
+        calendar.ticker_positions("AAPL"), np.arange(2, len(calendar.dates))
+    )
+
+
+def test_availability_frame_is_a_copy(ragged_yahoo_data):
+    calendar = get_calendar(ragged_yahoo_data)
+    availability = calendar.availability.copy()
+    frame = calendar.availability_frame()
+    frame.iloc[:, :] = False
+    np.testing.assert_array_equal(calendar.availability, availability)
+
+
+def test_calendar_is_small_compared_to_the_closes():
+    tickers = [f"T{i:03d}" for i in range(100)]
+    yahoo_data = get_yahoo_data(tickers, "2016-01-01", "2020-12-31", "synthetic")
+    # One ticker starts later, and another one has missing dates
+    yahoo_data["T000"] = yahoo_data["T000"].iloc[100:]
+    yahoo_data["T001"] = yahoo_data["T001"].iloc[::2]
+    calendar = get_calendar(yahoo_data)
+    closes = get_closes(yahoo_data, calendar)
+
+    assert isinstance(calendar.positions["T000"], slice)
+    assert isinstance(calendar.positions["T001"], np.ndarray)
+    assert sizeof(calendar) >= calendar.availability.nbytes
+    assert sizeof(calendar) < sizeof(closes) / 4
+    pd.testing.assert_frame_equal(closes, get_closes(yahoo_data))
+
+
+def test_extract_with_calendar(ragged_yahoo_data):
+    calendar = get_calendar(ragged_yahoo_data)
+    pd.testing.assert_frame_equal(
+        get_closes(ragged_yahoo_data, calendar), get_closes(ragged_yahoo_data)
+    )
+    pd.testing.assert_frame_equal(
+        get_volumes(ragged_yahoo_data, calendar), get_volumes(ragged_yahoo_data)
+    )
+
+
+def test_synthetic_data_is_deterministic(start_date, end_date):
+    """The synthetic data for a ticker depends only on the ticker and the dates"""
+    data = get_yahoo_data({"AAPL", "MSFT"}, start_date, end_date, "synthetic")
+    data_aapl = get_yahoo_data({"AAPL"}, start_date, end_date, "synthetic")
+
+    pd.testing.assert_frame_equal(data["AAPL"], data_aapl["AAPL"])
+    assert not data["AAPL"].equals(data["MSFT"])
+
+
+def test_synthetic_data_is_consistent(yahoo_data):
+    for ticker, ticker_data in yahoo_data.items():
+        assert (ticker_data["Low"] <= ticker_data["Open"]).all(), ticker
+        assert (ticker_data["Low"] <= ticker_data["Close"]).all(), ticker
+        assert (ticker_data["Open"] <= ticker_data["High"]).all(), ticker
+        assert (ticker_data["Close"] <= ticker_data["High"]).all(), ticker
+
+
+def test_unknown_data_source(tickers, start_date, end_date):
+    with pytest.raises(ValueError, match="Unknown data source"):
+        get_yahoo_data(tickers, start_date, end_date, "not_a_data_source")
+
+
+class CountingDataSource(SyntheticDataSource):
+    """A synthetic data source that counts the requests, and waits for
+    'release' (when set) before answering"""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+        self.release = None
+
+    def get_ticker_data(self, ticker, start_date, end_date, dates=None):
+        self.requests.append(ticker)
+        if self.release is not None:
+            assert self.release.wait(timeout=10)
+        return super().get_ticker_data(ticker, start_date, end_date, dates)
+
+
+def test_cached_data_source_ttl_and_lru(start_date, end_date):
+    now = [0.0]
+    counting = CountingDataSource()
+    cached = CachedDataSource(counting, ttl=60, max_entries=2, clock=lambda: now[0])
+    assert isinstance(cached, DataSource)
+
+    data = get_yahoo_data(["AAPL", "MSFT"], start_date, end_date, cached)
+    again = get_yahoo_data(["AAPL", "MSFT"], start_date, end_date, cached)
+    assert again["AAPL"] is data["AAPL"]
+    assert counting.requests == ["AAPL", "MSFT"]
+    assert (cached.hits, cached.misses) == (2, 2)
+
+    # AAPL was used last, so MSFT is evicted
+    cached.get_ticker_data("AAPL", start_date, end_date)
+    cached.get_ticker_data("AMZN", start_date, end_date)
+    assert len(cached) == 2
+    cached.get_ticker_data("MSFT", start_date, end_date)
+    assert counting.requests == ["AAPL", "MSFT", "AMZN", "MSFT"]
+
+    # The data expires after the TTL
+    now[0] = 61.0
+    cached.get_ticker_data("MSFT", start_date, end_date)
+    assert counting.requests[-1] == "MSFT"
+    assert len(counting.requests) == 5
+
+
+def test_cached_data_source_coalesces_concurrent_requests(start_date, end_date):
+    counting = CountingDataSource()
+    counting.release = threading.Event()
+    cached = CachedDataSource(counting)
+
+    with ThreadPoolExecutor(4) as executor:
+        futures = [
+            executor.submit(cached.get_ticker_data, "AAPL", start_date, end_date)
+            for _ in range(4)
+        ]
+        while cached.misses + cached.coalesced < 4:
+            time.sleep(0.01)
+        counting.release.set()
+        results = [future.result() for future in futures]
+
+    assert counting.requests == ["AAPL"]
+    assert cached.coalesced == 3
+    assert all(result is results[0] for result in results)
+
+
+def test_data_sources_must_implement_get_ticker_data():
+    class IncompleteDataSource(DataSource):
+        pass
+
+    with pytest.raises(TypeError, match="get_ticker_data"):
+        IncompleteDataSource()
+
+
+def test_cached_data_source_does_not_cache_errors(start_date, end_date):
+    class FailingDataSource(DataSource):
+        calls = 0
+
+        def get_ticker_data(self, ticker, start_date, end_date):
+            self.calls += 1
+            raise IOError(f"Could not load {ticker}")
+
+    failing = FailingDataSource()
+    cached = CachedDataSource(failing)
+    for _ in range(2):
+        with pytest.raises(IOError, match="Could not load AAPL"):
+            cached.get_ticker_data("AAPL", start_date, end_date)
+    assert failing.calls == 2
+    assert not len(cached)
+
+
+class LatencyDataSource(BatchedSyntheticDataSource):
+    """A local stand-in for a provider that accepts many tickers per request.
+    Each request takes 'latency' seconds. The requests that contain one of the
+    'failing' tickers fail, and the 'dropped' tickers are missing from the
+    response (once per ticker)"""
+
+    def __init__(self, latency=0.0, failing=(), dropped=(), **kwargs):
+        kwargs.setdefault("retry_delay", 0.0)
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.failing = set(failing)
+        self.dropped = set(dropped)
+        self.requests = []
+        self.in_flight = self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def get_batch_data(self, tickers, start_date, end_date):
+        with self._lock:
+            self.requests.append(list(tickers))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.latency)
+        with self._lock:
+            self.in_flight -= 1
+            failing = self.failing.intersection(tickers)
+            self.failing.difference_update(failing)
+            dropped = self.dropped.intersection(tickers)
+            self.dropped.difference_update(dropped)
+
+        if failing:
+            raise ConnectionError(f"Request failed for {sorted(failing)}")
+        return super().get_batch_data(
+            [ticker for ticker in tickers if ticker not in dropped],
+            start_date,
+            end_date,
+        )
+
+
+def test_cached_data_source_keeps_the_batches(start_date, end_date):
+    batched = LatencyDataSource(max_batch_size=10)
+    cached = CachedDataSource(batched)
+    tickers = [f"T{i:03d}" for i in range(10)]
+    cached.get_data(tickers[:5], start_date, end_date)
+    data = cached.get_data(tickers, start_date, end_date)
+    assert list(data) == tickers
+
+    # The uncached tickers are requested in one batch
+    assert batched.requests == [tickers[:5], tickers[5:]]
+    assert (cached.hits, cached.misses) == (5, 10)
+
+
+def test_cached_data_source_can_be_pickled(start_date, end_date):
+    cached = CachedDataSource("synthetic")
+    data = cached.get_ticker_data("AAPL", start_date, end_date)
+
+    # The cached data is not pickled
+    copy = pickle.loads(pickle.dumps(cached))
+    assert len(cached) == 1
+    assert len(copy) == 0
+    pd.testing.assert_frame_equal(
+        copy.get_ticker_data("AAPL", start_date, end_date), data
+    )
+    assert (copy.hits, copy.misses) == (0, 2)
+
+
+def test_cached_data_source_normalizes_the_dates(start_date, end_date):
+    counting = CountingDataSource()
+    cached = CachedDataSource(counting)
+    data = cached.get_ticker_data("AAPL", start_date, end_date)
+    again = cached.get_ticker_data(
+        "AAPL", pd.Timestamp(start_date), pd.Timestamp(end_date)
+    )
+    assert again is data
+    assert counting.requests == ["AAPL"]
+
+
+def test_shared_cache(start_date, end_date):
+    cached = get_data_source("synthetic_cached")
+    assert isinstance(cached, CachedDataSource)
+    assert isinstance(cached.data_source, SyntheticDataSource)
+    assert get_data_source("synthetic_cached") is cached
+
+    cached.clear()
+    data = get_yahoo_data(["AAPL"], start_date, end_date, "synthetic_cached")
+    again = get_yahoo_data(["AAPL"], start_date, end_date, "synthetic_cached")
+    assert again["AAPL"] is data["AAPL"]
+
+
+def test_get_batches():
+    tickers = [f"T{i:03d}" for i in range(250)]
+    batches = get_batches(tickers, 100)
+    assert [len(batch) for batch in batches] == [83, 83, 84]
+    assert sorted(sum(batches, [])) == tickers
+    assert get_batches([], 100) == []
+
+
+def test_batched_data_source(tickers, start_date, end_date):
+    batched = LatencyDataSource(max_batch_size=3)
+    data = get_yahoo_data(tickers, start_date, end_date, batched)
+    assert len(batched.requests) == 2
+
+    expected = SyntheticDataSource().get_data(tickers, start_date, end_date)
+    assert set(data) == set(expected)
+    for ticker in tickers:
+        pd.testing.assert_frame_equal(data[ticker], expected[ticker], check_freq=False)
+
+    one = batched.get_ticker_data("AAPL", start_date, end_date)
+    pd.testing.assert_frame_equal(one, expected["AAPL"], check_freq=False)
+
+
+def test_batched_data_source_retries_the_failed_batches(start_date, end_date):
+    tickers = [f"T{i:03d}" for i in range(10)]
+    batched = LatencyDataSource(max_batch_size=4, failing=["T001"], dropped=["T009"])
+    data = batched.get_data(tickers, start_date, end_date)
+    assert list(data) == tickers
+
+    # The first batch failed, and T009 was missing from the last response
+    assert [len(batch) for batch in batched.requests] == [3, 3, 4, 4]
+    assert batched.requests[-1] == ["T000", "T001", "T002", "T009"]
+
+
+def test_batched_data_source_gives_up_after_max_retries(start_date, end_date):
+    batched = LatencyDataSource(failing=["AAPL"], max_retries=0)
+    with pytest.raises(ConnectionError, match="AAPL"):
+        batched.get_data(["AAPL", "MSFT"], start_date, end_date)
+
+    batched = LatencyDataSource(dropped=["TSLA"], max_retries=0)
+    with pytest.raises(KeyError, match="TSLA"):
+        batched.get_data(["AAPL", "TSLA"], start_date, end_date)
+
+
+def test_batched_requests_reduce_the_request_count(start_date, end_date):
+    tickers = [f"T{i:03d}" for i in range(1000)]
+    for max_batch_size, n_requests in [(1, 1000), (100, 10)]:
+        batched = LatencyDataSource(max_batch_size=max_batch_size)
+        data = batched.get_data(tickers, start_date, end_date)
+        assert list(data) == tickers
+        assert len(batched.requests) == n_requests
+
+
+def test_yahoo_data_source_is_batched(start_date, end_date):
+    tickers = [f"T{i:03d}" for i in range(250)]
+    expected = SyntheticDataSource().get_data(tickers, start_date, end_date)
+    requests = []
+
+    def data_reader(symbols, source, start, end):
+        # Like pandas-datareader for a list of symbols
+        requests.append(symbols)
+        data = {symbol: expected[symbol] for symbol in symbols}
+        return pd.concat(data, axis=1).swaplevel(axis=1)
+
+    yahoo = get_data_source("yahoo")
+    assert isinstance(yahoo, BatchedDataSource)
+    with mock.patch("sample_pipeline.data.wb.DataReader", data_reader):
+        data = yahoo.get_data(tickers, start_date, end_date)
+    assert [len(symbols) for symbols in requests] == [83, 83, 84]
+    for ticker in tickers:
+        pd.testing.assert_frame_equal(data[ticker], expected[ticker], check_freq=False)
+
+
+def test_concurrent_batched_requests(start_date, end_date):
+    tickers = [f"T{i:03d}" for i in range(200)]
+    batched = LatencyDataSource(latency=0.1, max_batch_size=50, max_workers=4)
+    batched.get_data(tickers, start_date, end_date)
+    assert len(batched.requests) == 4
+    assert batched.max_in_flight > 1
+
+
+def test_batched_synthetic_data_source(start_date, end_date):
+    tickers = ["AAPL", "MSFT"]
+    data = get_yahoo_data(tickers, start_date, end_date, "synthetic_batched")
+    expected = get_yahoo_data(tickers, start_date, end_date, "synthetic")
+    for ticker in tickers:
+        pd.testing.assert_frame_equal(data[ticker], expected[ticker], check_freq=False)
+
+    class IncompleteDataSource(BatchedDataSource):
+        pass
+
+    with pytest.raises(TypeError, match="get_batch_data"):
+        IncompleteDataSource()
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sample_pipeline.benchmark import get_signal_stats_naive
+from sample_pipeline.evaluation import SIGNAL_STATS, get_signal_pnl, get_signal_stats
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 2, 100])
+def test_get_signal_stats_matches_the_naive_implementation(
+    all_signals, closes, chunk_size
+):
+    stats = get_signal_stats(all_signals, closes, chunk_size=chunk_size)
+    assert list(stats.columns) == SIGNAL_STATS
+    assert list(stats.index) == list(all_signals)
+
+    expected = get_signal_stats_naive(all_signals, closes)
+    pd.testing.assert_frame_equal(stats, expected, check_names=False)
+
+
+def test_buy_and_hold_signal(all_signals, closes):
+    pnl, turnover = get_signal_pnl({"BUY_AAPL": all_signals["BUY_AAPL"]}, closes)
+    np.testing.assert_allclose(
+        pnl["BUY_AAPL"], closes["AAPL"].pct_change().iloc[1:], rtol=1e-12
+    )
+    assert (turnover["BUY_AAPL"] == 0).all()
+
+
+def test_chunks_are_bounded_by_max_bytes(all_signals, closes):
+    # At most one signal per chunk
+    stats = get_signal_stats(all_signals, closes, max_bytes=1)
+    pd.testing.assert_frame_equal(stats, get_signal_stats(all_signals, closes))
+
+
+def test_constant_pnl_has_no_sharpe_ratio(closes):
+    no_position = {"NOTHING": closes * 0.0}
+    stats = get_signal_stats(no_position, closes)
+    assert stats.loc["NOTHING", "pnl"] == 0.0
+    assert np.isnan(stats.loc["NOTHING", "sharpe"])
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sample_pipeline.benchmark import get_portfolio_naive
+from sample_pipeline.portfolio import (
+    cap_positions,
+    combine_signals,
+    get_portfolio,
+    normalize_signals,
+    stack_signals,
+)
+from sample_pipeline.signals import get_signals
+
+
+def test_portfolio_of_the_sample_signals(closes, volumes, calendar):
+    portfolio = get_portfolio(get_signals(closes, volumes, calendar), calendar)
+    pd.testing.assert_index_equal(portfolio.index, closes.index)
+    pd.testing.assert_index_equal(portfolio.columns, closes.columns)
+    assert (portfolio["AAPL"] == 0.5).all()
+    assert (portfolio["AMZN"] == 0.5).all()
+    assert (portfolio[["GOOGL", "MSFT"]] == 0.0).all().all()
+
+
+@pytest.mark.parametrize("max_bytes", [100, 2 ** 28])
+def test_get_portfolio_matches_the_naive_implementation(all_signals, max_bytes):
+    expected = get_portfolio_naive(all_signals, max_weight=0.3)
+    portfolio = get_portfolio(all_signals, max_weight=0.3, max_bytes=max_bytes)
+    pd.testing.assert_frame_equal(portfolio, expected)
+    assert (portfolio.abs().sum(axis=1) <= 1.0 + 1e-12).all()
+    assert (portfolio.abs() <= 0.3).all().all()
+
+
+def test_get_portfolio_with_weights(all_signals):
+    portfolio = get_portfolio(all_signals, weights={"BUY_AMZN": 2.0, "BUY_AAPL": -1.0})
+    # AMZN is capped at 0.5
+    np.testing.assert_allclose(portfolio["AMZN"], 0.5)
+    np.testing.assert_allclose(portfolio["AAPL"], -1.0 / 3.0)
+
+    with pytest.raises(KeyError, match="BUY_TSLA"):
+        get_portfolio(all_signals, weights={"BUY_TSLA": 1.0})
+
+
+def test_batched_weights(all_signals):
+    normalized = normalize_signals(stack_signals(all_signals))
+    weights = np.random.default_rng(0).normal(size=(3, len(all_signals)))
+    batched = combine_signals(normalized, weights)
+    assert batched.shape == (3,) + normalized.shape[1:]
+    for row, portfolio in zip(weights, batched):
+        np.testing.assert_allclose(portfolio, combine_signals(normalized, row))
+
+
+def test_normalize_signals():
+    stacked = np.array([[[1.0, np.nan, 3.0], [0.0, 0.0, 0.0]]])
+    np.testing.assert_allclose(
+        normalize_signals(stacked), [[[0.25, 0.0, 0.75], [0.0, 0.0, 0.0]]]
+    )
+    np.testing.assert_allclose(
+        normalize_signals(stacked, demean=True), [[[-0.5, 0.0, 0.5], [0.0, 0.0, 0.0]]]
+    )
+
+
+def test_cap_positions():
+    positions = np.array([[4.0, -2.0, 2.0], [0.0, 0.0, 0.0]])
+    np.testing.assert_allclose(
+        cap_positions(positions, max_weight=0.4), [[0.4, -0.25, 0.25], [0, 0, 0]]
+    )
+    np.testing.assert_allclose(
+        cap_positions(positions, gross_exposure=2.0), [[1.0, -0.5, 0.5], [0, 0, 0]]
+    )
+
+
+def test_portfolio_is_nan_when_the_ticker_is_not_available(all_signals, calendar):
+    # The calendar fixture is shared by the other tests, so we change a copy
+    availability = calendar.availability.copy()
+    availability[:3, 0] = False
+    calendar = type(calendar)(
+        calendar.dates, calendar.tickers, calendar.positions, availability
+    )
+    portfolio = get_portfolio(all_signals, calendar)
+    assert portfolio.iloc[:3, 0].isnull().all()
+    assert portfolio.iloc[3:].notnull().all().all()
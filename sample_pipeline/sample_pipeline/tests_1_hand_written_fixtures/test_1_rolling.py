@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+import pytest
+from dask.delayed import delayed
+
+from sample_pipeline.benchmark import get_rolling_signals_naive
+from sample_pipeline.rolling import (
+    ewma,
+    get_rolling_signals,
+    rolling_mean,
+    rolling_std,
+    rolling_volume_ratio,
+    rolling_zscore,
+)
+
+
+@pytest.fixture(scope="session")
+def closes_with_gaps(closes):
+    """The close prices with a few missing values"""
+    closes = closes.copy()
+    closes.iloc[3:6, 0] = np.nan
+    closes.iloc[:4, 1] = np.nan
+    closes.iloc[-1, 2] = np.nan
+    return closes
+
+
+@pytest.mark.parametrize("window,min_periods", [(5, None), (5, 2), (50, 1)])
+def test_rolling_mean_and_std(closes_with_gaps, window, min_periods):
+    expected = closes_with_gaps.rolling(window, min_periods=min_periods)
+    pd.testing.assert_frame_equal(
+        rolling_mean(closes_with_gaps, window, min_periods), expected.mean()
+    )
+    pd.testing.assert_frame_equal(
+        rolling_std(closes_with_gaps, window, min_periods), expected.std()
+    )
+
+
+def test_rolling_moments_on_a_long_history():
+    """The rounding errors do not accumulate over 20 years of prices"""
+    rng = np.random.default_rng(0)
+    n_dates, window = 20 * 252, 20
+    values = 100.0 * np.exp(np.cumsum(0.02 * rng.standard_normal((n_dates, 3)), 0))
+    prices = pd.DataFrame(values, index=pd.bdate_range("2001-01-01", periods=n_dates))
+
+    bounds = zip(range(n_dates), range(window, n_dates + 1))
+    windows = [values[start:stop] for start, stop in bounds]
+    rows = slice(window - 1, None)
+    np.testing.assert_allclose(
+        rolling_mean(prices, window).to_numpy()[rows],
+        [w.mean(axis=0) for w in windows],
+        rtol=1e-14,
+    )
+    np.testing.assert_allclose(
+        rolling_std(prices, window).to_numpy()[rows],
+        [w.std(axis=0, ddof=1) for w in windows],
+        rtol=1e-10,
+    )
+
+
+def test_rolling_zscore_of_constant_values(closes):
+    closes = closes.copy()
+    closes.iloc[:, 0] = 123.456
+    closes.iloc[5:, 1] = closes.iloc[5, 1]
+    assert (rolling_std(closes, 5).iloc[4:, 0] == 0).all()
+    zscore = rolling_zscore(closes, 5)
+    assert (zscore.iloc[4:, 0] == 0).all()
+    assert (zscore.iloc[9:, 1] == 0).all()
+    assert zscore.iloc[4:9, 1].notnull().all()
+
+
+def test_ewma(closes_with_gaps):
+    halflife = 3
+    alpha = 1.0 - np.exp(-np.log(2.0) / halflife)
+    expected = closes_with_gaps.ewm(alpha=alpha, adjust=False, ignore_na=True).mean()
+    pd.testing.assert_frame_equal(ewma(closes_with_gaps, halflife), expected)
+
+
+@pytest.mark.parametrize("halflife", [0.1, 3, 200])
+def test_ewma_on_a_long_history(halflife):
+    """The EWMA over 20 years of prices with gaps, computed by blocks of rows"""
+    rng = np.random.default_rng(0)
+    n_dates = 20 * 252
+    values = 100.0 * np.exp(np.cumsum(0.02 * rng.standard_normal((n_dates, 3)), 0))
+    values[rng.random(values.shape) < 0.1] = np.nan
+    values[:300, 1] = np.nan
+    prices = pd.DataFrame(values, index=pd.bdate_range("2001-01-01", periods=n_dates))
+
+    alpha = 1.0 - np.exp(-np.log(2.0) / halflife)
+    expected = prices.ewm(alpha=alpha, adjust=False, ignore_na=True).mean()
+    pd.testing.assert_frame_equal(ewma(prices, halflife), expected, rtol=1e-12)
+
+
+def test_rolling_zscore_and_volume_ratio(closes, volumes):
+    zscore = rolling_zscore(closes, 5)
+    assert zscore.iloc[:4].isnull().all().all()
+    assert zscore.iloc[4:].notnull().all().all()
+
+    volume_ratio = rolling_volume_ratio(volumes, 5)
+    assert (volume_ratio.iloc[4:] > 0).all().all()
+
+
+def test_get_rolling_signals(closes_with_gaps, volumes, tickers):
+    volumes = volumes.copy()
+    volumes.iloc[3:6, 0] = np.nan
+
+    signals = get_rolling_signals(closes_with_gaps, volumes, window=5, halflife=3)
+    expected = get_rolling_signals_naive(
+        closes_with_gaps, volumes, window=5, halflife=3
+    )
+    assert set(signals) == set(expected)
+    for name, signal in signals.items():
+        assert set(signal.columns) == tickers, name
+        pd.testing.assert_frame_equal(signal, expected[name])
+
+    # The signals are NaN when the ticker has neither a price nor a volume
+    ticker = closes_with_gaps.columns[0]
+    for signal in signals.values():
+        assert signal[ticker].iloc[3:6].isnull().all()
+
+
+def test_rolling_signals_node(closes, volumes):
+    node = delayed(get_rolling_signals)(
+        closes, volumes, dask_key_name="rolling_signals"
+    )
+    rolling_signals = node.compute()
+    assert set(rolling_signals) == {"CLOSE_ZSCORE", "CLOSE_EWMA_TREND", "VOLUME_RATIO"}
+
+
+def test_get_rolling_signals_with_calendar(closes, volumes, calendar):
+    signals = get_rolling_signals(closes, volumes, window=5, calendar=calendar)
+    expected = get_rolling_signals(closes, volumes, window=5)
+    for name, signal in signals.items():
+        pd.testing.assert_frame_equal(signal, expected[name])
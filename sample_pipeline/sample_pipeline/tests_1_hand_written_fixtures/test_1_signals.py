@@ -1,6 +1,7 @@
 import pandas as pd
 
 from sample_pipeline.signals import get_signals
+from sample_pipeline.testing import assert_pipeline_equal
 
 
 def test_get_signals(closes, volumes, tickers):
@@ -11,3 +12,8 @@ def test_get_signals(closes, volumes, tickers):
     for signal_name, signal in signals.items():
         assert isinstance(signal, pd.DataFrame), signal_name
         assert set(signal.columns) == tickers, signal_name
+
+
+def test_get_signals_with_calendar(closes, volumes, calendar):
+    signals = get_signals(closes, volumes, calendar)
+    assert_pipeline_equal(signals, get_signals(closes, volumes))
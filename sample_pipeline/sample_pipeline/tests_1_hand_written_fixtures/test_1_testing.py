@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sample_pipeline.data import get_calendar
+from sample_pipeline.testing import assert_pipeline_equal
+
+
+def test_assert_pipeline_equal(yahoo_data, closes):
+    assert_pipeline_equal(
+        {"closes": closes, "calendar": get_calendar(yahoo_data)},
+        {"closes": closes.copy(), "calendar": get_calendar(yahoo_data)},
+    )
+
+
+def test_assert_pipeline_equal_detects_the_differences(yahoo_data, closes):
+    changed = closes.copy()
+    changed.iloc[-1, -1] += 1.0
+    with pytest.raises(AssertionError, match=r"root\['closes'\]"):
+        assert_pipeline_equal({"closes": changed}, {"closes": closes})
+
+    calendar = get_calendar(yahoo_data)
+    changed = get_calendar(yahoo_data)
+    changed.availability[0, 0] = not changed.availability[0, 0]
+    with pytest.raises(AssertionError):
+        assert_pipeline_equal(changed, calendar)
+
+    with pytest.raises(AssertionError):
+        assert_pipeline_equal([np.zeros(2)], [np.zeros(2, dtype=int)])
+    with pytest.raises(AssertionError):
+        assert_pipeline_equal(pd.Series([1.0]), pd.DataFrame({"a": [1.0]}))
@@ -1,6 +1,6 @@
-import dask
 import pytest
 
+from sample_pipeline.fixtures import pipeline_fixtures
 from sample_pipeline.pipeline import get_full_pipeline
 
 
@@ -23,29 +23,11 @@ def tickers():
 
 
 @pytest.fixture(scope="session")
-def evaluated_pipeline(tickers, start_date, end_date):
-    # The pipeline
-    full_pipeline = get_full_pipeline(tickers, start_date, end_date)
+def data_source():
+    """The synthetic data source, which does not require network access"""
+    return "synthetic"
 
-    # Evaluate all the tasks
-    _compute = dask.compute(full_pipeline)
 
-    # The value returned by dask.compute is a tuple of one element
-    (_evaluated_pipeline,) = _compute
-
-    return _evaluated_pipeline
-
-
-@pytest.fixture(scope="session")
-def yahoo_data(evaluated_pipeline):
-    return evaluated_pipeline["yahoo_data"]
-
-
-@pytest.fixture(scope="session")
-def closes(evaluated_pipeline):
-    return evaluated_pipeline["closes"]
-
-
-@pytest.fixture(scope="session")
-def volumes(evaluated_pipeline):
-    return evaluated_pipeline["volumes"]
+# One fixture per node of the pipeline. Each fixture computes only its own node,
+# given the values of the parent nodes (which are fixtures, too)
+globals().update(pipeline_fixtures(get_full_pipeline))
@@ -0,0 +1,11 @@
+import numpy as np
+
+from sample_pipeline.portfolio import get_portfolio
+
+
+def test_get_portfolio(signals, calendar, tickers):
+    portfolio = get_portfolio(signals, calendar)
+
+    assert set(portfolio.columns) == tickers
+    assert not portfolio.isnull().any().any()
+    np.testing.assert_allclose(portfolio.abs().sum(axis=1), 1.0)
@@ -0,0 +1,39 @@
+import subprocess
+import sys
+from pathlib import Path
+
+
+def test_full_pipeline_fixture(full_pipeline):
+    assert set(full_pipeline) == {
+        "yahoo_data",
+        "calendar",
+        "closes",
+        "volumes",
+        "signals",
+        "portfolio",
+        "signal_stats",
+    }
+
+
+def test_signals_fixture(signals, closes):
+    assert set(signals) == {"BUY_AAPL", "BUY_AMZN"}
+    for signal in signals.values():
+        assert signal.shape == closes.shape
+
+
+def test_only_the_required_nodes_are_computed():
+    """We run a test that uses only the 'closes' fixture in a new pytest
+    session, and check that the other nodes are not computed"""
+    output = subprocess.run(
+        [sys.executable, "-m", "pytest", "test_2_data.py::test_get_closes"]
+        + ["-p", "no:cacheprovider", "-p", "no:xdist"],
+        cwd=Path(__file__).parent,
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout
+
+    assert "Loading price data" in output
+    assert "Loading close prices" in output
+    assert "Loading volumes" not in output
+    assert "Computing signals" not in output
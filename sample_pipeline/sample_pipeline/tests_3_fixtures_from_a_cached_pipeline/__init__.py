@@ -14,8 +14,18 @@ LOGGER = logging.getLogger(__name__)
 CACHED_PIPELINE_PATH = Path(os.environ.get("TMPDIR", "/tmp")) / "cached_pipeline"
 
 
-def get_cached_pipeline_path(tickers, start_date, end_date, worker_id):
-    cache_path = CACHED_PIPELINE_PATH / worker_id
+def get_cached_pipeline_path(tickers, start_date, end_date, data_source, worker_id):
+    cache_path = CACHED_PIPELINE_PATH / data_source / worker_id
+
+    # Dict of delayed operations
+    full_pipeline = get_full_pipeline(tickers, start_date, end_date, data_source)
+
+    # Regenerate when the pipeline has new nodes
+    if cache_path.exists() and any(
+        not (cache_path / task_name).with_suffix(".pickle").exists()
+        for task_name in full_pipeline
+    ):
+        shutil.rmtree(cache_path)
 
     # Always regenerate on the CI
     if cache_path.exists() and os.environ.get("CI"):
@@ -39,10 +49,7 @@ def get_cached_pipeline_path(tickers, start_date, end_date, worker_id):
         # Regenerate the cache on disk
         cache_path.mkdir(parents=True)
 
-        # Dict of delayed operations
-        full_pipeline = get_full_pipeline(tickers, start_date, end_date)
-
-        # Evaluate them
+        # Evaluate the pipeline
         _compute = dask.compute(full_pipeline)
 
         # The value returned by dask.compute is a tuple of one element
@@ -25,14 +25,22 @@ def tickers():
 
 
 @pytest.fixture(scope="session")
-def cached_pipeline_path(tickers, start_date, end_date, worker_id):
+def data_source():
+    """The synthetic data source, which does not require network access"""
+    return "synthetic"
+
+
+@pytest.fixture(scope="session")
+def cached_pipeline_path(tickers, start_date, end_date, data_source, worker_id):
     """This fixture returns the path to the cached pipeline and evaluates the
     pipeline if necessary.
 
     worker_id: the id of the worker in pytest-xdist
     (remove this argument if you don't use pytest-xdist)
     """
-    return get_cached_pipeline_path(tickers, start_date, end_date, worker_id)
+    return get_cached_pipeline_path(
+        tickers, start_date, end_date, data_source, worker_id
+    )
 
 
 @pytest.fixture(scope="session")
@@ -0,0 +1,122 @@
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sample_pipeline.data import get_calendar, get_closes, get_volumes
+from sample_pipeline.downsample import (
+    downsample_pipeline,
+    load_pipeline_outputs,
+    main,
+    select_dates,
+    select_tickers,
+)
+from sample_pipeline.pipeline import get_full_pipeline_spec
+from sample_pipeline.testing import assert_pipeline_equal
+
+
+@pytest.fixture(scope="module")
+def outputs(cached_pipeline_path):
+    return load_pipeline_outputs(cached_pipeline_path)
+
+
+def test_select_tickers_and_dates():
+    dates = pd.bdate_range("2021-01-04", periods=10)
+    missing = pd.DataFrame(0, index=dates, columns=list("ABCDEFGH"))
+    missing.loc[dates[2], "F"] = 2
+    missing.loc[dates[3:5], "C"] = 1
+
+    tickers = select_tickers(missing, 4, required_tickers=["H"])
+    assert tickers == select_tickers(missing, 4, required_tickers=["H"])
+    assert len(tickers) == 4
+    assert {"C", "F", "H"} <= set(tickers)
+
+    assert select_dates(missing, 3) == (dates[2], dates[4])
+    assert select_dates(missing, 1) == (dates[2], dates[2])
+    assert select_dates(missing * 0, 3) == (dates[-3], dates[-1])
+
+
+def test_downsample_pipeline(outputs):
+    sample = downsample_pipeline(
+        outputs, n_tickers=3, n_dates=5, required_tickers=["AAPL", "AMZN"]
+    )
+    assert set(sample) == set(outputs)
+    assert sample["closes"].shape == (5, 3)
+    assert {"AAPL", "AMZN"} <= set(sample["closes"].columns)
+    assert set(sample["yahoo_data"]) == set(sample["closes"].columns)
+
+    # The nodes are consistent with each other
+    calendar = get_calendar(sample["yahoo_data"])
+    assert_pipeline_equal(sample["calendar"], calendar)
+    assert_pipeline_equal(sample["closes"], get_closes(sample["yahoo_data"], calendar))
+    assert_pipeline_equal(
+        sample["volumes"], get_volumes(sample["yahoo_data"], calendar)
+    )
+
+    # Each node is its function applied to the downsampled inputs
+    for name, node in get_full_pipeline_spec().nodes.items():
+        if name != "yahoo_data":
+            inputs = [sample[input_name] for input_name in node.inputs]
+            assert_pipeline_equal(sample[name], node.function(*inputs), name)
+
+    # The portfolio of the sample is fully invested
+    gross = sample["portfolio"].abs().sum(axis=1)
+    np.testing.assert_allclose(gross[gross > 0], 1.0)
+
+
+def test_downsample_calendar_with_missing_dates(outputs):
+    yahoo_data = dict(outputs["yahoo_data"])
+    dates = yahoo_data["MSFT"].index
+    # MSFT misses the first dates of the sample, and AMZN a date in the middle
+    yahoo_data["MSFT"] = yahoo_data["MSFT"].drop(dates[[1, 2]])
+    yahoo_data["AMZN"] = yahoo_data["AMZN"].drop(dates[3])
+    calendar = get_calendar(yahoo_data)
+    outputs = dict(
+        outputs,
+        yahoo_data=yahoo_data,
+        calendar=calendar,
+        closes=get_closes(yahoo_data, calendar),
+        volumes=get_volumes(yahoo_data, calendar),
+    )
+
+    sample = downsample_pipeline(outputs, n_tickers=4, n_dates=5)
+    assert sample["closes"].index[0] == dates[1]
+    assert isinstance(sample["calendar"].positions["MSFT"], slice)
+    assert isinstance(sample["calendar"].positions["AMZN"], np.ndarray)
+    assert_pipeline_equal(sample["calendar"], get_calendar(sample["yahoo_data"]))
+
+
+def test_downsample_keeps_missing_values(outputs):
+    outputs = dict(outputs)
+    closes = outputs["closes"].copy()
+    closes.iloc[7:9, 1] = np.nan
+    outputs["closes"] = closes
+
+    sample = downsample_pipeline(outputs, n_tickers=2, n_dates=4)
+    assert closes.columns[1] in sample["closes"].columns
+    assert sample["closes"].isnull().sum().sum() == 2
+
+
+def test_downsample_cli(cached_pipeline_path, tmp_path):
+    main([str(cached_pipeline_path), str(tmp_path), "--tickers", "2", "--dates", "3"])
+    sample = load_pipeline_outputs(tmp_path)
+    assert sample["closes"].shape == (3, 2)
+
+    # The downsampled nodes can be used as fixtures
+    (tmp_path / "conftest.py").write_text(
+        "from sample_pipeline.fixtures import cached_fixtures\n\n"
+        "globals().update(cached_fixtures(__file__.rsplit('/', 1)[0]))\n"
+    )
+    (tmp_path / "test_sample.py").write_text(
+        "def test_sample(closes, signals):\n"
+        "    assert closes.shape == (3, 2)\n"
+        "    assert set(signals) == {'BUY_AAPL', 'BUY_AMZN'}\n"
+    )
+    subprocess.run(
+        [sys.executable, "-m", "pytest", "test_sample.py"]
+        + ["-p", "no:cacheprovider", "-p", "no:xdist"],
+        cwd=tmp_path,
+        check=True,
+    )
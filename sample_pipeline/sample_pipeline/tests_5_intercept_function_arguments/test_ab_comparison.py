@@ -0,0 +1,125 @@
+import pandas as pd
+from dask.delayed import delayed
+
+from sample_pipeline import sample_functions
+from sample_pipeline.ab_comparison import compare_implementations
+from sample_pipeline.sample_functions import f, g
+
+
+def f_refactored(a, b, c):
+    assert b < 0
+    return c + b + a
+
+
+def f_modified(a, b, c):
+    return a + b + c + 1
+
+
+def g_refactored(a, b):
+    return sample_functions.f(a, b, c=0)
+
+
+def g_modified(a, b):
+    return sample_functions.f(a, b, 1)
+
+
+def f_frame(a, b, c):
+    return pd.DataFrame(
+        {"x": [float(a), float(b), float(c)]},
+        index=pd.date_range("2020-01-01", periods=3),
+    )
+
+
+def f_frame_modified(a, b, c):
+    frame = f_frame(a, b, c)
+    frame.iloc[-1, 0] += 0.5
+    return frame
+
+
+def sample_pipeline(upstream_calls):
+    """A Dask pipeline in which 'f' has an upstream node"""
+
+    def upstream(x):
+        upstream_calls.append(x)
+        return -x
+
+    def compute():
+        from sample_pipeline.sample_functions import f
+
+        b = delayed(upstream)(2)
+        return delayed(f)(1, b, 3).compute()
+
+    return compute
+
+
+def test_same_outputs():
+    upstream_calls = []
+    comparison = compare_implementations(
+        sample_pipeline(upstream_calls),
+        "sample_pipeline.sample_functions.f",
+        f,
+        f_refactored,
+    )
+    assert comparison.old == comparison.new == 2
+    assert comparison.diff is None
+
+    # The upstream node was computed only once
+    assert upstream_calls == [2]
+
+
+def test_different_outputs():
+    comparison = compare_implementations(
+        sample_pipeline([]),
+        "sample_pipeline.sample_functions.f",
+        "sample_pipeline.sample_functions.f",
+        f_modified,
+    )
+    assert (comparison.old, comparison.new) == (2, 3)
+    assert comparison.diff
+
+
+def test_same_data_frames():
+    comparison = compare_implementations(
+        sample_pipeline([]),
+        "sample_pipeline.sample_functions.f",
+        f_frame,
+        f_frame,
+    )
+    assert comparison.diff is None
+
+
+def test_different_data_frames():
+    comparison = compare_implementations(
+        sample_pipeline([]),
+        "sample_pipeline.sample_functions.f",
+        f_frame,
+        f_frame_modified,
+    )
+    assert comparison.old["x"].tolist() == [1, -2, 3]
+    assert comparison.new["x"].tolist() == [1, -2, 3.5]
+    assert comparison.diff is not None
+    assert "x" in comparison.diff
+
+
+def test_same_intercepted_arguments():
+    comparison = compare_implementations(
+        lambda: sample_functions.g(1, -2),
+        "sample_pipeline.sample_functions.g",
+        g,
+        g_refactored,
+        intercept_path="sample_pipeline.sample_functions.f",
+    )
+    assert comparison.old == comparison.new == {"a": 1, "b": -2, "c": 0}
+    assert comparison.diff is None
+
+
+def test_different_intercepted_arguments():
+    comparison = compare_implementations(
+        lambda: sample_functions.g(1, -2),
+        "sample_pipeline.sample_functions.g",
+        g,
+        g_modified,
+        intercept_path="sample_pipeline.sample_functions.f",
+    )
+    assert comparison.new == {"a": 1, "b": -2, "c": 1}
+    assert comparison.diff
@@ -0,0 +1,99 @@
+import gc
+import pickle
+import warnings
+from collections import deque
+
+import pandas as pd
+import pytest
+from dask.base import tokenize
+
+from sample_pipeline.intercept_function_arguments import (
+    PickledCalls,
+    intercept_function_calls,
+    read_pickled_calls,
+)
+from sample_pipeline.sample_functions import g
+
+
+def test_intercept_all_calls():
+    fun_path = "sample_pipeline.sample_functions.f"
+    calls = []
+    with intercept_function_calls(fun_path, calls):
+        results = [g(i, -1) for i in range(3)]
+
+    # The actual function was called
+    assert results == [-1, 0, 1]
+    assert calls == [{"a": i, "b": -1, "c": 0} for i in range(3)]
+
+
+def test_intercept_calls_without_calling_through():
+    fun_path = "sample_pipeline.sample_functions.f"
+    calls = []
+    with intercept_function_calls(fun_path, calls, call_through=False):
+        # f would raise an AssertionError on b > 0
+        assert g(1, 2) is None
+
+    assert calls == [{"a": 1, "b": 2, "c": 0}]
+
+
+def test_intercept_calls_in_a_ring_buffer():
+    fun_path = "sample_pipeline.sample_functions.f"
+    calls = deque(maxlen=2)
+    with intercept_function_calls(fun_path, calls):
+        for i in range(1000):
+            g(i, -1)
+
+    assert list(calls) == [{"a": 998, "b": -1, "c": 0}, {"a": 999, "b": -1, "c": 0}]
+
+
+def test_intercept_calls_by_reference():
+    fun_path = "sample_pipeline.sample_functions.f"
+    a = pd.Series([1.0, 2.0])
+    calls = []
+    with intercept_function_calls(fun_path, calls):
+        g(a, -1)
+
+    assert calls[0]["a"] is a
+
+
+def test_intercept_hashed_calls():
+    fun_path = "sample_pipeline.sample_functions.f"
+    a = pd.Series([1.0, 2.0])
+    calls = []
+    with intercept_function_calls(fun_path, calls, hash_arguments=True):
+        g(a, -1)
+
+    assert calls == [{"a": tokenize(a), "b": tokenize(-1), "c": tokenize(0)}]
+
+
+def test_intercept_calls_to_disk(tmp_path):
+    fun_path = "sample_pipeline.sample_functions.f"
+    with PickledCalls(tmp_path / "calls.pickle") as calls:
+        with intercept_function_calls(fun_path, calls):
+            for i in range(3):
+                g(i, -1)
+
+    assert list(read_pickled_calls(tmp_path / "calls.pickle")) == [
+        {"a": i, "b": -1, "c": 0} for i in range(3)
+    ]
+
+
+def test_unpickled_calls_leave_no_open_file(tmp_path):
+    calls = pickle.loads(pickle.dumps(PickledCalls(tmp_path / "calls.pickle")))
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", ResourceWarning)
+        calls.append({"a": 1})
+        del calls
+        gc.collect()
+
+    assert list(read_pickled_calls(tmp_path / "calls.pickle")) == [{"a": 1}]
+
+
+def test_intercept_calls_wrong_arguments():
+    fun_path = "sample_pipeline.sample_functions.f"
+    calls = []
+    with pytest.raises(TypeError, match=r"missing a required argument: 'c'"):
+        with intercept_function_calls(fun_path, calls):
+            from sample_pipeline.sample_functions import f
+
+            f(1, 2)
@@ -0,0 +1,83 @@
+import pytest
+from dask.delayed import delayed
+
+from sample_pipeline.intercept_function_arguments import (
+    PickledCalls,
+    intercept_function_arguments,
+    intercept_function_calls,
+)
+
+
+@pytest.fixture(scope="module")
+def distributed_client():
+    distributed = pytest.importorskip("distributed")
+    with distributed.LocalCluster(
+        n_workers=2, processes=True, dashboard_address=None
+    ) as cluster, distributed.Client(cluster) as client:
+        yield client
+
+
+@pytest.fixture(params=["sync", "threads", "processes", "distributed"])
+def compute(request):
+    """A function that computes a Dask graph with the given scheduler"""
+    scheduler = request.param
+    if scheduler == "distributed":
+        scheduler = request.getfixturevalue("distributed_client")
+
+    def _compute(node):
+        return node.compute(scheduler=scheduler)
+
+    return _compute
+
+
+def sample_graph():
+    """A sample Dask graph that calls f three times. We import the target
+    function at the last moment (after entering the interception context)"""
+    from sample_pipeline.sample_functions import f
+
+    return delayed(sum)([delayed(f)(i, -1, 0) for i in range(3)])
+
+
+def test_intercept_arguments_with_scheduler(compute):
+    fun_path = "sample_pipeline.sample_functions.f"
+    fun_args = {}
+    with intercept_function_arguments(fun_path, fun_args):
+        compute(sample_graph())
+
+    assert set(fun_args) == {"a", "b", "c"}
+    assert fun_args["a"] in range(3)
+    assert (fun_args["b"], fun_args["c"]) == (-1, 0)
+
+
+def test_intercept_calls_with_scheduler(compute, tmp_path):
+    fun_path = "sample_pipeline.sample_functions.f"
+    with PickledCalls(tmp_path / "calls.pickle") as calls:
+        with intercept_function_calls(fun_path, calls):
+            result = compute(sample_graph())
+
+        assert result == 0
+        assert sorted(call["a"] for call in calls) == [0, 1, 2]
+
+
+def test_intercept_calls_in_memory_in_other_processes():
+    """The calls made in other processes can't be recorded in a list"""
+    fun_path = "sample_pipeline.sample_functions.f"
+    calls = []
+    with pytest.raises(RuntimeError, match="was called in another process"):
+        with intercept_function_calls(fun_path, calls):
+            sample_graph().compute(scheduler="processes")
+
+
+def test_calls_inside_a_node_in_other_processes_are_not_intercepted():
+    """g calls f inside the node, in a worker that imported the original f"""
+    from sample_pipeline.sample_functions import g
+
+    fun_path = "sample_pipeline.sample_functions.f"
+    with pytest.raises(RuntimeError, match="use the 'sync' or 'threads' scheduler"):
+        with intercept_function_arguments(fun_path, {}):
+            delayed(g)(1, -1).compute(scheduler="processes")
+
+    fun_args = {}
+    with intercept_function_arguments(fun_path, fun_args):
+        delayed(g)(1, -1).compute(scheduler="threads")
+    assert fun_args == {"a": 1, "b": -1, "c": 0}
@@ -1,9 +1,10 @@
+import pandas as pd
 import pytest
-from deepdiff import DeepDiff
 
 from sample_pipeline.data import get_closes, get_volumes, get_yahoo_data
 from sample_pipeline.intercept_function_arguments import intercept_function_arguments
 from sample_pipeline.pipeline import get_full_pipeline
+from sample_pipeline.testing import assert_pipeline_equal
 
 
 @pytest.fixture(scope="session")
@@ -25,7 +26,13 @@ def tickers():
 
 
 @pytest.fixture(scope="session")
-def old_pipeline(tickers, start_date, end_date):
+def data_source():
+    """The synthetic data source, which does not require network access"""
+    return "synthetic"
+
+
+@pytest.fixture(scope="session")
+def old_pipeline(tickers, start_date, end_date, data_source):
     """A basic implementation of the pipeline"""
 
     def compute():
@@ -33,33 +40,38 @@ def old_pipeline(tickers, start_date, end_date):
         # (after entering the 'intercept_function_arguments' context)
         from sample_pipeline.signals import get_signals
 
-        yahoo_data = get_yahoo_data(tickers, start_date, end_date)
+        yahoo_data = get_yahoo_data(tickers, start_date, end_date, data_source)
         return get_signals(get_closes(yahoo_data), get_volumes(yahoo_data))
 
     return compute
 
 
 @pytest.fixture(scope="session")
-def new_pipeline(tickers, start_date, end_date):
+def new_pipeline(tickers, start_date, end_date, data_source):
     """The pipeline implemented with Dask"""
 
-    def compute():
+    def compute(scheduler=None):
         # The pipeline construction will store 'get_signals', so we need to
         # delay it until we enter the 'intercept_function_arguments' context
-        signals = get_full_pipeline(tickers, start_date, end_date)["signals"]
+        full_pipeline = get_full_pipeline(tickers, start_date, end_date, data_source)
+        signals = full_pipeline["signals"]
 
-        return signals.compute()
+        return signals.compute(scheduler=scheduler)
 
     return compute
 
 
-def test_same_arguments(new_pipeline, old_pipeline):
+@pytest.mark.parametrize("scheduler", ["threads", "processes"])
+def test_same_arguments(new_pipeline, old_pipeline, scheduler):
     """We test that the two versions of the pipeline result in identical
     parameters passed to get_signals.
 
     Note that we need to pass the path to the get_signals function that is
     actually used by the pipelines (i.e. sample_pipeline.pipeline.get_signals
     for the Dask pipeline)
+
+    The arguments are intercepted in the same way whether the Dask pipeline
+    is computed in the current process or in worker processes.
     """
     fun_path = "sample_pipeline.signals.get_signals"
     args_old = {}
@@ -69,6 +81,12 @@ def test_same_arguments(new_pipeline, old_pipeline):
     fun_path = "sample_pipeline.pipeline.get_signals"
     args_new = {}
     with intercept_function_arguments(fun_path, args_new):
-        new_pipeline()
+        new_pipeline(scheduler)
+
+    # The Dask pipeline also passes the calendar, an optional argument
+    # that gives the same availability as the closes and volumes
+    calendar = args_new.pop("calendar")
+    availability = (~args_old["closes"].isnull()) | (~args_old["volumes"].isnull())
+    pd.testing.assert_frame_equal(calendar.availability_frame(), availability)
 
-    assert not DeepDiff(args_new, args_old)
+    assert_pipeline_equal(args_new, args_old)
@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+from sample_pipeline import sample_functions
+from sample_pipeline.data import get_closes, get_volumes
+from sample_pipeline.tracer import TraceStats, trace_functions
+
+
+def test_trace_functions():
+    stats = TraceStats()
+    fun_paths = [
+        "sample_pipeline.sample_functions.f",
+        "sample_pipeline.sample_functions.g",
+    ]
+    with trace_functions(fun_paths, stats):
+        for i in range(10):
+            assert sample_functions.g(i, -1) == i - 1
+
+    f_stats = stats.functions["sample_pipeline.sample_functions.f"]
+    g_stats = stats.functions["sample_pipeline.sample_functions.g"]
+    assert f_stats.calls == g_stats.calls == 10
+    assert 0 < f_stats.self_time <= f_stats.cumulative_time <= g_stats.cumulative_time
+    assert g_stats.self_time < g_stats.cumulative_time
+
+    assert set(stats.stacks) == {
+        "sample_pipeline.sample_functions.g",
+        "sample_pipeline.sample_functions.g;sample_pipeline.sample_functions.f",
+    }
+
+    # The functions are not traced anymore
+    sample_functions.g(1, -1)
+    assert f_stats.calls == 10
+
+
+def test_trace_functions_with_exceptions():
+    stats = TraceStats()
+    with trace_functions(["sample_pipeline.sample_functions.f"], stats):
+        with pytest.raises(AssertionError):
+            sample_functions.g(1, 2)
+
+    assert stats.functions["sample_pipeline.sample_functions.f"].calls == 1
+
+
+def test_trace_extract_field(tmp_path):
+    """We trace the inner function of the 'closes' and 'volumes' nodes"""
+    dates = pd.date_range("2021-01-04", periods=5)
+    yahoo_data = {
+        ticker: pd.DataFrame({"Close": 1.0, "Volume": 100.0}, index=dates)
+        for ticker in ["AAPL", "MSFT"]
+    }
+    stats = TraceStats()
+    with trace_functions(["sample_pipeline.data._extract_field"], stats):
+        get_closes(yahoo_data)
+        get_volumes(yahoo_data)
+
+    assert stats.functions["sample_pipeline.data._extract_field"].calls == 2
+    assert "_extract_field" in stats.summary()
+
+    collapsed = tmp_path / "trace.collapsed"
+    stats.to_collapsed(collapsed)
+    ((stack, self_time),) = [
+        line.split() for line in collapsed.read_text().splitlines()
+    ]
+    assert stack == "sample_pipeline.data._extract_field"
+    assert int(self_time) >= 0
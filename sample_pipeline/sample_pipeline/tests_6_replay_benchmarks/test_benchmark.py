@@ -0,0 +1,39 @@
+from sample_pipeline.benchmark import get_start_date, load_results, main, run_benchmarks
+
+
+def test_get_start_date():
+    assert get_start_date("1M", "2021-12-31") == "2021-12-01"
+    assert get_start_date("20Y", "2021-12-31") == "2002-01-01"
+
+
+def test_run_benchmarks(tmp_path):
+    results_file = tmp_path / "results.jsonl"
+    results = run_benchmarks([(4, "1M")], number=1, results_file=results_file)
+
+    assert {result["benchmark"] for result in results} == {
+        "get_calendar",
+        "get_closes",
+        "get_volumes",
+        "get_signals",
+        "get_rolling_signals",
+        "get_rolling_signals_naive",
+        "get_portfolio",
+        "get_portfolio_naive",
+        "get_signal_stats",
+        "get_signal_stats_naive",
+        "full_pipeline",
+    }
+    assert len(load_results(results_file)) == len(results)
+
+
+def test_benchmark_cli(tmp_path, capsys):
+    results_file = tmp_path / "results.jsonl"
+    for _ in range(2):
+        main(
+            ["run", "--tickers", "4", "--periods", "1M", "--number", "1"]
+            + ["--output", str(results_file)]
+        )
+
+    report = capsys.readouterr().out
+    assert "full_pipeline" in report
+    assert len(load_results(results_file)) == 22
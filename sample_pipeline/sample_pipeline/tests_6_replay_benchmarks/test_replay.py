@@ -0,0 +1,74 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from sample_pipeline.replay import (
+    WORKING_TREE,
+    capture_snapshot,
+    compare_revisions,
+    format_comparison,
+    load_snapshot,
+    main,
+    measure,
+    replay_snapshot,
+)
+from sample_pipeline.sample_functions import f, g
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    """A snapshot of the arguments passed to 'f' by 'g'"""
+    snapshot_path = tmp_path / "f.pickle"
+    capture_snapshot(
+        "sample_pipeline.sample_functions.f", lambda: g(1, -2), snapshot_path
+    )
+    return snapshot_path
+
+
+def test_capture_snapshot(snapshot_path):
+    fun_path, fun_kwargs = load_snapshot(snapshot_path)
+    assert fun_path == "sample_pipeline.sample_functions.f"
+    assert fun_kwargs == {"a": 1, "b": -2, "c": 0}
+
+
+def test_measure():
+    stats = measure(f, {"a": 1, "b": -2, "c": 0}, number=5)
+    assert stats["number"] == 5
+    assert 0 <= stats["min"] <= stats["median"] <= stats["max"]
+    assert stats["min"] <= stats["mean"] <= stats["max"]
+    assert stats["peak_memory"] >= 0
+
+
+def test_replay_snapshot(snapshot_path):
+    stats = replay_snapshot(snapshot_path, number=3)
+    assert stats["fun_path"] == "sample_pipeline.sample_functions.f"
+    assert stats["number"] == 3
+
+
+def test_replay_cli(snapshot_path, capsys):
+    main(["run", str(snapshot_path), "--number", "2", "--json"])
+    stats = json.loads(capsys.readouterr().out)
+    assert stats["number"] == 2
+
+
+def test_compare_with_the_working_tree(snapshot_path):
+    results = compare_revisions(snapshot_path, [WORKING_TREE], number=2)
+    assert list(results) == [WORKING_TREE]
+    assert results[WORKING_TREE]["fun_path"] == "sample_pipeline.sample_functions.f"
+
+    table = format_comparison(results)
+    assert "median" in table
+    assert "1.000" in table
+
+
+def test_compare_with_a_revision(snapshot_path):
+    # HEAD is available even in a shallow clone
+    results = compare_revisions(snapshot_path, ["HEAD", WORKING_TREE], number=2)
+    assert list(results) == ["HEAD", WORKING_TREE]
+    assert results["HEAD"]["fun_path"] == "sample_pipeline.sample_functions.f"
+
+    # Each revision is replayed with its own code, not with the working tree
+    working_tree = Path(__file__).resolve().parents[1]
+    assert results[WORKING_TREE]["source"] == str(working_tree)
+    assert results["HEAD"]["source"] != str(working_tree)
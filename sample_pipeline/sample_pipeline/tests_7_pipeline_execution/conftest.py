@@ -0,0 +1,25 @@
+import pytest
+
+
+@pytest.fixture(scope="session")
+def start_date():
+    """A sample start date for the pipeline"""
+    return "2021-01-04"
+
+
+@pytest.fixture(scope="session")
+def end_date():
+    """A sample end date for the pipeline"""
+    return "2021-01-29"
+
+
+@pytest.fixture(scope="session")
+def tickers():
+    """A sample list of tickers"""
+    return {"AAPL", "MSFT", "AMZN", "GOOGL"}
+
+
+@pytest.fixture(scope="session")
+def data_source():
+    """The synthetic data source, which does not require network access"""
+    return "synthetic"
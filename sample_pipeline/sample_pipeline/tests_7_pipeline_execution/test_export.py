@@ -0,0 +1,123 @@
+import tracemalloc
+
+import dask
+import pandas as pd
+import pytest
+
+from sample_pipeline.export import export_pipeline_outputs, get_years, read_partitioned
+from sample_pipeline.pipeline import get_full_pipeline
+from sample_pipeline.testing import assert_pipeline_equal
+
+pytest.importorskip("pyarrow")
+
+# The export spans two years
+START_DATE, END_DATE = "2020-12-01", "2021-01-29"
+
+
+@pytest.fixture(scope="module")
+def expected(tickers, data_source):
+    """The exported nodes, computed year by year"""
+    years = [
+        dask.compute(get_full_pipeline(tickers, first, last, data_source))[0]
+        for first, last in get_years(START_DATE, END_DATE)
+    ]
+    return {
+        "closes": pd.concat([year["closes"] for year in years]),
+        "volumes": pd.concat([year["volumes"] for year in years]),
+        "signals": {
+            name: pd.concat([year["signals"][name] for year in years])
+            for name in years[0]["signals"]
+        },
+    }
+
+
+@pytest.fixture(scope="module")
+def exported_pipeline(tickers, data_source, tmp_path_factory):
+    path = tmp_path_factory.mktemp("export")
+    files = export_pipeline_outputs(
+        path, tickers, START_DATE, END_DATE, data_source, scheduler="threads"
+    )
+    return path, files
+
+
+def test_get_years():
+    assert get_years("2020-12-01", "2021-01-29") == [
+        (pd.Timestamp("2020-12-01"), pd.Timestamp("2020-12-31")),
+        (pd.Timestamp("2021-01-01"), pd.Timestamp("2021-01-29")),
+    ]
+    assert get_years("2021-01-04", "2021-01-29") == [
+        (pd.Timestamp("2021-01-04"), pd.Timestamp("2021-01-29"))
+    ]
+
+
+def test_export_pipeline_outputs(exported_pipeline, expected):
+    path, files = exported_pipeline
+    relative_files = {file.relative_to(path).as_posix() for file in files}
+    assert "closes/year=2020/part-0.parquet" in relative_files
+    assert "signals/signal=BUY_AAPL/year=2021/part-0.parquet" in relative_files
+    assert len(relative_files) == len(files) == 2 * (2 + 2)
+
+    for name in ["closes", "volumes", "signals"]:
+        actual = read_partitioned(path, name)
+        assert_pipeline_equal(actual, expected[name], name)
+
+
+def test_read_partitioned_subset(exported_pipeline, expected):
+    path, _ = exported_pipeline
+    signals = read_partitioned(
+        path,
+        "signals",
+        start_date="2021-01-04",
+        end_date="2021-01-15",
+        tickers=["AAPL", "MSFT"],
+        signals=["BUY_AMZN"],
+    )
+    expected = expected["signals"]["BUY_AMZN"]
+    expected = expected.loc["2021-01-04":"2021-01-15", ["AAPL", "MSFT"]]
+    assert list(signals) == ["BUY_AMZN"]
+    pd.testing.assert_frame_equal(signals["BUY_AMZN"], expected)
+
+    with pytest.raises(KeyError, match="BUY_TSLA"):
+        read_partitioned(path, "signals", signals=["BUY_TSLA"])
+
+
+def test_export_removes_the_stale_partitions(tickers, data_source, expected, tmp_path):
+    stale = {
+        "closes": tmp_path / "closes" / "year=1999",
+        "signals": tmp_path / "signals" / "signal=BUY_TSLA" / "year=2021",
+    }
+    export_pipeline_outputs(
+        tmp_path, tickers, START_DATE, END_DATE, data_source, scheduler="sync"
+    )
+    for name, partition in stale.items():
+        partition.mkdir(parents=True)
+        value = expected[name]
+        if name == "signals":
+            value = value["BUY_AMZN"]
+        (value.iloc[:1] + 1.0).to_parquet(partition / "part-0.parquet")
+
+    export_pipeline_outputs(
+        tmp_path, tickers, START_DATE, END_DATE, data_source, scheduler="sync"
+    )
+    for name in stale:
+        assert_pipeline_equal(read_partitioned(tmp_path, name), expected[name], name)
+
+
+def test_export_memory_does_not_grow_with_the_history(data_source, tmp_path):
+    tickers = [f"T{i:03d}" for i in range(200)]
+
+    def peak_memory(end_date):
+        tracemalloc.start()
+        try:
+            export_pipeline_outputs(
+                tmp_path, tickers, "2015-01-01", end_date, data_source, scheduler="sync"
+            )
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    # The first export imports the Parquet modules
+    peak_memory("2015-12-31")
+    one_year, five_years = peak_memory("2015-12-31"), peak_memory("2019-12-31")
+    assert len(read_partitioned(tmp_path, "closes")) > 4 * 252
+    assert five_years < 1.5 * one_year
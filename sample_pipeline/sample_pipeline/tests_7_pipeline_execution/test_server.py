@@ -0,0 +1,169 @@
+import pickle
+
+import dask
+import pytest
+from dask.delayed import delayed
+
+from sample_pipeline.data import get_data_source
+from sample_pipeline.pipeline import get_full_pipeline
+from sample_pipeline.server import PipelineClient, PipelineServer, PipelineService
+from sample_pipeline.testing import assert_pipeline_equal
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = PipelineServer(service=PipelineService(max_pipelines=2))
+    thread = server.serve_in_background()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+@pytest.fixture
+def parameters(tickers, start_date, end_date, data_source):
+    return dict(
+        tickers=tickers,
+        start_date=start_date,
+        end_date=end_date,
+        data_source=data_source,
+    )
+
+
+@pytest.fixture(scope="module")
+def expected(tickers, start_date, end_date, data_source):
+    (full_pipeline,) = dask.compute(
+        get_full_pipeline(tickers, start_date, end_date, data_source)
+    )
+    return full_pipeline
+
+
+@pytest.mark.parametrize("response_format", [None, "pickle", "arrow"])
+def test_get_nodes(server, parameters, expected, response_format):
+    if response_format == "arrow":
+        pytest.importorskip("pyarrow")
+    client = PipelineClient(server.url, response_format)
+    for name in ["closes", "volumes", "signals"]:
+        actual = client.get_node(name, **parameters)
+        assert_pipeline_equal(actual, expected[name], name)
+
+
+def test_nodes_are_kept_in_memory(server, parameters, expected):
+    client = PipelineClient(server.url)
+    client.get_node("closes", **parameters)
+    stats = client.stats()
+    client.get_node("closes", **parameters)
+    assert client.stats()["hits"] == stats["hits"] + 1
+    assert client.stats()["misses"] == stats["misses"]
+
+    (pipeline,) = [
+        pipeline
+        for pipeline in stats["pipelines"]
+        if pipeline["parameters"]["start_date"] == parameters["start_date"]
+    ]
+    assert {"yahoo_data", "calendar", "closes"} <= set(pipeline["nodes"])
+
+    # Objects that are not data frames are pickled
+    calendar = client.get_node("calendar", **parameters)
+    assert_pipeline_equal(calendar, expected["calendar"])
+
+
+def test_responses_are_serialized_once(parameters):
+    service = PipelineService()
+    response = service.get_response("closes", parameters)
+    assert service.get_response("closes", parameters)[1] is response[1]
+    assert service.get_response("signals", parameters, key="BUY_AAPL")[1] is (
+        service.get_response("signals", parameters, key="BUY_AAPL")[1]
+    )
+    assert (service.hits, service.misses) == (2, 2)
+
+
+def test_least_recently_used_pipelines_are_evicted(server, parameters):
+    client = PipelineClient(server.url)
+    for start_date in ["2021-01-11", "2021-01-18", "2021-01-25"]:
+        client.get_node("closes", **dict(parameters, start_date=start_date))
+    assert len(client.stats()["pipelines"]) == 2
+
+
+def test_errors(server, parameters):
+    client = PipelineClient(server.url)
+    with pytest.raises(RuntimeError, match="404: Unknown node"):
+        client.get_node("not_a_node", **parameters)
+    with pytest.raises(RuntimeError, match="400: Only data frames"):
+        PipelineClient(server.url, "arrow").get_node("calendar", **parameters)
+    with pytest.raises(RuntimeError, match="400: Invalid parameters"):
+        client.get_node("closes", tickers=["AAPL"])
+    for invalid in [
+        dict(data_source="not_a_data_source"),
+        dict(node_wrapper="print"),
+        dict(start_date="not_a_date"),
+    ]:
+        with pytest.raises(RuntimeError, match="400: Invalid parameters"):
+            client.get_node("closes", **dict(parameters, **invalid))
+    with pytest.raises(RuntimeError, match="404: Unknown item"):
+        client._get("/nodes/signals/BUY_TSLA", parameters)
+
+
+def test_services_share_the_cached_data(parameters, expected):
+    cached = get_data_source("synthetic_cached")
+    cached.clear()
+    parameters = dict(parameters, data_source="synthetic_cached")
+    hits = cached.hits
+    for service in [PipelineService(), PipelineService()]:
+        _, body = service.get_response("closes", parameters, response_format="pickle")
+        assert_pipeline_equal(pickle.loads(body), expected["closes"])
+    # The second service did not download the data again
+    assert cached.hits == hits + len(parameters["tickers"])
+
+
+def _missing_column(n):
+    return {"a": n}["b"]
+
+
+def get_failing_pipeline(n):
+    return {"failing": delayed(_missing_column)(n, dask_key_name="failing")}
+
+
+def test_errors_in_the_computation():
+    server = PipelineServer(service=PipelineService(get_failing_pipeline))
+    thread = server.serve_in_background()
+    try:
+        client = PipelineClient(server.url)
+        # The KeyError is raised by the node, not by the request
+        with pytest.raises(RuntimeError, match="500: KeyError"):
+            client.get_node("failing", n="1")
+        with pytest.raises(RuntimeError, match="404: Unknown node"):
+            client.get_node("other", n="1")
+        with pytest.raises(RuntimeError, match="400: Invalid parameters"):
+            client.get_node("failing", m="1")
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def _items(n):
+    return {key: f"{key} {n}" for key in ["a b", "50%", "c/d", "é"]}
+
+
+def get_pipeline_with_special_names(n):
+    name = "items/50% é"
+    return {name: delayed(_items)(n, dask_key_name=name)}
+
+
+def test_names_and_keys_are_url_encoded():
+    server = PipelineServer(service=PipelineService(get_pipeline_with_special_names))
+    thread = server.serve_in_background()
+    try:
+        client = PipelineClient(server.url)
+        # The query parameters are strings
+        assert client.get_node("items/50% é", n=1) == {
+            "a b": "a b 1",
+            "50%": "50% 1",
+            "c/d": "c/d 1",
+            "é": "é 1",
+        }
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
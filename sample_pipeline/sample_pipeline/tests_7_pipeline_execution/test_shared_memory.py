@@ -0,0 +1,117 @@
+import subprocess
+import sys
+import textwrap
+from functools import partial
+
+import dask
+import numpy as np
+import pandas as pd
+import pytest
+
+from sample_pipeline.pipeline import get_full_pipeline
+from sample_pipeline.testing import assert_pipeline_equal
+
+shared_memory = pytest.importorskip("multiprocessing.shared_memory")
+
+from sample_pipeline.shared_memory import (  # noqa: E402
+    SharedFrame,
+    SharedMemoryNode,
+    compute_with_shared_memory,
+    share,
+    shared_memory_session,
+    unshare,
+)
+
+
+@pytest.fixture()
+def frames():
+    index = pd.date_range("2021-01-04", periods=100, name="Date")
+    prices = pd.DataFrame(
+        {"A": np.arange(100.0), "B": np.arange(100), "C": np.arange(100.0) / 2},
+        index=index,
+    )
+    names = pd.DataFrame({"name": ["x"] * 100}, index=index)
+    return {"prices": prices, "names": names, "other": [prices, 1]}
+
+
+def test_share_and_unshare(frames):
+    with shared_memory_session() as segments:
+        shared = share(frames, min_bytes=0)
+        assert len(segments) == 1
+        assert isinstance(shared["prices"], SharedFrame)
+        assert isinstance(shared["other"][0], SharedFrame)
+        # Non-numeric data frames are passed as is
+        assert shared["names"] is frames["names"]
+
+        actual = unshare(shared)
+        assert_pipeline_equal(actual, frames)
+
+        # The data frames point to the shared memory, unless they are copied
+        again = unshare(shared)
+        assert np.shares_memory(actual["prices"]["A"], again["prices"]["A"])
+        copied = unshare(shared, copy=True)
+        assert not np.shares_memory(actual["prices"]["A"], copied["prices"]["A"])
+        del actual, again
+
+    # The segment was removed
+    (name,) = segments
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+    pd.testing.assert_frame_equal(copied["prices"], frames["prices"])
+
+
+def test_small_outputs_are_not_shared(frames):
+    with shared_memory_session() as segments:
+        assert share(frames) is frames
+    assert not segments
+
+
+def test_segments_outside_of_a_session_are_removed_at_exit():
+    script = textwrap.dedent(
+        """
+        import numpy as np
+        import pandas as pd
+
+        from sample_pipeline.shared_memory import share
+
+        shared = share(pd.DataFrame({"A": np.arange(100.0)}), min_bytes=0)
+        print(shared.segment.name)
+        """
+    )
+    process = subprocess.run(
+        [sys.executable, "-c", script],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    assert process.returncode == 0, process.stderr
+    # Otherwise the resource tracker would warn about a leaked segment
+    assert "leaked" not in process.stderr
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=process.stdout.strip())
+
+
+@pytest.mark.parametrize("scheduler", ["sync", "processes"])
+def test_pipeline_with_shared_memory(
+    tickers, start_date, end_date, data_source, scheduler
+):
+    full_pipeline = get_full_pipeline(tickers, start_date, end_date, data_source)
+    (expected,) = dask.compute(full_pipeline)
+
+    shared_pipeline = get_full_pipeline(
+        tickers,
+        start_date,
+        end_date,
+        data_source,
+        node_wrapper=partial(SharedMemoryNode, min_bytes=0),
+    )
+    with shared_memory_session() as segments:
+        (actual,) = dask.compute(shared_pipeline, scheduler=scheduler)
+        assert isinstance(actual["closes"], SharedFrame)
+        actual = unshare(actual, copy=True)
+    # One segment per node, except the calendar that has no data frame
+    assert len(segments) == len(full_pipeline) - 1
+    assert_pipeline_equal(actual, expected)
+
+    (actual,) = compute_with_shared_memory(shared_pipeline, scheduler=scheduler)
+    assert_pipeline_equal(actual, expected)
@@ -0,0 +1,106 @@
+import dask
+import pytest
+
+from sample_pipeline.pipeline import get_full_pipeline, get_full_pipeline_spec
+from sample_pipeline.spec import PipelineSpec
+from sample_pipeline.testing import assert_pipeline_equal
+
+
+def inc(x):
+    return x + 1
+
+
+def add(*args):
+    return sum(args)
+
+
+@pytest.fixture
+def parameters(tickers, start_date, end_date, data_source):
+    return dict(
+        tickers=tickers,
+        start_date=start_date,
+        end_date=end_date,
+        data_source=data_source,
+    )
+
+
+@pytest.mark.parametrize("optimize", [True, False])
+def test_compiled_full_pipeline(parameters, optimize):
+    spec = get_full_pipeline_spec()
+    assert spec.parameters == ["data_source", "end_date", "start_date", "tickers"]
+
+    (expected,) = dask.compute(get_full_pipeline(**parameters))
+    compiled = spec.compile(parameters, optimize=optimize)
+    assert_pipeline_equal(compiled.compute(), expected)
+    assert_pipeline_equal(compiled["closes"].compute(), expected["closes"])
+
+
+def test_full_pipeline_is_built_from_the_spec(parameters):
+    spec = get_full_pipeline_spec()
+    full_pipeline = get_full_pipeline(**parameters)
+    assert list(full_pipeline) == list(spec.nodes)
+    for name, node in spec.nodes.items():
+        dependencies = full_pipeline[name].dask.dependencies[name]
+        assert dependencies == set(spec.nodes).intersection(node.inputs), name
+
+
+def test_culling(parameters):
+    compiled = get_full_pipeline_spec().compile(parameters, outputs=["closes"])
+    assert "signals" not in compiled.graph
+    assert "volumes" not in compiled.graph
+    assert set(compiled.compute()) == {"closes"}
+    with pytest.raises(KeyError, match="signals"):
+        compiled["signals"]
+
+
+def test_fusion_of_linear_chains():
+    spec = PipelineSpec([("a", inc, ["x"]), ("b", inc, ["a"]), ("c", inc, ["b"])])
+    spec.add("d", add, ["a", "c"])
+
+    # The x -> a -> b -> c chain is fused
+    compiled = spec.compile(dict(x=0), outputs=["c"])
+    assert set(compiled.graph) == {"c"}
+    assert compiled.compute() == {"c": 3}
+
+    # But 'a' has two dependents when 'd' is requested
+    compiled = spec.compile(dict(x=0), outputs=["d"])
+    assert set(compiled.graph) == {"a", "d"}
+    assert compiled.compute(scheduler="sync") == {"d": 1 + 3}
+
+
+def test_large_pipeline():
+    """A pipeline with one node per ticker, and a node that depends on all of them"""
+    n = 20000
+    spec = PipelineSpec(
+        (f"T{i}", inc, [f"T{i - 1}" if i else "x"]) for i in reversed(range(n))
+    )
+    spec.add("total", add, [f"T{i}" for i in range(n)])
+
+    compiled = spec.compile(dict(x=0), outputs=["total", f"T{n - 1}"])
+    assert compiled.compute(scheduler="sync") == {
+        "total": n * (n + 1) // 2,
+        f"T{n - 1}": n,
+    }
+
+
+def test_literal_parameters():
+    """Parameters that look like node names are not taken as references"""
+    spec = PipelineSpec([("a", len, ["x"])])
+    assert spec.compile(dict(x=["a", "x"])).compute() == {"a": 2}
+
+
+def test_invalid_specs():
+    with pytest.raises(ValueError, match="two nodes named a"):
+        PipelineSpec([("a", inc, ["x"]), ("a", inc, ["x"])])
+
+    spec = PipelineSpec([("a", inc, ["b"]), ("b", inc, ["a"]), ("c", inc, ["x"])])
+    with pytest.raises(ValueError, match=r"cycle between \['a', 'b'\]"):
+        spec.compile(dict(x=0))
+
+    spec = PipelineSpec([("a", add, ["x", "y"])])
+    with pytest.raises(ValueError, match=r"Missing pipeline parameters \['y'\]"):
+        spec.compile(dict(x=0))
+    with pytest.raises(ValueError, match=r"Unknown pipeline parameters \['z'\]"):
+        spec.compile(dict(x=0, y=1, z=2))
+    with pytest.raises(KeyError, match="Unknown pipeline nodes"):
+        spec.compile(dict(x=0, y=1), outputs=["b"])
@@ -0,0 +1,60 @@
+import dask
+import numpy as np
+import pytest
+
+from sample_pipeline.pipeline import get_full_pipeline
+from sample_pipeline.spill import SpillBuffer, compute_with_memory_budget
+from sample_pipeline.testing import assert_pipeline_equal
+
+
+def test_spill_buffer(tmp_path):
+    buffer = SpillBuffer(memory_limit=1000, spill_directory=tmp_path)
+    buffer["a"] = np.zeros(100)  # 800 bytes
+    buffer["b"] = np.ones(100)
+    assert buffer.spilled_count == 1
+    assert buffer.memory_usage <= 1000
+    assert len(list(tmp_path.iterdir())) == 1
+
+    # 'a' was spilled, and is reloaded when accessed
+    np.testing.assert_array_equal(buffer["a"], np.zeros(100))
+    assert buffer.loaded_count == 1
+    assert buffer.spilled_count == 2
+
+    assert set(buffer) == {"a", "b"}
+    del buffer["a"]
+    del buffer["b"]
+    assert not buffer
+    assert not list(tmp_path.iterdir())
+
+
+def test_spill_buffer_large_value(tmp_path):
+    buffer = SpillBuffer(memory_limit="1kB", spill_directory=tmp_path)
+    buffer["a"] = np.zeros(1000)
+    assert buffer.memory_usage == 0
+    np.testing.assert_array_equal(buffer["a"], np.zeros(1000))
+    assert buffer.memory_usage == 0
+
+
+@pytest.mark.parametrize("memory_limit", ["1kB", "50kB", "1GB"])
+def test_compute_with_memory_budget(
+    tickers, start_date, end_date, data_source, memory_limit, tmp_path
+):
+    full_pipeline = get_full_pipeline(tickers, start_date, end_date, data_source)
+    (expected,) = dask.compute(full_pipeline)
+    stats = {}
+    (actual,) = compute_with_memory_budget(
+        full_pipeline,
+        memory_limit=memory_limit,
+        spill_directory=tmp_path,
+        stats=stats,
+    )
+    assert_pipeline_equal(actual, expected)
+    assert not list(tmp_path.iterdir())
+
+    if memory_limit == "1kB":
+        # The node outputs don't fit in memory, and are read back from disk
+        # by the nodes that depend on them
+        assert stats["spilled_count"] > 0
+        assert stats["loaded_count"] > 0
+    elif memory_limit == "1GB":
+        assert stats == {"spilled_count": 0, "loaded_count": 0}
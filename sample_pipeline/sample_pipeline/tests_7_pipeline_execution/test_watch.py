@@ -0,0 +1,169 @@
+import importlib
+import os
+import sys
+import textwrap
+
+import pytest
+
+from sample_pipeline.data import _extract_field, get_closes
+from sample_pipeline.signals import get_signals
+from sample_pipeline.watch import PipelineWatcher, function_fingerprint
+
+NODES_SOURCE = """
+LOADS = []
+SCALE = {scale}
+
+
+def load(n):
+    LOADS.append(n)
+    return list(range(n))
+
+
+def _double(values):
+    return [{factor} * value for value in values]
+
+
+def double(values):
+    return _double(values)
+
+
+def total(values, doubled):
+    return SCALE * (sum(values) + sum(doubled))
+"""
+
+PIPELINE_SOURCE = """
+from dask.delayed import Delayed, delayed
+
+from .nodes import double, load, total
+
+
+def get_pipeline(n):
+    values = delayed(load)(n, dask_key_name="values")
+    doubled = delayed(double)(values, dask_key_name="doubled")
+    result = delayed(total)(values, doubled, dask_key_name="result")  # noqa
+    return {name: task for name, task in locals().items() if isinstance(task, Delayed)}
+"""
+
+
+def write_module(path, source):
+    mtime = path.stat().st_mtime + 10 if path.exists() else None
+    path.write_text(textwrap.dedent(source))
+    if mtime is not None:
+        # Make sure that the change is visible, even on coarse file systems
+        os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def watched_package(tmp_path):
+    package = tmp_path / "watched_package"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    write_module(package / "nodes.py", NODES_SOURCE.format(factor=2, scale=1))
+    write_module(package / "pipeline.py", PIPELINE_SOURCE)
+    sys.path.insert(0, str(tmp_path))
+    try:
+        yield package
+    finally:
+        sys.path.remove(str(tmp_path))
+        for name in list(sys.modules):
+            if name.split(".")[0] == "watched_package":
+                del sys.modules[name]
+
+
+def test_pipeline_watcher(watched_package):
+    pipeline = importlib.import_module("watched_package.pipeline")
+    watcher = PipelineWatcher(pipeline.get_pipeline, dict(n=4))
+    assert watcher.refresh() == ["values", "doubled", "result"]
+    assert watcher.results["result"] == 6 + 12
+    assert watcher.refresh() == []
+
+    # Changing a helper of 'double' recomputes 'double' and its descendants
+    nodes = watched_package / "nodes.py"
+    write_module(nodes, NODES_SOURCE.format(factor=3, scale=1))
+    assert watcher.changed_modules() == ["watched_package.nodes"]
+    assert watcher.refresh() == ["doubled", "result"]
+    assert watcher.results["result"] == 6 + 18
+
+    # So does a constant
+    write_module(nodes, NODES_SOURCE.format(factor=3, scale=10))
+    assert watcher.refresh() == ["result"]
+    assert watcher.results["result"] == 10 * (6 + 18)
+
+    # The values were not loaded again after the reloads (which reset LOADS)
+    assert sys.modules["watched_package.nodes"].LOADS == []
+
+
+def test_pipeline_watcher_keeps_results_on_errors(watched_package):
+    pipeline = importlib.import_module("watched_package.pipeline")
+    watcher = PipelineWatcher(pipeline.get_pipeline, dict(n=4))
+    refreshes = []
+    watcher.watch(callback=lambda names, _: refreshes.append(names), max_refreshes=1)
+    assert refreshes == [["values", "doubled", "result"]]
+
+    write_module(watched_package / "nodes.py", "def double(:\n")
+    with pytest.raises(SyntaxError):
+        watcher.refresh()
+    assert watcher.results["result"] == 18
+    assert watcher.refresh() == []
+
+
+CHECKS_SOURCE = """
+from .values import Box
+
+
+def check(box):
+    assert isinstance(box, Box), (type(box), Box)
+    return box.value
+"""
+
+VALUES_SOURCE = """
+class Box:
+    def __init__(self, value):
+        self.value = {factor} * value
+
+
+def make(n):
+    return Box(n)
+"""
+
+CHECKED_PIPELINE_SOURCE = """
+from dask.delayed import delayed
+
+from .checks import check
+from .values import make
+
+
+def get_pipeline(n):
+    box = delayed(make)(n, dask_key_name="box")
+    return {"box": box, "checked": delayed(check)(box, dask_key_name="checked")}
+"""
+
+
+def test_pipeline_watcher_reloads_the_imported_modules_first(watched_package):
+    write_module(watched_package / "checks.py", CHECKS_SOURCE)
+    write_module(watched_package / "values.py", VALUES_SOURCE.format(factor=1))
+    write_module(watched_package / "pipeline.py", CHECKED_PIPELINE_SOURCE)
+    pipeline = importlib.import_module("watched_package.pipeline")
+    watcher = PipelineWatcher(pipeline.get_pipeline, dict(n=4))
+    assert watcher.refresh() == ["box", "checked"]
+
+    # 'checks' imports the new Box class, although it has not changed
+    write_module(watched_package / "values.py", VALUES_SOURCE.format(factor=2))
+    assert watcher.refresh() == ["box", "checked"]
+    assert watcher.results["checked"] == 8
+
+    # 'checks' is reloaded after 'values'
+    write_module(watched_package / "checks.py", CHECKS_SOURCE + "\n")
+    write_module(watched_package / "values.py", VALUES_SOURCE.format(factor=3))
+    assert watcher.changed_modules() == [
+        "watched_package.checks",
+        "watched_package.values",
+    ]
+    assert watcher.refresh() == ["box", "checked"]
+    assert watcher.results["checked"] == 12
+
+
+def test_function_fingerprint():
+    assert function_fingerprint(get_closes) == function_fingerprint(get_closes)
+    assert function_fingerprint(get_closes) != function_fingerprint(_extract_field)
+    assert function_fingerprint(get_closes) != function_fingerprint(get_signals)
@@ -0,0 +1,139 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from sample_pipeline.fixtures import pipeline_fixtures
+from sample_pipeline.pipeline import get_full_pipeline
+from sample_pipeline.xdist_groups import COSTS_CACHE_KEY, assign_groups
+
+CONFTEST_SOURCE = """
+import os
+
+import pytest
+from dask.delayed import delayed
+
+from sample_pipeline.fixtures import pipeline_fixtures
+
+
+def compute(log_name, *inputs):
+    # Record the process in which the node is computed
+    with open(os.path.join(os.environ["NODES_LOG"], log_name), "a") as fp:
+        fp.write(f"{os.getpid()}\\n")
+    return log_name
+
+
+def get_pipeline(scale):
+    a = delayed(compute)("a.log", dask_key_name="a")
+    b = delayed(compute)("b.log", a, dask_key_name="b")
+    c = delayed(compute)("c.log", dask_key_name="c")
+    d = delayed(compute)("d.log", c, dask_key_name="d")
+    return {node.key: node for node in (a, b, c, d)}
+
+
+@pytest.fixture(scope="session")
+def scale():
+    return 1
+
+
+globals().update(pipeline_fixtures(get_pipeline))
+"""
+
+TESTS_SOURCE = """
+import pytest
+
+
+@pytest.mark.parametrize("i", range(3))
+def test_b(b, i):
+    assert b == "b.log"
+
+
+@pytest.mark.parametrize("i", range(3))
+def test_d(d, i):
+    assert d == "d.log"
+
+
+def test_no_pipeline_fixture():
+    pass
+"""
+
+
+def test_assign_groups_keeps_the_tests_with_the_same_fixtures_together():
+    requirements = {
+        "test_b1": {"a", "b"},
+        "test_b2": {"a", "b"},
+        "test_d1": {"c", "d"},
+        "test_d2": {"c", "d"},
+        "test_a": {"a"},
+    }
+    groups = assign_groups(requirements, 2)
+    assert groups["test_b1"] == groups["test_b2"] == groups["test_a"]
+    assert groups["test_d1"] == groups["test_d2"]
+    assert groups["test_b1"] != groups["test_d1"]
+
+
+def test_assign_groups_balances_the_costs():
+    # The shared fixture is cheap, and the tests are expensive
+    requirements = {f"test_{i}": {"shared"} for i in range(8)}
+    test_costs = {test: 10.0 for test in requirements}
+    groups = assign_groups(requirements, 4, {"shared": 1.0}, test_costs)
+    assert sorted(groups.values()) == [0, 0, 1, 1, 2, 2, 3, 3]
+
+    # The shared fixture is expensive, and the tests are cheap
+    test_costs = {test: 0.1 for test in requirements}
+    groups = assign_groups(requirements, 4, {"shared": 100.0}, test_costs)
+    assert set(groups.values()) == {0}
+
+
+def test_assign_groups_uses_all_the_groups_for_independent_fixtures():
+    requirements = {f"test_{i}": {f"fixture_{i}"} for i in range(6)}
+    fixture_costs = {f"fixture_{i}": float(i + 1) for i in range(6)}
+    groups = assign_groups(requirements, 3, fixture_costs)
+    loads = [0.0] * 3
+    for test, group in groups.items():
+        loads[group] += fixture_costs[f"fixture_{test[-1]}"]
+    assert max(loads) == min(loads) == 7.0
+
+
+def test_pipeline_fixtures_record_the_ancestor_nodes():
+    fixtures = pipeline_fixtures(get_full_pipeline)
+    ancestors = fixtures["signals"]._get_wrapped_function().pipeline_ancestors
+    assert set(ancestors) == {"yahoo_data", "calendar", "closes", "volumes"}
+    ancestors = fixtures["yahoo_data"]._get_wrapped_function().pipeline_ancestors
+    assert ancestors == ()
+
+
+def test_each_node_is_computed_on_one_worker(tmp_path):
+    pytest.importorskip("xdist")
+    (tmp_path / "tests").mkdir()
+    (tmp_path / "tests" / "conftest.py").write_text(textwrap.dedent(CONFTEST_SOURCE))
+    (tmp_path / "tests" / "test_nodes.py").write_text(textwrap.dedent(TESTS_SOURCE))
+    (tmp_path / "pytest.ini").write_text("[pytest]\n")
+    nodes_log = tmp_path / "nodes"
+    nodes_log.mkdir()
+
+    process = subprocess.run(
+        [sys.executable, "-m", "pytest", "-v", "-p", "sample_pipeline.xdist_groups"]
+        + ["-n", "2", "--dist", "loadgroup", "tests"],
+        cwd=str(tmp_path),
+        env=dict(os.environ, NODES_LOG=str(nodes_log)),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True,
+    )
+    assert process.returncode == 0, process.stdout
+    assert "@pipeline-0" in process.stdout
+    assert "@pipeline-1" in process.stdout
+
+    # Each node was computed once, i.e. on a single worker
+    for node in "abcd":
+        assert len((nodes_log / f"{node}.log").read_text().splitlines()) == 1, node
+
+    # The costs were measured for the next run
+    costs_file = tmp_path / ".pytest_cache" / "v" / COSTS_CACHE_KEY
+    costs = json.loads(costs_file.read_text())
+    assert set(costs["fixtures"]) == {f"tests::{node}" for node in "abcd"}
+    assert len(costs["tests"]) == 7
@@ -0,0 +1,142 @@
+"""A low-overhead tracer for a selection of functions, referenced by their
+dotted path as in 'intercept_function_arguments'"""
+
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+from unittest import mock
+
+from .intercept_function_arguments import resolve_function_path
+
+
+class FunctionStats:
+    """The statistics accumulated for one traced function"""
+
+    __slots__ = ["calls", "cumulative_time", "self_time", "allocated_blocks"]
+
+    def __init__(self):
+        self.calls = 0
+        self.cumulative_time = 0.0
+        self.self_time = 0.0
+        self.allocated_blocks = 0
+
+    def __repr__(self):
+        return (
+            f"FunctionStats(calls={self.calls}, "
+            f"cumulative_time={self.cumulative_time:.6f}, "
+            f"self_time={self.self_time:.6f}, "
+            f"allocated_blocks={self.allocated_blocks})"
+        )
+
+
+class TraceStats:
+    """The statistics collected by 'trace_functions'
+
+    functions: a dict function path => FunctionStats
+    stacks: a Counter stack of traced functions => self time (in seconds)
+    """
+
+    def __init__(self):
+        self.functions = {}
+        self.stacks = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, stack, elapsed, self_time, allocated_blocks, outermost):
+        fun_path = stack[-1]
+        with self._lock:
+            if fun_path not in self.functions:
+                self.functions[fun_path] = FunctionStats()
+            fun_stats = self.functions[fun_path]
+            fun_stats.calls += 1
+            fun_stats.self_time += self_time
+            # Recursive calls are accounted for in the outermost call
+            if outermost:
+                fun_stats.cumulative_time += elapsed
+                fun_stats.allocated_blocks += allocated_blocks
+            self.stacks[";".join(stack)] += self_time
+
+    def to_collapsed(self, path):
+        """Write the stacks in the 'collapsed' format of flamegraph.pl,
+        with the self time in microseconds. The file can also be opened
+        with e.g. speedscope"""
+        with open(path, "w") as fp:
+            for stack, self_time in sorted(self.stacks.items()):
+                fp.write(f"{stack} {int(round(self_time * 1e6))}\n")
+
+    def summary(self):
+        """A table with the function statistics, sorted by self time"""
+        lines = [
+            f"{'function':<50} {'calls':>8} {'cumulative (s)':>15} "
+            f"{'self (s)':>12} {'allocated blocks':>17}"
+        ]
+        for fun_path, fun_stats in sorted(
+            self.functions.items(), key=lambda item: -item[1].self_time
+        ):
+            lines.append(
+                f"{fun_path:<50} {fun_stats.calls:>8} "
+                f"{fun_stats.cumulative_time:>15.6f} {fun_stats.self_time:>12.6f} "
+                f"{fun_stats.allocated_blocks:>17}"
+            )
+        return "\n".join(lines)
+
+
+def _traced(fun, fun_path, stats, local):
+    @wraps(fun)
+    def traced_fun(*args, **kwargs):
+        if not hasattr(local, "stack"):
+            local.stack = []
+            local.child_times = []
+        stack = local.stack
+        child_times = local.child_times
+        outermost = fun_path not in stack
+
+        stack.append(fun_path)
+        child_times.append(0.0)
+        allocated_blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        try:
+            return fun(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            allocated_blocks = sys.getallocatedblocks() - allocated_blocks
+            child_time = child_times.pop()
+            if child_times:
+                child_times[-1] += elapsed
+            stats.add(
+                tuple(stack), elapsed, elapsed - child_time, allocated_blocks, outermost
+            )
+            stack.pop()
+
+    return traced_fun
+
+
+@contextmanager
+def trace_functions(fun_paths, stats):
+    """
+    Trace the calls to the functions with references 'fun_paths' and accumulate
+    the call counts, cumulative and self times, and the net number of memory
+    blocks allocated during the calls, in 'stats'
+
+    fun_paths: a list of references to Python functions (to be mocked using
+        mock.patch, so the functions must be looked up in their module at call
+        time, e.g. "sample_pipeline.data._extract_field")
+    stats: a TraceStats object
+
+    The self time of a function excludes the time spent in the other traced
+    functions. The allocated blocks are counted with 'sys.getallocatedblocks',
+    which is cheap but global to the process, so they also include
+    the allocations made by other threads.
+    """
+    assert isinstance(stats, TraceStats), "'stats' must be a TraceStats object"
+    local = threading.local()
+
+    with ExitStack() as patches:
+        for fun_path in fun_paths:
+            fun = resolve_function_path(fun_path)
+            patches.enter_context(
+                mock.patch(fun_path, _traced(fun, fun_path, stats, local))
+            )
+        yield stats
@@ -0,0 +1,328 @@
+"""A development runner that keeps the node outputs of a pipeline in memory,
+and recomputes only the nodes whose code has changed, and their descendants.
+
+    python -m sample_pipeline.watch --tickers AAPL MSFT --data-source synthetic
+"""
+
+import argparse
+import hashlib
+import importlib
+import inspect
+import logging
+import os
+import sys
+import time
+from types import CodeType
+
+import dask
+from dask.delayed import Delayed
+
+LOGGER = logging.getLogger(__name__)
+
+_CONSTANT_TYPES = (bool, int, float, str, bytes, type(None))
+
+
+def _global_names(code):
+    """The global names used by a code object and its nested functions"""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            names.update(_global_names(const))
+    return names
+
+
+def _code_fingerprint(code):
+    """The bytecode, names and constants of a code object, recursively. Unlike
+    the source, this does not depend on the line numbers, or on the file on disk"""
+    parts = [code.co_code.hex(), repr(code.co_names), repr(code.co_varnames)]
+    for const in code.co_consts:
+        parts.append(
+            _code_fingerprint(const) if isinstance(const, CodeType) else repr(const)
+        )
+    return "\n".join(parts)
+
+
+def function_fingerprint(fun):
+    """A hash of the code of 'fun', and of the functions, classes and
+    constants from the same package that it uses (recursively)"""
+    fun = inspect.unwrap(getattr(fun, "func", fun))
+    package = fun.__module__.split(".")[0]
+    parts, seen = [], set()
+
+    def _visit(obj):
+        if id(obj) in seen:
+            return
+        seen.add(id(obj))
+        parts.append(f"{obj.__module__}.{obj.__qualname__}")
+
+        if inspect.isclass(obj):
+            parts.append(repr([base.__qualname__ for base in obj.__bases__]))
+            functions = []
+            for name, member in vars(obj).items():
+                member = getattr(member, "__func__", member)
+                if inspect.isfunction(member):
+                    functions.append(member)
+                elif isinstance(member, _CONSTANT_TYPES) and name != "__doc__":
+                    parts.append(f"{name} = {member!r}")
+        else:
+            functions = [obj]
+
+        for function in functions:
+            parts.append(_code_fingerprint(function.__code__))
+            parts.append(repr((function.__defaults__, function.__kwdefaults__)))
+
+        namespace = sys.modules[obj.__module__].__dict__
+        codes = [function.__code__ for function in functions]
+        for name in sorted(set().union(*map(_global_names, codes))):
+            _visit_value(name, namespace.get(name))
+
+    def _visit_value(name, value, constants=True):
+        # The data in mutable containers may change at run time, so we only
+        # look for functions and classes in them
+        if isinstance(value, _CONSTANT_TYPES):
+            if constants:
+                parts.append(f"{name} = {value!r}")
+        elif isinstance(value, (tuple, frozenset)):
+            for item in value:
+                _visit_value(name, item, constants)
+        elif isinstance(value, (list, set)):
+            for item in value:
+                _visit_value(name, item, False)
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                _visit_value(f"{name}[{key!r}]", item, False)
+        elif (inspect.isfunction(value) or inspect.isclass(value)) and (
+            value.__module__.split(".")[0] == package
+        ):
+            _visit(value)
+
+    _visit(fun)
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()
+
+
+def _node_function(graph, name):
+    """The function of the task 'name' in the graph"""
+    task = graph[name]
+    if isinstance(task, tuple):
+        return task[0]
+    return task.func
+
+
+class PipelineWatcher:
+    """Compute the pipeline returned by get_pipeline(**pipeline_kwargs), keep
+    the node outputs in memory, and recompute only the nodes affected by a code
+    change when 'refresh' is called. The modules of the package that have
+    changed on disk are reloaded, and the pipeline is rebuilt."""
+
+    def __init__(self, get_pipeline, pipeline_kwargs, scheduler="threads"):
+        self.get_pipeline = get_pipeline
+        self.pipeline_kwargs = pipeline_kwargs
+        self.scheduler = scheduler
+        self.package = get_pipeline.__module__.split(".")[0]
+        self.results = {}
+        self._fingerprints = {}
+        self._mtimes = self._module_mtimes()
+
+    def _package_modules(self):
+        return [
+            module
+            for name, module in list(sys.modules.items())
+            if name.split(".")[0] == self.package
+            and name != __name__
+            and getattr(module, "__file__", None)
+        ]
+
+    def _module_mtimes(self):
+        mtimes = {}
+        for module in self._package_modules():
+            try:
+                mtimes[module.__name__] = os.path.getmtime(module.__file__)
+            except OSError:
+                pass
+        return mtimes
+
+    def changed_modules(self):
+        """The names of the modules of the package that have changed on disk"""
+        mtimes = self._module_mtimes()
+        return sorted(
+            name for name, mtime in mtimes.items() if self._mtimes.get(name) != mtime
+        )
+
+    def _module_dependencies(self):
+        """A dict module name => names of the package modules that it imports
+        (directly, or the functions, classes and objects defined there)"""
+        modules = {module.__name__ for module in self._package_modules()}
+        dependencies = {}
+        for module in self._package_modules():
+            dependencies[module.__name__] = set()
+            for value in list(vars(module).values()):
+                if inspect.ismodule(value):
+                    dependency = value.__name__
+                else:
+                    dependency = getattr(value, "__module__", None)
+                if (
+                    isinstance(dependency, str)
+                    and dependency in modules
+                    and dependency != module.__name__
+                ):
+                    dependencies[module.__name__].add(dependency)
+        return dependencies
+
+    def _reload(self, module_names):
+        """Reload the given modules, the modules used by the pipeline that
+        import them, and the module that builds the pipeline. The modules are
+        reloaded after the modules that they import, so that they refer to the
+        new functions and classes (e.g. for isinstance checks)"""
+        pipeline_module = self.get_pipeline.__module__
+        dependencies = self._module_dependencies()
+
+        affected = {}
+
+        def _is_affected(name):
+            if name not in affected:
+                affected[name] = False  # in case of circular imports
+                affected[name] = name in module_names or any(
+                    _is_affected(dep) for dep in dependencies.get(name, ())
+                )
+            return affected[name]
+
+        # The modules that the pipeline module uses, directly or not
+        used, stack = set(), [pipeline_module]
+        while stack:
+            name = stack.pop()
+            if name not in used:
+                used.add(name)
+                stack.extend(dependencies.get(name, ()))
+
+        to_reload = set(module_names).union(filter(_is_affected, used))
+        to_reload.discard(pipeline_module)
+        order, visited = [], set()
+
+        def _visit(name):
+            if name not in visited:
+                visited.add(name)
+                for dep in sorted(dependencies.get(name, ())):
+                    _visit(dep)
+                if name in to_reload:
+                    order.append(name)
+
+        for name in sorted(to_reload):
+            _visit(name)
+
+        for name in order + [pipeline_module]:
+            LOGGER.info(f"Reloading {name}")
+            importlib.reload(sys.modules[name])
+        self.get_pipeline = getattr(
+            sys.modules[pipeline_module], self.get_pipeline.__name__
+        )
+
+    def refresh(self):
+        """Reload the modules that have changed, and recompute the nodes which
+        code has changed, and their descendants. Return the names of the nodes
+        that were recomputed"""
+        changed = self.changed_modules()
+        if changed:
+            try:
+                self._reload(changed)
+            finally:
+                # Don't retry the reload until the files change again
+                self._mtimes = self._module_mtimes()
+
+        full_pipeline = self.get_pipeline(**self.pipeline_kwargs)
+        graph, dependencies, fingerprints = {}, {}, {}
+        for name, node in full_pipeline.items():
+            graph.update(node.dask)
+            dependencies[name] = set(node.dask.dependencies[name])
+            fingerprints[name] = function_fingerprint(_node_function(node.dask, name))
+
+        dirty = {}
+
+        def _is_dirty(name):
+            if name not in dirty:
+                dirty[name] = (
+                    name not in self.results
+                    or self._fingerprints.get(name) != fingerprints[name]
+                    or any(
+                        _is_dirty(dep)
+                        for dep in dependencies[name]
+                        if dep in dependencies
+                    )
+                )
+            return dirty[name]
+
+        to_compute = [name for name in full_pipeline if _is_dirty(name)]
+        self.results = {
+            name: value
+            for name, value in self.results.items()
+            if name in full_pipeline and name not in to_compute
+        }
+        if to_compute:
+            LOGGER.info(f"Computing {to_compute}")
+            graph.update(self.results)
+            values = dask.compute(
+                *[Delayed(name, graph) for name in to_compute], scheduler=self.scheduler
+            )
+            self.results.update(zip(to_compute, values))
+        self._fingerprints = fingerprints
+        return to_compute
+
+    def watch(self, interval=1.0, callback=None, max_refreshes=None):
+        """Call 'refresh' each time a module of the package changes on disk,
+        and then callback(recomputed node names, results), until interrupted"""
+        refreshes = 0
+        while max_refreshes is None or refreshes < max_refreshes:
+            if refreshes and not self.changed_modules():
+                time.sleep(interval)
+                continue
+            try:
+                recomputed = self.refresh()
+            except Exception:
+                LOGGER.exception("Could not refresh the pipeline")
+                recomputed = None
+            refreshes += 1
+            if recomputed is not None and callback is not None:
+                callback(recomputed, self.results)
+
+
+def _describe(value):
+    if isinstance(value, dict):
+        return f"dict with {len(value)} items"
+    return f"{type(value).__name__} of shape {getattr(value, 'shape', '?')}"
+
+
+def main(args=None):
+    from .pipeline import get_full_pipeline
+
+    parser = argparse.ArgumentParser(
+        prog="python -m sample_pipeline.watch",
+        description="Recompute the pipeline nodes when their code changes",
+    )
+    parser.add_argument("--tickers", nargs="+", default=["AAPL", "MSFT", "AMZN"])
+    parser.add_argument("--start-date", default="2021-01-04")
+    parser.add_argument("--end-date", default="2021-01-29")
+    parser.add_argument("--data-source", default="yahoo")
+    parser.add_argument("--interval", type=float, default=1.0)
+    args = parser.parse_args(args)
+
+    def _print_results(recomputed, results):
+        for name in recomputed:
+            print(f"{name}: {_describe(results[name])}")
+
+    watcher = PipelineWatcher(
+        get_full_pipeline,
+        dict(
+            tickers=set(args.tickers),
+            start_date=args.start_date,
+            end_date=args.end_date,
+            data_source=args.data_source,
+        ),
+    )
+    try:
+        watcher.watch(args.interval, _print_results)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    main()
@@ -0,0 +1,232 @@
+"""A pytest plugin that sends the tests that use the same pipeline fixtures to
+the same pytest-xdist worker, so that each expensive node is computed on as few
+workers as possible.
+
+    pytest -n 4 --dist loadgroup
+
+The pipeline fixtures are the node fixtures generated by
+sample_pipeline.fixtures.pipeline_fixtures (together with the ancestor nodes,
+which they request dynamically), and the fixtures listed in the
+'pipeline_fixtures' ini option (e.g. cached_pipeline_path).
+
+The tests that use pipeline fixtures are split into one group per worker.
+Each test goes to a group that already has its fixtures, as long as the group
+stays under its fair share of the total cost. The costs of the fixtures and of
+the tests are measured at each run and saved in the pytest cache, so that the
+next run is balanced on the measured costs.
+
+The plugin is enabled in pytest.ini with '-p sample_pipeline.xdist_groups'."""
+
+import logging
+import re
+import time
+
+import pytest
+
+LOGGER = logging.getLogger(__name__)
+
+COSTS_CACHE_KEY = "sample_pipeline/pipeline_fixture_costs"
+GROUP_PREFIX = "pipeline"
+
+# The costs (in seconds) of the fixtures and tests that were never measured
+DEFAULT_FIXTURE_COST = 1.0
+DEFAULT_TEST_COST = 0.1
+
+
+def assign_groups(
+    requirements, n_groups, fixture_costs=None, test_costs=None, max_imbalance=1.25
+):
+    """Assign the tests to n_groups groups, and return a dict test => group index.
+
+    'requirements' is a dict test => set of the fixtures that the test uses.
+    The tests are assigned by decreasing cost. Each test goes to the group where
+    it adds the least cost (i.e. the group that already has most of its fixtures),
+    unless that group would exceed its fair share of the total cost by more than
+    'max_imbalance', in which case the test goes to the group with the smallest
+    cost after the assignment."""
+    assert n_groups > 0, n_groups
+    assert max_imbalance >= 1.0, max_imbalance
+    fixture_costs = fixture_costs or {}
+    test_costs = test_costs or {}
+
+    def fixture_cost(fixture):
+        return fixture_costs.get(fixture, DEFAULT_FIXTURE_COST)
+
+    def test_cost(test):
+        return test_costs.get(test, DEFAULT_TEST_COST)
+
+    def total_cost(test):
+        return test_cost(test) + sum(map(fixture_cost, requirements[test]))
+
+    all_fixtures = set().union(*requirements.values()) if requirements else set()
+    fair_share = max(
+        (sum(map(fixture_cost, all_fixtures)) + sum(map(test_cost, requirements)))
+        / n_groups,
+        max(map(total_cost, requirements), default=0.0),
+    )
+    max_load = fair_share * max_imbalance
+
+    loads = [0.0] * n_groups
+    group_fixtures = [set() for _ in range(n_groups)]
+    groups = {}
+    for test in sorted(requirements, key=lambda test: (-total_cost(test), test)):
+        candidates = []
+        for group in range(n_groups):
+            added = test_cost(test) + sum(
+                map(fixture_cost, requirements[test] - group_fixtures[group])
+            )
+            candidates.append((loads[group] + added, added, group))
+
+        within_share = [
+            (added, load, group)
+            for load, added, group in candidates
+            if load <= max_load
+        ]
+        if within_share:
+            _, load, group = min(within_share)
+        else:
+            load, _, group = min(candidates)
+
+        groups[test] = group
+        loads[group] = load
+        group_fixtures[group].update(requirements[test])
+
+    return groups
+
+
+def _fixture_key(fixturedef, argname=None):
+    """The fixtures are identified by their name and the directory
+    where they are defined"""
+    return f"{fixturedef.baseid}::{argname or fixturedef.argname}"
+
+
+def _test_key(nodeid):
+    """The test id, without the group that pytest-xdist appends to it"""
+    return re.sub(f"@{GROUP_PREFIX}-[0-9]+$", "", nodeid)
+
+
+class PipelineFixtureGroups:
+    """Measure the cost of the pipeline fixtures, and group the tests
+    that use them when running with --dist loadgroup"""
+
+    def __init__(self, config):
+        self.config = config
+        self.named_fixtures = set(config.getini("pipeline_fixtures"))
+
+        cache = getattr(config, "cache", None)
+        costs = cache.get(COSTS_CACHE_KEY, {}) if cache is not None else {}
+        self.fixture_costs = dict(costs.get("fixtures", {}))
+        self.test_costs = dict(costs.get("tests", {}))
+
+        # The costs measured in this session
+        self.measured = {"fixtures": {}, "tests": {}}
+        self._setup_stack = []
+
+    def is_pipeline_fixture(self, fixturedef):
+        return (
+            fixturedef.argname in self.named_fixtures
+            or getattr(fixturedef.func, "pipeline_ancestors", None) is not None
+        )
+
+    def pipeline_fixtures(self, item):
+        """The pipeline fixtures used by the test, including the ancestor nodes"""
+        fixtureinfo = getattr(item, "_fixtureinfo", None)
+        if fixtureinfo is None:
+            return set()
+
+        fixtures = set()
+        for name in fixtureinfo.names_closure:
+            fixturedefs = fixtureinfo.name2fixturedefs.get(name)
+            if not fixturedefs or not self.is_pipeline_fixture(fixturedefs[-1]):
+                continue
+            fixturedef = fixturedefs[-1]
+            fixtures.add(_fixture_key(fixturedef))
+            for ancestor in getattr(fixturedef.func, "pipeline_ancestors", ()):
+                fixtures.add(_fixture_key(fixturedef, ancestor))
+        return fixtures
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_collection_modifyitems(self, config, items):
+        # The groups must be added before pytest-xdist appends them to the test ids
+        workerinput = getattr(config, "workerinput", None)
+        if workerinput is None or not config.getvalue("loadgroup"):
+            return
+
+        requirements = {}
+        for item in items:
+            fixtures = self.pipeline_fixtures(item)
+            if fixtures:
+                requirements[item.nodeid] = fixtures
+
+        groups = assign_groups(
+            requirements,
+            workerinput["workercount"],
+            self.fixture_costs,
+            self.test_costs,
+        )
+        for item in items:
+            if item.nodeid in groups:
+                group = f"{GROUP_PREFIX}-{groups[item.nodeid]}"
+                item.add_marker(pytest.mark.xdist_group(group))
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_fixture_setup(self, fixturedef, request):
+        if not self.is_pipeline_fixture(fixturedef):
+            yield
+            return
+
+        # The time spent in the setup of the parent nodes is not counted
+        # in the cost of the fixture
+        frame = [time.perf_counter(), 0.0]
+        self._setup_stack.append(frame)
+        yield
+        self._setup_stack.pop()
+        elapsed = time.perf_counter() - frame[0]
+        if self._setup_stack:
+            self._setup_stack[-1][1] += elapsed
+        self.measured["fixtures"][_fixture_key(fixturedef)] = elapsed - frame[1]
+
+    def pytest_runtest_logreport(self, report):
+        if report.when == "call":
+            self.measured["tests"][_test_key(report.nodeid)] = report.duration
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_testnodedown(self, node, error):
+        """Collect the costs measured by the pytest-xdist workers"""
+        costs = getattr(node, "workeroutput", {}).get(COSTS_CACHE_KEY)
+        if costs:
+            self.measured["fixtures"].update(costs["fixtures"])
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_sessionfinish(self, session):
+        # The workers send the costs of their fixtures to the controller,
+        # which gets the test reports, and saves the costs in the cache
+        if hasattr(self.config, "workeroutput"):
+            fixtures = self.measured["fixtures"]
+            self.config.workeroutput[COSTS_CACHE_KEY] = {"fixtures": fixtures}
+            return
+
+        cache = getattr(self.config, "cache", None)
+        if cache is None or not any(self.measured.values()):
+            return
+        self.fixture_costs.update(self.measured["fixtures"])
+        self.test_costs.update(self.measured["tests"])
+        cache.set(
+            COSTS_CACHE_KEY, {"fixtures": self.fixture_costs, "tests": self.test_costs}
+        )
+
+
+def pytest_addoption(parser):
+    parser.addini(
+        "pipeline_fixtures",
+        type="args",
+        default=[],
+        help="Expensive fixtures whose tests are sent to the same xdist worker "
+        "(in addition to the fixtures generated by pipeline_fixtures)",
+    )
+
+
+def pytest_configure(config):
+    config.pluginmanager.register(
+        PipelineFixtureGroups(config), "sample_pipeline_fixture_groups"
+    )